@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+aaPanel Tree - Generador de un árbol aaPanel sintético para benchmarks
+
+Genera bajo un directorio raíz la misma estructura que usan los analyzers:
+vhosts nginx, certificados, binlogs de MySQL, /etc/hosts y shims para los
+binarios de sistema (nginx, systemctl, bt) que no existen en la máquina local.
+"""
+
+import os
+import stat
+from datetime import datetime, timedelta
+from typing import Dict, Any
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+VHOST_DIR = "www/server/panel/vhost/nginx"
+CERT_DIR = "www/server/panel/vhost/cert"
+DATA_DIR = "www/server/data"
+NGINX_CONF_DIR = "www/server/nginx/conf"
+
+# Respuestas fijas de los binarios de sistema que el diagnóstico invoca
+# (@ROOT@ es la raíz del árbol; `nginx -T` vuelca nginx.conf y los vhosts)
+SHIMS = {
+    'nginx': (
+        '[ "$1" = "-T" ] && awk \'FNR==1{print "# configuration file " FILENAME ":"}1\' '
+        '@ROOT@/www/server/nginx/conf/nginx.conf @ROOT@/www/server/panel/vhost/nginx/*.conf\n'
+        'echo "nginx: the configuration file /www/server/nginx/conf/nginx.conf syntax is ok" >&2\n'
+        'echo "nginx: configuration file /www/server/nginx/conf/nginx.conf test is successful" >&2\n'
+    ),
+    'systemctl': 'echo "   Active: active (running)"\n',
+    'bt': 'echo "Bt-Panel (pid 1234) already running"\n',
+}
+
+
+def site_name(index: int) -> str:
+    return f"site{index:05d}.example.test"
+
+
+def _vhost_config(domain: str) -> str:
+    return f"""server {{
+    listen 80;
+    listen 443 ssl http2;
+    server_name {domain} www.{domain};
+    index index.php index.html;
+    root /www/wwwroot/{domain};
+
+    # `#` dentro de una URL no abre un comentario: ssl_certificate sigue en el server
+    location = /inicio {{ return 301 https://{domain}/#top; }}
+
+    ssl_certificate /www/server/panel/vhost/cert/{domain}/fullchain.pem;
+    ssl_certificate_key /www/server/panel/vhost/cert/{domain}/privkey.pem;
+
+    access_log /www/wwwlogs/{domain}.log;
+    error_log /www/wwwlogs/{domain}.error.log;
+}}
+"""
+
+
+def _write(path: str, content: str, mode: int = 0o644):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.chmod(path, mode)
+
+
+def _issue_certificates(root: str, domains):
+    """Emitir un certificado por dominio firmado por una CA sintética"""
+    ca_key = ec.generate_private_key(ec.SECP256R1())
+    leaf_key = ec.generate_private_key(ec.SECP256R1())  # Compartida: generar claves es lo lento
+    ca_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "Benchmark Intermediate CA")])
+
+    ca_cert = (
+        x509.CertificateBuilder()
+        .subject_name(ca_name)
+        .issuer_name(ca_name)
+        .public_key(ca_key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(datetime(2024, 1, 1))
+        .not_valid_after(datetime(2034, 1, 1))
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(ca_key, hashes.SHA256())
+    )
+    ca_pem = ca_cert.public_bytes(serialization.Encoding.PEM).decode()
+    key_pem = leaf_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.TraditionalOpenSSL,
+        serialization.NoEncryption(),
+    ).decode()
+
+    now = datetime(2026, 1, 1)
+    for i, domain in enumerate(domains):
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, domain)]))
+            .issuer_name(ca_name)
+            .public_key(leaf_key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + timedelta(days=30 + i % 365))
+            .add_extension(
+                x509.SubjectAlternativeName([x509.DNSName(domain), x509.DNSName(f"www.{domain}")]),
+                critical=False,
+            )
+            .sign(ca_key, hashes.SHA256())
+        )
+        cert_dir = os.path.join(root, CERT_DIR, domain)
+        _write(os.path.join(cert_dir, "fullchain.pem"),
+               cert.public_bytes(serialization.Encoding.PEM).decode() + ca_pem)
+        _write(os.path.join(cert_dir, "privkey.pem"), key_pem, 0o600)
+
+
+def generate_tree(root: str, vhosts: int, certs: int, binlogs: int,
+                  missing_binlogs: int = 2) -> Dict[str, Any]:
+    """
+    Generar el árbol aaPanel sintético bajo `root`
+
+    Args:
+        vhosts: cantidad de configuraciones en vhost/nginx (más un catch-all)
+        certs: cantidad de directorios en vhost/cert
+        binlogs: cantidad de mysql-bin.NNNNNN en /www/server/data
+        missing_binlogs: referencias a binlogs inexistentes en mysql-bin.index
+
+    Returns:
+        Resumen con los dominios generados y el dominio objetivo del diagnóstico
+    """
+    domains = [site_name(i) for i in range(max(vhosts, certs))]
+
+    # vhosts nginx (0.default.conf queda primero alfabéticamente y es catch-all)
+    _write(os.path.join(root, VHOST_DIR, "0.default.conf"),
+           "server {\n    listen 80 default_server;\n    server_name _;\n    return 444;\n}\n")
+    for domain in domains[:vhosts]:
+        _write(os.path.join(root, VHOST_DIR, f"{domain}.conf"), _vhost_config(domain))
+    # Certificado elegido por SNI: `${...}` es parte de la palabra, no abre un bloque
+    _write(os.path.join(root, VHOST_DIR, "zz.dynamic.conf"),
+           "server {\n    listen 443 ssl;\n    server_name sni.example.test;\n"
+           "    ssl_certificate /www/server/panel/vhost/cert/${ssl_server_name}/fullchain.pem;\n"
+           "    ssl_certificate_key /www/server/panel/vhost/cert/${ssl_server_name}/privkey.pem;\n"
+           "    return 301 https://${host}$request_uri;\n}\n")
+
+    _write(os.path.join(root, NGINX_CONF_DIR, "nginx.conf"),
+           "events {}\nhttp {\n    include /www/server/panel/vhost/nginx/*.conf;\n}\n")
+
+    _issue_certificates(root, domains[:certs])
+
+    # Binlogs vacíos + índice con referencias a archivos que no existen
+    data_dir = os.path.join(root, DATA_DIR)
+    os.makedirs(data_dir, exist_ok=True)
+    index_lines = []
+    for number in range(1, binlogs + missing_binlogs + 1):
+        name = f"mysql-bin.{number:06d}"
+        index_lines.append(f"./{name}")
+        if number <= binlogs:
+            open(os.path.join(data_dir, name), 'w').close()
+    _write(os.path.join(data_dir, "mysql-bin.index"), "\n".join(index_lines) + "\n")
+
+    target = domains[len(domains) // 2] if domains else site_name(0)
+    _write(os.path.join(root, "etc/hosts"),
+           "127.0.0.1 localhost localhost.localdomain\n"
+           "::1 localhost localhost.localdomain\n"
+           f"127.0.0.1 {target}\n")
+
+    for name, body in SHIMS.items():
+        _write(os.path.join(root, "bin", name), f"#!/bin/sh\n{body.replace('@ROOT@', root)}exit 0\n",
+               stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP | stat.S_IROTH | stat.S_IXOTH)
+
+    return {
+        'root': root,
+        'vhosts': vhosts,
+        'certs': certs,
+        'binlogs': binlogs,
+        'target_domain': target,
+    }
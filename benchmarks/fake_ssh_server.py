@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Fake SSH Server - Servidor SSH local (paramiko) sobre un árbol aaPanel sintético
+
+Cada `exec` se ejecuta con bash en la máquina local reescribiendo las rutas
+absolutas del servidor (/www/..., /etc/hosts) hacia el árbol generado, con
+latencia y ancho de banda configurables para simular un enlace real.
+"""
+
+import logging
+import os
+import socket
+import subprocess
+import threading
+import time
+from typing import Optional
+
+import paramiko
+
+# Los resets de conexión al cerrar clientes no son errores del benchmark
+logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+# Rutas absolutas del servidor que se redirigen al árbol sintético
+REWRITTEN_PATHS = ("/www/", "/etc/hosts")
+
+
+class _ExecHandler(paramiko.ServerInterface):
+    def __init__(self, server: "FakeSSHServer"):
+        self.server = server
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(
+            target=self.server.run_command,
+            args=(channel, command.decode("utf-8", errors="ignore")),
+            daemon=True,
+        ).start()
+        return True
+
+
+class FakeSSHServer:
+    """
+    Servidor SSH de benchmark
+
+    Args:
+        root: raíz del árbol aaPanel generado (ver aapanel_tree.generate_tree)
+        latency: segundos agregados a cada comando (RTT simulado)
+        bandwidth: bytes/segundo para stdout/stderr; None = sin límite
+    """
+
+    def __init__(self, root: str, latency: float = 0.0, bandwidth: Optional[int] = None):
+        self.root = root.rstrip("/")
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.host_key = paramiko.ECDSAKey.generate()
+        self.port = 0
+        self.commands_executed = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._running = False
+
+    def start(self) -> int:
+        """Levantar el servidor en 127.0.0.1 en un puerto libre y devolverlo"""
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(16)
+        self.port = self._sock.getsockname()[1]
+        self._running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        return self.port
+
+    def stop(self):
+        self._running = False
+        if self._sock:
+            self._sock.close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.commands_executed = 0
+            self.bytes_sent = 0
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                return
+            # Sin Nagle: si no, cada comando suma ~40ms de delayed ACK
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            transport = paramiko.Transport(client)
+            transport.add_server_key(self.host_key)
+            transport.start_server(server=_ExecHandler(self))
+
+    @staticmethod
+    def disable_nagle(client: paramiko.SSHClient):
+        """Desactivar Nagle del lado cliente para no medir el delayed ACK de loopback"""
+        transport = client.get_transport()
+        if transport:
+            transport.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _rewrite(self, command: str) -> str:
+        for path in REWRITTEN_PATHS:
+            command = command.replace(path, f"{self.root}{path}")
+        return command
+
+    def run_command(self, channel: paramiko.Channel, command: str):
+        """Ejecutar un comando sobre el árbol sintético y devolverlo por el canal"""
+        if self.latency:
+            time.sleep(self.latency)
+
+        env = dict(os.environ, PATH=f"{self.root}/bin:{os.environ.get('PATH', '')}")
+        try:
+            proc = subprocess.run(["bash", "-c", self._rewrite(command)], capture_output=True,
+                                  env=env, timeout=120)
+            stdout, stderr, exit_code = proc.stdout, proc.stderr, proc.returncode
+        except subprocess.TimeoutExpired:
+            stdout, stderr, exit_code = b"", b"timeout\n", 124
+
+        # Las rutas locales no deben filtrarse al cliente
+        root = self.root.encode()
+        stdout = stdout.replace(root, b"")
+        stderr = stderr.replace(root, b"")
+
+        with self._lock:
+            self.commands_executed += 1
+            self.bytes_sent += len(stdout) + len(stderr)
+
+        try:
+            self._send(channel.sendall, stdout)
+            self._send(channel.sendall_stderr, stderr)
+            channel.send_exit_status(exit_code)
+            channel.close()
+        except (EOFError, OSError, paramiko.SSHException):
+            pass  # El cliente cerró la conexión antes de leer todo
+
+    def _send(self, sender, data: bytes, chunk_size: int = 32 * 1024):
+        for offset in range(0, len(data), chunk_size):
+            chunk = data[offset:offset + chunk_size]
+            if self.bandwidth:
+                time.sleep(len(chunk) / self.bandwidth)
+            sender(chunk)
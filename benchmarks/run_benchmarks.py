@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Benchmarks - Tiempos de los analyzers contra un servidor SSH sintético
+
+Levanta un FakeSSHServer sobre un árbol aaPanel generado a cada escala y mide
+NginxAnalyzer.analyze_all_configurations, SSLManager.list_all_certificates (sin
+cache y con el cache de certificados caliente), ServerHealthCheck.check_mysql_binlogs
+y el diagnóstico completo. Los resultados se guardan en JSON; con --baseline se
+comparan contra una corrida anterior.
+
+Uso:
+    python benchmarks/run_benchmarks.py --scales 10 100 --latency-ms 20
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/anterior.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from unittest import mock
+
+# Agregar el directorio raíz al path para imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.aapanel_tree import CERT_DIR, generate_tree
+from benchmarks.fake_ssh_server import FakeSSHServer
+from server_health_check.checker import ServerHealthCheck
+from ssl_diagnostics.core.ssh_manager import SSHManager
+from ssl_diagnostics.core.ssl_manager import SSLManager
+from ssl_diagnostics.core.cert_cache import CertCache
+from ssl_diagnostics.core.analysis_cache import AnalysisCache
+from ssl_diagnostics.core.state_manager import StateManager
+from ssl_diagnostics.analyzers.nginx_analyzer import NginxAnalyzer
+from ssl_diagnostics.ssl_diagnostics_main import SSLDiagnosticsMain
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_SCALES = [10, 100, 1000, 10000]
+
+
+def _ssh_manager(server: FakeSSHServer, workdir: str) -> SSHManager:
+    config_file = os.path.join(workdir, "bench.env")
+    with open(config_file, "w") as f:
+        f.write(f"hostname=127.0.0.1\nport={server.port}\nusername=root\npassword=bench\n")
+    ssh = SSHManager(config_file)
+    # Cada sesión mide como un proceso nuevo: sin huellas memorizadas de la anterior
+    AnalysisCache.reset_shared()
+    ssh.connect()
+    server.disable_nagle(ssh.ssh)
+    return ssh
+
+
+def _age_certificates(root: str, mtime: float = 1_600_000_000):
+    """Llevar el mtime de los certificados al pasado, como en un servidor real"""
+    cert_root = os.path.join(root, CERT_DIR)
+    for domain in os.listdir(cert_root):
+        for name in os.listdir(os.path.join(cert_root, domain)):
+            os.utime(os.path.join(cert_root, domain, name), (mtime, mtime))
+
+
+def _measure(server: FakeSSHServer, scenario: str, scale: int, func: Callable[[], Any]) -> Dict[str, Any]:
+    server.reset_counters()
+    started = time.perf_counter()
+    error = ""
+    # Los managers imprimen cada comando: se descarta para no medir la terminal
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            func()
+        except Exception as e:
+            error = str(e)
+    elapsed = time.perf_counter() - started
+
+    result = {
+        'scenario': scenario,
+        'scale': scale,
+        'seconds': round(elapsed, 4),
+        'round_trips': server.commands_executed,
+        'bytes_received': server.bytes_sent,
+    }
+    if error:
+        result['error'] = error
+    return result
+
+
+def run_scale(scale: int, latency: float, bandwidth: Optional[int]) -> List[Dict[str, Any]]:
+    """Generar el árbol para una escala y correr todos los escenarios"""
+    workdir = tempfile.mkdtemp(prefix="aapanel-bench-")
+    results = []
+    # Caches locales (análisis del host, offsets de logs...) en el directorio de trabajo, no en ssl_diagnostics/cache
+    cache_env = mock.patch.dict(os.environ, {'SSL_DIAG_CACHE_DIR': os.path.join(workdir, "cache")})
+    cache_env.start()
+    try:
+        tree = generate_tree(os.path.join(workdir, "root"), vhosts=scale, certs=scale, binlogs=scale)
+        server = FakeSSHServer(tree['root'], latency=latency, bandwidth=bandwidth)
+        server.start()
+
+        try:
+            ssh = _ssh_manager(server, workdir)
+            try:
+                results.append(_measure(server, "nginx_analyze_all_configurations", scale,
+                                        NginxAnalyzer(ssh).analyze_all_configurations))
+                results.append(_measure(server, "ssl_list_all_certificates", scale,
+                                        SSLManager(ssh, use_cache=False).list_all_certificates))
+                # Cache caliente: los certificados generados son anteriores al primer escaneo
+                _age_certificates(tree['root'])
+                cached = SSLManager(ssh)
+                cached.cache = CertCache("bench", os.path.join(workdir, "cache"))
+                with contextlib.redirect_stdout(io.StringIO()):
+                    cached.list_all_certificates()
+                results.append(_measure(server, "ssl_list_all_certificates_cached", scale,
+                                        cached.list_all_certificates))
+            finally:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    ssh.close()
+
+            checker = ServerHealthCheck("127.0.0.1", "root", server.port)
+            checker.connect("bench")
+            server.disable_nagle(checker.ssh)
+            try:
+                results.append(_measure(server, "mysql_check_binlogs", scale,
+                                        checker.check_mysql_binlogs))
+            finally:
+                checker.close()
+
+            # El diagnóstico completo modifica el árbol, por eso corre último
+            domain = tree['target_domain']
+            state_dir = os.path.join(workdir, "state")
+            ssh = _ssh_manager(server, workdir)
+
+            def full_diagnosis():
+                with mock.patch("ssl_diagnostics.core.user_interaction.StateManager",
+                                lambda d, **kwargs: StateManager(d, state_dir, **kwargs)), \
+                     mock.patch("ssl_diagnostics.core.ssl_manager.CertCache",
+                                lambda host: CertCache(host, state_dir)), \
+                     mock.patch("builtins.input", return_value="y"):
+                    SSLDiagnosticsMain(domain, ssh_manager=ssh).run_complete_diagnosis()
+
+            results.append(_measure(server, "full_diagnosis", scale, full_diagnosis))
+        finally:
+            server.stop()
+    finally:
+        cache_env.stop()
+        AnalysisCache.reset_shared()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return results
+
+
+def compare(results: List[Dict[str, Any]], baseline_file: str):
+    """Mostrar diferencias contra una corrida anterior"""
+    with open(baseline_file, "r", encoding="utf-8") as f:
+        baseline = {(r['scenario'], r['scale']): r for r in json.load(f)['results']}
+
+    print(f"\n📊 Comparación contra {baseline_file}:")
+    for result in results:
+        previous = baseline.get((result['scenario'], result['scale']))
+        if not previous:
+            continue
+        ratio = result['seconds'] / previous['seconds'] if previous['seconds'] else 0.0
+        trips = result['round_trips'] - previous['round_trips']
+        flag = "🔴" if ratio > 1.2 or trips > 0 else "🟢"
+        print(f"   {flag} {result['scenario']:<34} x{result['scale']:<6} "
+              f"{ratio:6.2f}x tiempo, {trips:+d} round trips")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de analyzers contra un servidor SSH sintético")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES,
+                        help="Escalas (vhosts = certs = binlogs) a medir (default: 10 100 1000 10000)")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="Latencia agregada por comando en ms (default: 0)")
+    parser.add_argument("--bandwidth-kbps", type=int, default=0,
+                        help="Ancho de banda en KB/s para las respuestas; 0 = sin límite")
+    parser.add_argument("--output", help="Archivo JSON de resultados (default: benchmarks/results/<fecha>.json)")
+    parser.add_argument("--baseline", help="Resultados anteriores para comparar")
+    args = parser.parse_args()
+
+    latency = args.latency_ms / 1000.0
+    bandwidth = args.bandwidth_kbps * 1024 if args.bandwidth_kbps else None
+
+    results = []
+    for scale in args.scales:
+        print(f"⏱️  Escala {scale}...")
+        for result in run_scale(scale, latency, bandwidth):
+            results.append(result)
+            status = f" ❌ {result['error']}" if 'error' in result else ""
+            print(f"   {result['scenario']:<34} {result['seconds']:>9.3f}s "
+                  f"{result['round_trips']:>7} round trips{status}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            'generated_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'latency_ms': args.latency_ms,
+            'bandwidth_kbps': args.bandwidth_kbps,
+            'results': results,
+        }, f, indent=2)
+    print(f"\n💾 Resultados guardados en {output}")
+
+    if args.baseline:
+        compare(results, args.baseline)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
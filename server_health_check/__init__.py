@@ -1,6 +1,7 @@
 """Init file for server_health_check package."""
 from .checker import ServerHealthCheck
 from .main import main
+from .transport import CommandRecorder, CommandTimings, ReplayTransport
 
 __version__ = "0.1.0"
-__all__ = ["ServerHealthCheck", "main"]
+__all__ = ["ServerHealthCheck", "main", "CommandRecorder", "CommandTimings", "ReplayTransport"]
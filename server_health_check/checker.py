@@ -5,9 +5,13 @@ A tool to monitor and fix common issues with aaPanel and MySQL binary logs.
 """
 import paramiko
 import re
+import time
 import getpass
+from contextlib import nullcontext
 from typing import Tuple, Optional
 
+from .transport import CommandRecorder, CommandTimings, ReplayTransport
+
 class ServerHealthCheck:
     def __init__(self, hostname: str, username: str, port: int = 22):
         self.hostname = hostname
@@ -15,9 +19,32 @@ class ServerHealthCheck:
         self.port = port
         self.ssh = paramiko.SSHClient()
         self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        self.recorder: Optional[CommandRecorder] = None
+        self.replay: Optional[ReplayTransport] = None
+        self.timings: Optional[CommandTimings] = None
+
+    def enable_recording(self, path: str):
+        """Records every executed command into a fixture file written on close()."""
+        self.recorder = CommandRecorder(path, host=self.hostname)
+
+    def use_replay(self, path: str, rtt: float = 0.0):
+        """Serves commands from a recorded fixture instead of the server."""
+        self.replay = ReplayTransport(path, rtt=rtt)
+
+    def enable_timings(self) -> CommandTimings:
+        """Times every executed command (see CommandTimings.summary)."""
+        self.timings = CommandTimings()
+        return self.timings
+
+    def step(self, name: str):
+        """Attributes timed commands inside the block to a named step."""
+        return self.timings.step(name) if self.timings else nullcontext()
 
     def connect(self, password: str) -> bool:
         """Establishes SSH connection to the server."""
+        if self.replay:
+            print(f"Replay mode: serving commands from {self.replay.path}")
+            return True
         try:
             self.ssh.connect(self.hostname, self.port, self.username, password)
             return True
@@ -27,9 +54,20 @@ class ServerHealthCheck:
 
     def execute_command(self, command: str) -> Tuple[str, str, int]:
         """Executes a command and returns stdout, stderr and exit code."""
-        stdin, stdout, stderr = self.ssh.exec_command(command)
-        exit_status = stdout.channel.recv_exit_status()
-        return stdout.read().decode(), stderr.read().decode(), exit_status
+        started = time.perf_counter()
+        if self.replay:
+            result = self.replay.execute(command)
+        else:
+            stdin, stdout, stderr = self.ssh.exec_command(command)
+            exit_status = stdout.channel.recv_exit_status()
+            result = stdout.read().decode(), stderr.read().decode(), exit_status
+        elapsed = time.perf_counter() - started
+
+        if self.recorder and not self.replay:
+            self.recorder.record(command, *result, elapsed)
+        if self.timings:
+            self.timings.record(command, "", elapsed, *result)
+        return result
 
     def check_aapanel(self) -> bool:
         """Verifies aaPanel status and starts it if it's down."""
@@ -154,4 +192,6 @@ class ServerHealthCheck:
 
     def close(self):
         """Closes SSH connection."""
+        if self.recorder:
+            print(f"Fixture written to {self.recorder.save()}")
         self.ssh.close()
@@ -11,14 +11,27 @@ def parse_args():
     parser.add_argument('-u', '--user', default='root', help='SSH username (default: root)')
     parser.add_argument('-P', '--password', help='SSH password (not recommended, use interactive mode instead)')
     parser.add_argument('-y', '--yes', action='store_true', help='Automatically answer yes to all prompts')
+    parser.add_argument('--record', metavar='FILE', help='Record every remote command into a JSON fixture')
+    parser.add_argument('--replay', metavar='FILE', help='Replay commands from a JSON fixture instead of connecting')
+    parser.add_argument('--replay-rtt', type=float, default=0.0, metavar='MS',
+                        help='Simulated round-trip time per replayed command in milliseconds (default: 0)')
+    parser.add_argument('--timings', action='store_true',
+                        help='Print per-command timings and round trips per step at the end')
+    parser.add_argument('--timings-json', metavar='FILE', help='Write per-command timings as JSON')
     return parser.parse_args()
 
 def main():
     """Main function that runs the server health check."""
     args = parse_args()
     
+    # Replay mode never connects, so it needs no credentials
+    if args.replay:
+        hostname = args.host or "replay"
+        port = args.port
+        username = args.user
+        password = ""
     # If any required parameter is missing, switch to interactive mode
-    if not all([args.host, args.user]):
+    elif not all([args.host, args.user]):
         print("Running in interactive mode...")
         hostname = args.host or input("Enter server IP address: ")
         port = args.port or int(input("Enter SSH port (default 22): ") or "22")
@@ -32,23 +45,34 @@ def main():
 
     # Create instance and connect
     checker = ServerHealthCheck(hostname, username, port)
+    if args.replay:
+        checker.use_replay(args.replay, rtt=args.replay_rtt / 1000.0)
+    elif args.record:
+        checker.enable_recording(args.record)
+    if args.timings or args.timings_json:
+        checker.enable_timings()
+
     if not checker.connect(password):
         print("Could not establish connection. Exiting...")
         return
 
     try:
         # Check aaPanel
-        checker.check_aapanel()
+        with checker.step('aapanel'):
+            checker.check_aapanel()
 
         # Check MySQL binlogs
-        last_valid = checker.check_mysql_binlogs()
+        with checker.step('mysql_binlogs'):
+            last_valid = checker.check_mysql_binlogs()
         if last_valid:
             if args.yes:
                 response = 'y'
             else:
                 response = input("\nDo you want to fix the index file? (y/N): ").lower()
             if response == 'y':
-                if checker.fix_mysql_binlogs(last_valid):
+                with checker.step('mysql_fix'):
+                    fixed = checker.fix_mysql_binlogs(last_valid)
+                if fixed:
                     checker.restart_mysql()
                     if checker.check_mysql_status():
                         print("\nProcess completed successfully.")
@@ -70,6 +94,16 @@ def main():
 
     finally:
         checker.close()
+        if checker.replay:
+            stats = checker.replay.stats()
+            print(f"\nReplay: {stats['round_trips']} round trips, "
+                  f"{stats['misses']} unrecorded commands, "
+                  f"{stats['simulated_latency']:.3f}s simulated latency")
+        if checker.timings:
+            if args.timings:
+                print(checker.timings.format_summary())
+            if args.timings_json:
+                print(f"\nTimings written to {checker.timings.save(args.timings_json)}")
 
 if __name__ == "__main__":
     main()
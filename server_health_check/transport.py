@@ -0,0 +1,252 @@
+"""
+Command Transport
+-----------------
+Record/replay and timing support for remote command execution.
+
+CommandRecorder captures every command executed through an SSH wrapper
+(ServerHealthCheck or ssl_diagnostics' SSHManager) into a JSON fixture.
+ReplayTransport serves those fixtures back without a network connection,
+so analyzers can be benchmarked and regression-tested offline.
+CommandTimings records where the time of a run goes, per command.
+"""
+import json
+import os
+import sys
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Tuple
+
+FIXTURE_VERSION = 1
+
+
+class ReplayMissError(LookupError):
+    """Raised in strict replay mode when a command is not in the fixture."""
+
+
+class CommandRecorder:
+    """Captures command -> (stdout, stderr, exit code, latency) entries."""
+
+    def __init__(self, path: str, host: str = ""):
+        self.path = path
+        self.host = host
+        self.entries: List[Dict[str, Any]] = []
+
+    def record(self, command: str, stdout: str, stderr: str, exit_code: int, latency: float):
+        """Appends one executed command to the fixture."""
+        self.entries.append({
+            'command': command,
+            'stdout': stdout,
+            'stderr': stderr,
+            'exit_code': exit_code,
+            'latency': round(latency, 6),
+        })
+
+    def save(self) -> str:
+        """Writes the fixture file and returns its path."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        fixture = {
+            'version': FIXTURE_VERSION,
+            'host': self.host,
+            'recorded_at': datetime.now().isoformat(),
+            'commands': self.entries,
+        }
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(fixture, f, indent=2, ensure_ascii=False)
+        return self.path
+
+
+class ReplayTransport:
+    """
+    Serves recorded command results instead of talking to a server.
+
+    Repeated commands are answered in recording order; once a command's
+    recordings are exhausted the last one keeps being served. Every call
+    counts as one round trip, and each round trip costs `rtt` seconds of
+    simulated latency (or the recorded latency if `use_recorded_latency`).
+    """
+
+    def __init__(self, path: str, rtt: float = 0.0, use_recorded_latency: bool = False,
+                 strict: bool = False):
+        self.path = path
+        self.rtt = rtt
+        self.use_recorded_latency = use_recorded_latency
+        self.strict = strict
+        self.host = ""
+        self.round_trips = 0
+        self.misses: List[str] = []
+        self.simulated_latency = 0.0
+        self._responses: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._load()
+
+    def _load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            fixture = json.load(f)
+
+        if fixture.get('version') != FIXTURE_VERSION:
+            raise ValueError(f"Unsupported fixture version in {self.path}: {fixture.get('version')}")
+
+        self.host = fixture.get('host', '')
+        for entry in fixture.get('commands', []):
+            self._responses.setdefault(entry['command'], deque()).append(entry)
+
+    def execute(self, command: str) -> Tuple[str, str, int]:
+        """Returns the recorded (stdout, stderr, exit_code) for a command."""
+        self.round_trips += 1
+        queue = self._responses.get(command)
+
+        if not queue:
+            self.misses.append(command)
+            if self.strict:
+                raise ReplayMissError(f"Command not recorded: {command}")
+            return "", f"replay: command not recorded: {command}", 127
+
+        entry = queue.popleft() if len(queue) > 1 else queue[0]
+
+        delay = entry.get('latency', 0.0) if self.use_recorded_latency else self.rtt
+        if delay > 0:
+            time.sleep(delay)
+            self.simulated_latency += delay
+
+        return entry['stdout'], entry['stderr'], entry['exit_code']
+
+    def stats(self) -> Dict[str, Any]:
+        """Round-trip and latency counters for the current replay."""
+        return {
+            'fixture': self.path,
+            'round_trips': self.round_trips,
+            'misses': len(self.misses),
+            'simulated_latency': round(self.simulated_latency, 6),
+        }
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class CommandTimings:
+    """
+    Per-command timing instrumentation for remote calls.
+
+    Every executed command is stored with its label, wall time, bytes sent
+    and received, exit code, the diagnosis step that was active and the
+    analyzer method that issued it. `summary()` aggregates them into the
+    slowest commands, round trips per step/caller and a latency histogram.
+    """
+
+    def __init__(self, transport_methods: Iterable[str] = ()):
+        # Methods of the SSH wrapper itself; the caller is the first frame outside them
+        self.transport_methods = set(transport_methods) | {'execute_command'}
+        self.entries: List[Dict[str, Any]] = []
+        self.current_step = ""
+
+    @contextmanager
+    def step(self, name: str):
+        """Attributes every command executed inside the block to `name`."""
+        previous = self.current_step
+        self.current_step = name
+        try:
+            yield
+        finally:
+            self.current_step = previous
+
+    def _find_caller(self) -> str:
+        frame = sys._getframe(1)
+        while frame is not None:
+            code = frame.f_code
+            if code.co_filename != __file__ and code.co_name not in self.transport_methods:
+                owner = frame.f_locals.get('self')
+                if owner is not None:
+                    return f"{type(owner).__name__}.{code.co_name}"
+                return code.co_name
+            frame = frame.f_back
+        return ""
+
+    def record(self, command: str, label: str, wall: float, stdout: str, stderr: str, exit_code: int):
+        """Stores one executed command."""
+        self.entries.append({
+            'label': label or command[:80],
+            'command': command,
+            'wall': wall,
+            'bytes_out': len(command.encode('utf-8')),
+            'bytes_in': len(stdout.encode('utf-8')) + len(stderr.encode('utf-8')),
+            'exit_code': exit_code,
+            'step': self.current_step,
+            'caller': self._find_caller(),
+        })
+
+    def summary(self, top: int = 10) -> Dict[str, Any]:
+        """Aggregated view: totals, top-N slowest, per step/caller and histogram."""
+        per_step: Dict[str, Dict[str, Any]] = {}
+        per_caller: Dict[str, Dict[str, Any]] = {}
+        histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+        for entry in self.entries:
+            for key, table in ((entry['step'] or '-', per_step), (entry['caller'] or '-', per_caller)):
+                bucket = table.setdefault(key, {'round_trips': 0, 'seconds': 0.0})
+                bucket['round_trips'] += 1
+                bucket['seconds'] += entry['wall']
+            histogram[bisect_left(LATENCY_BUCKETS, entry['wall'])] += 1
+
+        for table in (per_step, per_caller):
+            for bucket in table.values():
+                bucket['seconds'] = round(bucket['seconds'], 6)
+
+        labels = [f"<={bound * 1000:g}ms" for bound in LATENCY_BUCKETS]
+        labels.append(f">{LATENCY_BUCKETS[-1] * 1000:g}ms")
+
+        slowest = sorted(self.entries, key=lambda e: e['wall'], reverse=True)[:top]
+        return {
+            'round_trips': len(self.entries),
+            'seconds': round(sum(e['wall'] for e in self.entries), 6),
+            'bytes_in': sum(e['bytes_in'] for e in self.entries),
+            'bytes_out': sum(e['bytes_out'] for e in self.entries),
+            'slowest': [
+                {k: (round(v, 6) if k == 'wall' else v) for k, v in e.items() if k != 'command'}
+                for e in slowest
+            ],
+            'per_step': per_step,
+            'per_caller': per_caller,
+            'histogram': dict(zip(labels, histogram)),
+        }
+
+    def format_summary(self, top: int = 10) -> str:
+        """Human readable summary for the --timings flag."""
+        summary = self.summary(top)
+        lines = [
+            "\n=== Remote command timings ===",
+            f"Round trips: {summary['round_trips']}  "
+            f"Total: {summary['seconds']:.3f}s  "
+            f"In: {summary['bytes_in']} B  Out: {summary['bytes_out']} B",
+            f"\nTop {len(summary['slowest'])} slowest:",
+        ]
+        for entry in summary['slowest']:
+            lines.append(f"  {entry['wall'] * 1000:9.1f}ms  [{entry['step'] or '-'}] "
+                         f"{entry['caller'] or '-'}: {entry['label']}")
+
+        for title, key in (("Round trips per step", 'per_step'), ("Round trips per caller", 'per_caller')):
+            lines.append(f"\n{title}:")
+            ranked = sorted(summary[key].items(), key=lambda item: item[1]['seconds'], reverse=True)
+            for name, bucket in ranked:
+                lines.append(f"  {bucket['round_trips']:6d}  {bucket['seconds']:9.3f}s  {name}")
+
+        lines.append("\nLatency histogram:")
+        for label, count in summary['histogram'].items():
+            if count:
+                lines.append(f"  {label:>10}  {count}")
+        return "\n".join(lines)
+
+    def save(self, path: str, top: int = 10) -> str:
+        """Writes the summary and every timed command as JSON."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'summary': self.summary(top), 'commands': self.entries}, f, indent=2,
+                      ensure_ascii=False)
+        return path
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Access Log Analyzer - Tasa de requests, estados y latencia por vhost desde los access logs
+"""
+
+import json
+from typing import Any, Dict
+from ..core.ssh_manager import SSHManager, round_trip_budget
+from ..core.log_reader import LOG_DIR, LogState
+from ..core.access_log import build_access_log_command, merge_vhost_stats, rank, summarize_vhost
+
+# Mínimo de requests para entrar en los rankings de errores (evita 1 de 1 = 100%)
+MIN_REQUESTS_FOR_RATES = 20
+
+
+class AccessLogAnalyzer:
+    def __init__(self, ssh_manager: SSHManager, log_dir: str = LOG_DIR):
+        self.ssh = ssh_manager
+        self.log_dir = log_dir
+        # Con record/replay los comandos tienen que ser deterministas: sin offsets guardados
+        self.state = LogState(f"{ssh_manager.config['hostname']}:{ssh_manager.config['port']}", 'access',
+                              persist=not (ssh_manager.replay or ssh_manager.recorder))
+
+    @round_trip_budget(1)
+    def analyze(self, reset: bool = False, max_bytes: int = 0, top: int = 10) -> Dict[str, Any]:
+        """
+        Leer los bytes nuevos de todos los access logs y resumir por vhost
+
+        Un comando: el script remoto lee desde los offsets guardados y
+        devuelve agregados; los offsets y totales se actualizan localmente.
+        `run` resume lo leído en esta corrida y `totals` todo lo acumulado.
+        """
+        if reset:
+            self.state.reset()
+        first_run = self.state.first_run
+
+        stdout, stderr, exit_code = self.ssh.execute_command(
+            build_access_log_command(self.state.data, self.log_dir, max_bytes),
+            f"Leyendo access logs de {self.log_dir} desde los offsets guardados",
+            echo_output=False
+        )
+        if exit_code != 0:
+            return {'success': False, 'error': stderr.strip() or f"Código {exit_code}"}
+
+        try:
+            result = json.loads(stdout)
+        except json.JSONDecodeError:
+            return {'success': False, 'error': 'Salida inválida del lector de logs'}
+
+        self.state.apply(result, merge_vhost_stats)
+        self.state.save()
+
+        run = [summarize_vhost(vhost, stats) for vhost, stats in result['vhosts'].items() if stats['requests']]
+        totals = [summarize_vhost(vhost, stats) for vhost, stats in self.state.data['vhosts'].items()]
+
+        return {
+            'success': True,
+            'first_run': first_run,
+            'files': len(result['files']),
+            'truncated': result['truncated'],
+            'requests': sum(item['requests'] for item in run),
+            'latency_available': any(item['latency_ms'] for item in totals),
+            'run': sorted(run, key=lambda item: item['requests'], reverse=True),
+            'totals': sorted(totals, key=lambda item: item['requests'], reverse=True),
+            # La tasa reciente (lo leído en esta corrida) es la que muestra la carga actual
+            'busiest': rank(run or totals, lambda item: item['rps'], limit=top),
+            'most_5xx': rank(totals, lambda item: item['rate_5xx'], MIN_REQUESTS_FOR_RATES, top),
+            'most_4xx': rank(totals, lambda item: item['rate_4xx'], MIN_REQUESTS_FOR_RATES, top),
+            'slowest': rank(totals, lambda item: item['latency_ms']['p90'] if item['latency_ms'] else None,
+                            MIN_REQUESTS_FOR_RATES, top),
+        }
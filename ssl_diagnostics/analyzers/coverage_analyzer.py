@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Coverage Analyzer - Cobertura de server_name por los SAN de los certificados
+"""
+
+import posixpath
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+from ..core.ssh_manager import SSHManager, round_trip_budget
+from ..core.nginx_manager import NginxManager
+from ..core.ssl_manager import SSLManager
+from ..core.nginx_config import block_listens
+
+
+class SanIndex:
+    """
+    Índice hash de SANs → certificados
+    
+    Los nombres exactos y los comodines (`*.dominio`, sin el `*.`) van en
+    tablas separadas: un hostname se resuelve con dos búsquedas, la exacta y
+    la de su dominio padre (un comodín cubre exactamente una etiqueta).
+    """
+    
+    def __init__(self):
+        self.exact: Dict[str, Set[str]] = defaultdict(set)
+        self.wildcard: Dict[str, Set[str]] = defaultdict(set)
+    
+    def add(self, san: str, certificate: str):
+        san = san.lower().rstrip('.')
+        if san.startswith('*.'):
+            self.wildcard[san[2:]].add(certificate)
+        elif san:
+            self.exact[san].add(certificate)
+    
+    def lookup(self, hostname: str) -> Set[str]:
+        """Certificados cuyos SAN cubren `hostname`"""
+        hostname = hostname.lower().rstrip('.')
+        if hostname.startswith('*.'):
+            # Un server_name comodín solo lo cubre el mismo comodín
+            return set(self.wildcard.get(hostname[2:], ()))
+        
+        found = set(self.exact.get(hostname, ()))
+        _, dot, parent = hostname.partition('.')
+        if dot:
+            found |= self.wildcard.get(parent, set())
+        return found
+
+
+def is_tls_block(block: Dict[str, Any]) -> bool:
+    """El bloque sirve HTTPS: algún listen con `ssl` o en el puerto 443"""
+    return any(listen.ssl or listen.port == 443 for listen in block_listens(block))
+
+
+def expand_server_name(name: str) -> Optional[List[str]]:
+    """
+    Hostnames a verificar para un server_name
+    
+    `.dominio` equivale a `dominio` + `*.dominio`. Devuelve None para los
+    que no se pueden verificar contra SANs (regex, comodín final, variables).
+    """
+    if name.startswith('~') or name.endswith('.*') or '$' in name:
+        return None
+    if name.startswith('.'):
+        return [name[1:], f"*{name}"]
+    return [name]
+
+
+class CoverageAnalyzer:
+    def __init__(self, ssh_manager: SSHManager):
+        self.ssh = ssh_manager
+        self.nginx = NginxManager(ssh_manager)
+        self.ssl = SSLManager(ssh_manager)
+    
+    @round_trip_budget(3)
+    def analyze_coverage(self) -> Dict[str, Any]:
+        """
+        Matriz de cobertura de todo el host: cada server_name servido por
+        HTTPS contra los SAN del `ssl_certificate` de su bloque
+        
+        Un snapshot de nginx + los certificados referenciados (con cache);
+        el cruce es local, con un índice hash de SANs.
+        """
+        blocks = self.nginx.get_server_blocks()
+        tls_blocks = [block for block in blocks if is_tls_block(block)]
+        
+        # Rutas relativas resueltas contra el directorio de nginx.conf, sin tocar
+        # los bloques (vienen del inventario compartido)
+        config_dir = posixpath.dirname(self.nginx.nginx_conf)
+        resolved = []
+        for block in tls_blocks:
+            certificate = block['ssl_certificate']
+            if certificate and '$' not in certificate and not certificate.startswith('/'):
+                certificate = posixpath.join(config_dir, certificate)
+            resolved.append((block, certificate))
+        
+        paths = sorted({certificate for _, certificate in resolved
+                        if certificate and '$' not in certificate})
+        certificates = self._load_certificates(paths)
+        
+        index = SanIndex()
+        for path, details in certificates.items():
+            names = details.get('sans') or ([details['common_name']] if details.get('common_name') else [])
+            for name in names:
+                index.add(name, path)
+        
+        analysis = {
+            'server_blocks': len(blocks),
+            'tls_blocks': len(tls_blocks),
+            'certificates': len(paths),
+            'hostnames_checked': 0,
+            'covered': 0,
+            'uncovered': [],
+            'unchecked': []
+        }
+        
+        for block, certificate in resolved:
+            location = {'config': block['file'], 'line': block['line'], 'certificate': certificate}
+            
+            for server_name in block['server_names']:
+                if server_name in ('_', '""', ''):
+                    continue
+                hostnames = expand_server_name(server_name)
+                if hostnames is None or '$' in certificate:
+                    reason = 'dynamic_certificate' if '$' in certificate else 'pattern_server_name'
+                    analysis['unchecked'].append({'hostname': server_name, **location, 'reason': reason})
+                    continue
+                
+                for hostname in hostnames:
+                    analysis['hostnames_checked'] += 1
+                    covering = index.lookup(hostname)
+                    reason = self._uncovered_reason(certificate, certificates, covering)
+                    if reason is None:
+                        analysis['covered'] += 1
+                        continue
+                    
+                    analysis['uncovered'].append({
+                        'hostname': hostname,
+                        **location,
+                        'reason': reason,
+                        'covered_by': sorted(covering),
+                        'description': self._describe(hostname, certificate, reason)
+                    })
+        
+        return analysis
+    
+    def _load_certificates(self, paths: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Detalles por ruta: los de cert_dir salen del cache de SSLManager, el resto por ruta"""
+        details: Dict[str, Dict[str, Any]] = {}
+        in_cert_dir: Dict[str, str] = {}
+        other: List[str] = []
+        
+        for path in paths:
+            domain_dir, name = posixpath.split(path)
+            if posixpath.dirname(domain_dir) == self.ssl.cert_dir and name == 'fullchain.pem':
+                in_cert_dir[posixpath.basename(domain_dir)] = path
+            else:
+                other.append(path)
+        
+        if in_cert_dir:
+            for info in self.ssl.get_certificates_info(sorted(in_cert_dir)):
+                if info['fullchain_exists']:
+                    details[in_cert_dir[info['domain']]] = info['certificate_details']
+        if other:
+            for path, info in self.ssl.get_certificates_by_path(other).items():
+                if info['exists']:
+                    details[path] = info['certificate_details']
+        
+        return details
+    
+    def _uncovered_reason(self, certificate: str, certificates: Dict[str, Dict[str, Any]],
+                          covering: Set[str]) -> Optional[str]:
+        if not certificate:
+            return 'no_certificate'
+        if certificate not in certificates:
+            return 'certificate_missing'
+        if certificates[certificate].get('parse_error'):
+            return 'certificate_unreadable'
+        if certificate not in covering:
+            return 'san_mismatch'
+        return None
+    
+    def _describe(self, hostname: str, certificate: str, reason: str) -> str:
+        descriptions = {
+            'no_certificate': f"{hostname} se sirve por HTTPS sin ssl_certificate",
+            'certificate_missing': f"{hostname}: el certificado {certificate} no existe",
+            'certificate_unreadable': f"{hostname}: el certificado {certificate} no se pudo parsear",
+            'san_mismatch': f"{hostname} no está en los SAN de {certificate}",
+        }
+        return descriptions[reason]
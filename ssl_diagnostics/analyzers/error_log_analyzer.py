@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Error Log Analyzer - Errores SSL/handshake y de upstream por vhost desde los error logs de nginx
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+from ..core.ssh_manager import SSHManager, round_trip_budget
+from ..core.log_reader import LOG_DIR, LogState
+from ..core.access_log import rank
+from ..core.error_log import (add_class_totals, build_error_log_command, merge_error_stats, summarize_domain,
+                              summarize_errors)
+
+
+class ErrorLogAnalyzer:
+    def __init__(self, ssh_manager: SSHManager, log_dir: str = LOG_DIR):
+        self.ssh = ssh_manager
+        self.log_dir = log_dir
+        # Con record/replay los comandos tienen que ser deterministas: sin offsets guardados
+        self.state = LogState(f"{ssh_manager.config['hostname']}:{ssh_manager.config['port']}", 'error',
+                              persist=not (ssh_manager.replay or ssh_manager.recorder))
+
+    @round_trip_budget(1)
+    def analyze(self, reset: bool = False, max_bytes: int = 0, top: int = 10,
+                domain: Optional[str] = None, domains: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Clasificar las líneas nuevas de todos los error logs por vhost y clase
+
+        Un comando, como AccessLogAnalyzer: solo viajan los contadores.
+        `run` resume lo leído en esta corrida y `totals` todo lo acumulado;
+        con `domain` se agrega el detalle de ese sitio (y su www.) y con
+        `domains` el de cada uno (`by_domain`), todos de la misma lectura.
+        """
+        if reset:
+            self.state.reset()
+        first_run = self.state.first_run
+
+        stdout, stderr, exit_code = self.ssh.execute_command(
+            build_error_log_command(self.state.data, self.log_dir, max_bytes),
+            f"Clasificando error logs de {self.log_dir} desde los offsets guardados",
+            echo_output=False
+        )
+        if exit_code != 0:
+            return {'success': False, 'error': stderr.strip() or f"Código {exit_code}"}
+
+        try:
+            result = json.loads(stdout)
+        except json.JSONDecodeError:
+            return {'success': False, 'error': 'Salida inválida del lector de logs'}
+
+        self.state.apply(result, merge_error_stats)
+        self.state.save()
+
+        run = [summarize_errors(vhost, stats) for vhost, stats in result['vhosts'].items() if stats['events']]
+        totals = [summarize_errors(vhost, stats) for vhost, stats in self.state.data['vhosts'].items()]
+
+        analysis = {
+            'success': True,
+            'first_run': first_run,
+            'files': len(result['files']),
+            'truncated': result['truncated'],
+            'events': sum(item['events'] for item in run),
+            'ssl_events': sum(item['ssl_events'] for item in run),
+            'classes': add_class_totals(run),
+            'run': sorted(run, key=lambda item: item['events'], reverse=True),
+            'totals': sorted(totals, key=lambda item: item['events'], reverse=True),
+            # Los peores sitios según lo leído en esta corrida (lo acumulado si no hubo líneas nuevas)
+            'top_offenders': rank(run or totals, lambda item: item['events'], limit=top, count_key='events'),
+            'top_ssl': rank(run or totals, lambda item: item['ssl_events'] or None, limit=top, count_key='events'),
+        }
+
+        by_vhost = {item['vhost']: item for item in totals}
+        if domain:
+            analysis['domain'] = summarize_domain(by_vhost, domain)
+        if domains:
+            analysis['by_domain'] = {name: summarize_domain(by_vhost, name) for name in domains}
+
+        return analysis
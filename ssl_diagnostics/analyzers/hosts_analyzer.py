@@ -3,17 +3,32 @@
 Hosts Analyzer - Análisis del archivo /etc/hosts
 """
 
-import re
-from typing import Dict, List, Tuple, Any
-from ..core.ssh_manager import SSHManager
+from typing import Dict, List, Any
+from ..core.ssh_manager import SSHManager, round_trip_budget
+from ..core.analysis_cache import AnalysisCache
+from ..core.hosts_file import LOCALHOST_NAMES, LOOPBACK_IPS, MALFORMED_RE, HostsEntry, HostsFile
 
 class HostsAnalyzer:
     def __init__(self, ssh_manager: SSHManager):
         self.ssh = ssh_manager
         self.hosts_file = "/etc/hosts"
+        self.cache = AnalysisCache.for_connection(ssh_manager)
     
+    @round_trip_budget(1)
     def analyze_hosts_file(self) -> Dict[str, Any]:
-        """Análisis completo del archivo /etc/hosts"""
+        """
+        Análisis completo del archivo /etc/hosts
+        
+        El archivo se lee y parsea una sola vez (HostsFile); `hosts` queda en
+        el resultado para que HostsFixer arme sus correcciones sobre el mismo
+        modelo, e `issues` lista los problemas corregibles. Es un análisis del
+        host: se reusa del cache (AnalysisCache) mientras el archivo no cambie.
+        """
+        cached = self.cache.lookup(self.ssh, 'hosts_analysis')
+        if cached is not None:
+            cached['hosts'] = HostsFile(cached['content'])
+            return cached
+        
         analysis = {
             'file_exists': False,
             'total_lines': 0,
@@ -21,94 +36,116 @@ class HostsAnalyzer:
             'domain_entries': [],
             'malformed_entries': [],
             'problematic_domains': [],
+            'duplicate_domains': [],
+            'issues': [],
+            'content': '',
+            'hosts': None,
             'has_problems': False
         }
         
-        if not self.ssh.file_exists(self.hosts_file):
+        success, content = self.ssh.read_file(self.hosts_file)
+        if not success:
             return analysis
         
         analysis['file_exists'] = True
+        analysis['content'] = content
+        hosts = HostsFile(content)
+        analysis['hosts'] = hosts
+        analysis['total_lines'] = len([l for l in hosts.lines if l.strip()])
         
-        # Leer contenido del archivo
-        stdout, _, _ = self.ssh.execute_command(
-            f"cat {self.hosts_file}",
-            "Leyendo archivo /etc/hosts"
-        )
-        
-        lines = stdout.split('\n')
-        analysis['total_lines'] = len([l for l in lines if l.strip()])
+        for line_number, line in hosts.malformed.items():
+            analysis['malformed_entries'].append(self._malformed_entry(line, line_number))
         
-        for line_num, line in enumerate(lines, 1):
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            
-            entry_analysis = self._analyze_hosts_entry(line, line_num)
-            
+        for entry in hosts.entries.values():
+            entry_analysis = self._analyze_hosts_entry(entry)
             if entry_analysis['type'] == 'localhost':
                 analysis['localhost_entries'].append(entry_analysis)
             elif entry_analysis['type'] == 'domain':
                 analysis['domain_entries'].append(entry_analysis)
-            elif entry_analysis['type'] == 'malformed':
-                analysis['malformed_entries'].append(entry_analysis)
-                analysis['has_problems'] = True
         
         # Identificar dominios problemáticos
         analysis['problematic_domains'] = self._identify_problematic_domains(
             analysis['domain_entries']
         )
+        duplicates = hosts.duplicated_names()
+        analysis['duplicate_domains'] = sorted(duplicates)
         
-        if analysis['problematic_domains']:
-            analysis['has_problems'] = True
+        analysis['issues'] = self._build_issues(hosts, analysis, duplicates)
+        analysis['has_problems'] = bool(analysis['issues'])
         
+        # El modelo parseado no se serializa: se reconstruye del contenido
+        self.cache.store('hosts_analysis', {**analysis, 'hosts': None})
         return analysis
     
-    def _analyze_hosts_entry(self, line: str, line_num: int) -> Dict[str, Any]:
-        """Analizar una entrada específica del hosts"""
-        entry = {
+    def _build_issues(self, hosts: HostsFile, analysis: Dict[str, Any],
+                      duplicates: Dict[str, List[HostsEntry]]) -> List[Dict[str, Any]]:
+        """Problemas corregibles, con las líneas exactas que afectan"""
+        issues = []
+        
+        for entry in analysis['malformed_entries']:
+            issues.append({
+                'type': 'malformed_line',
+                'line_number': entry['line_number'],
+                'line': entry['original_line'],
+                'description': f"Línea {entry['line_number']} malformada: {entry['original_line']}"
+            })
+        
+        for domain in analysis['problematic_domains']:
+            entries = [entry for entry in hosts.entries_for(domain) if entry.ip in LOOPBACK_IPS]
+            issues.append({
+                'type': 'problematic_domain',
+                'domain': domain,
+                'current_ip': entries[0].ip if entries else '',
+                'line_numbers': [entry.line_number for entry in entries],
+                'description': f"{domain} apunta a localhost (líneas {', '.join(str(e.line_number) for e in entries)})"
+            })
+        
+        for domain, entries in sorted(duplicates.items()):
+            if domain in analysis['problematic_domains']:
+                continue
+            issues.append({
+                'type': 'duplicate_entry',
+                'domain': domain,
+                'ips': [entry.ip for entry in entries],
+                'line_numbers': [entry.line_number for entry in entries],
+                'description': f"{domain} declarado {len(entries)} veces ({', '.join(entry.ip for entry in entries)})"
+            })
+        
+        return issues
+    
+    def _malformed_entry(self, line: str, line_num: int) -> Dict[str, Any]:
+        """Entrada de una línea que no se pudo parsear como 'ip nombre...'"""
+        problem = ("Línea malformada - dominios concatenados sin espacios" if MALFORMED_RE.search(line)
+                   else "Formato inválido - menos de 2 elementos")
+        return {
             'line_number': line_num,
             'original_line': line,
-            'type': 'unknown',
+            'type': 'malformed',
             'ip': '',
             'hostnames': [],
+            'is_malformed': True,
+            'problems': [problem]
+        }
+    
+    def _analyze_hosts_entry(self, entry: HostsEntry) -> Dict[str, Any]:
+        """Clasificar una entrada ya parseada del hosts"""
+        result = {
+            'line_number': entry.line_number,
+            'original_line': ' '.join([entry.ip] + entry.names),
+            'type': 'external',
+            'ip': entry.ip,
+            'hostnames': entry.names,
             'is_malformed': False,
             'problems': []
         }
         
-        # Verificar si la línea está malformada (texto concatenado sin espacios)
-        if self._is_malformed_line(line):
-            entry['type'] = 'malformed'
-            entry['is_malformed'] = True
-            entry['problems'].append("Línea malformada - dominios concatenados sin espacios")
-            return entry
-        
-        # Parsear línea normal
-        parts = line.split()
-        if len(parts) < 2:
-            entry['type'] = 'malformed'
-            entry['is_malformed'] = True
-            entry['problems'].append("Formato inválido - menos de 2 elementos")
-            return entry
-        
-        entry['ip'] = parts[0]
-        entry['hostnames'] = parts[1:]
-        
-        # Clasificar tipo de entrada
-        if entry['ip'] in ['127.0.0.1', '::1']:
-            if any(host in ['localhost', 'localhost.localdomain'] for host in entry['hostnames']):
-                entry['type'] = 'localhost'
+        if entry.ip in LOOPBACK_IPS:
+            if any(host in LOCALHOST_NAMES for host in entry.names):
+                result['type'] = 'localhost'
             else:
-                entry['type'] = 'domain'
-        else:
-            entry['type'] = 'external'
+                result['type'] = 'domain'
         
-        return entry
-    
-    def _is_malformed_line(self, line: str) -> bool:
-        """Detectar líneas malformadas como '127.0.0.1 domain1127.0.0.1 domain2'"""
-        # Buscar patrones como IP+texto+IP
-        pattern = r'127\.0\.0\.1\s*\w+127\.0\.0\.1'
-        return bool(re.search(pattern, line))
+        return result
     
     def _identify_problematic_domains(self, domain_entries: List[Dict[str, Any]]) -> List[str]:
         """Identificar dominios que podrían causar problemas"""
@@ -119,10 +156,10 @@ class HostsAnalyzer:
         
         for entry in domain_entries:
             for hostname in entry['hostnames']:
-                if hostname in problem_domains:
-                    problematic.append(hostname)
+                if hostname.lower() in problem_domains:
+                    problematic.append(hostname.lower())
         
-        return list(set(problematic))
+        return sorted(set(problematic))
     
     def suggest_fixes(self, analysis: Dict[str, Any]) -> List[Dict[str, str]]:
         """Sugerir correcciones basadas en el análisis"""
@@ -4,105 +4,151 @@ Nginx Analyzer - Análisis de configuraciones nginx
 """
 
 import os
-from typing import Dict, List, Any
-from ..core.ssh_manager import SSHManager
+from typing import Any, Dict, List, Tuple
+from ..core.ssh_manager import SSHManager, round_trip_budget
 from ..core.nginx_manager import NginxManager
+from ..core.nginx_config import build_socket_table, find_name_conflicts, index_server_names, is_catch_all
 
 class NginxAnalyzer:
     def __init__(self, ssh_manager: SSHManager):
         self.ssh = ssh_manager
         self.nginx = NginxManager(ssh_manager)
     
+    @round_trip_budget(2)
     def analyze_domain_issues(self, target_domain: str) -> Dict[str, Any]:
         """Análisis completo de problemas nginx para un dominio"""
-        analysis = {
-            'target_domain': target_domain,
-            'has_active_config': False,
-            'active_config_file': '',
-            'interceptors': [],
-            'conflicts': [],
-            'issues': [],
-            'nginx_test_passed': False
-        }
-        
-        # Verificar si nginx funciona
-        test_passed, test_output = self.nginx.test_config()
-        analysis['nginx_test_passed'] = test_passed
-        
-        if not test_passed:
-            analysis['issues'].append({
-                'type': 'nginx_config_error',
-                'description': 'Nginx tiene errores de configuración',
-                'details': test_output
-            })
+        return self.analyze_domains([target_domain])[target_domain]
+    
+    @round_trip_budget(2)
+    def analyze_domains(self, domains: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Problemas nginx de varios dominios contra un único snapshot
         
-        # Buscar configuración activa del dominio
-        active_configs = self.nginx.get_active_configs()
-        for config in active_configs:
-            config_basename = os.path.basename(config)
-            if target_domain in config_basename:
-                analysis['has_active_config'] = True
-                analysis['active_config_file'] = config
-                break
-        
-        # Analizar interceptores
-        interceptors = self.nginx.find_interceptors(target_domain)
-        analysis['interceptors'] = interceptors
-        
-        if interceptors:
-            analysis['issues'].append({
-                'type': 'request_interceptors',
-                'description': f'Encontradas {len(interceptors)} configuraciones que pueden interceptar requests',
-                'details': interceptors
-            })
+        nginx -t y el inventario son del host (cacheados por huella) y se
+        obtienen una vez; la tabla socket -> bloques y el índice de
+        server_name también se arman una vez, y cada dominio se evalúa en
+        memoria: diagnosticar todos los sitios cuesta casi lo mismo que uno.
+        """
+        # Verificar si nginx funciona (nginx -t e inventario son del host: cacheados por huella)
+        test_passed, test_output = self.nginx.test_config(cached=True)
         
-        # Buscar conflictos de configuración
-        conflicts = self._find_configuration_conflicts(target_domain, active_configs)
-        analysis['conflicts'] = conflicts
+        # Un snapshot alcanza para todo lo que sigue
+        inventory = self.nginx.get_vhost_inventory()
+        blocks = inventory['blocks']
+        table = build_socket_table(blocks)
+        names = index_server_names(blocks)
+        active_configs = [path for path in inventory['files'] if path.startswith(f"{self.nginx.vhost_dir}/")]
+        by_basename = {os.path.basename(path): path for path in active_configs}
         
-        if conflicts:
-            analysis['issues'].append({
-                'type': 'configuration_conflicts',
-                'description': f'Encontrados {len(conflicts)} conflictos de configuración',
-                'details': conflicts
-            })
+        analyses = {}
+        for target_domain in domains:
+            analysis = {
+                'target_domain': target_domain,
+                'has_active_config': False,
+                'active_config_file': '',
+                'interceptors': [],
+                'conflicts': [],
+                'issues': [],
+                'nginx_test_passed': test_passed
+            }
+            
+            if not test_passed:
+                analysis['issues'].append({
+                    'type': 'nginx_config_error',
+                    'description': 'Nginx tiene errores de configuración',
+                    'details': test_output
+                })
+            
+            # Configuración activa del dominio: <dominio>.conf o el primer archivo que lo nombra
+            config = by_basename.get(f"{target_domain}.conf") or next(
+                (path for path in active_configs if target_domain in os.path.basename(path)), '')
+            analysis['has_active_config'] = bool(config)
+            analysis['active_config_file'] = config
+            
+            # Analizar interceptores
+            interceptors = self.nginx.find_interceptors(target_domain, blocks, table, names)
+            analysis['interceptors'] = interceptors
+            
+            if interceptors:
+                analysis['issues'].append({
+                    'type': 'request_interceptors',
+                    'description': f'Encontradas {len(interceptors)} configuraciones que interceptan requests',
+                    'details': interceptors
+                })
+            
+            # Buscar conflictos de configuración
+            conflicts = self._find_configuration_conflicts(target_domain, table, names)
+            analysis['conflicts'] = conflicts
+            
+            if conflicts:
+                analysis['issues'].append({
+                    'type': 'configuration_conflicts',
+                    'description': f'Encontrados {len(conflicts)} conflictos de configuración',
+                    'details': conflicts
+                })
+            
+            analyses[target_domain] = analysis
         
-        return analysis
+        return analyses
     
-    def _find_configuration_conflicts(self, target_domain: str, active_configs: List[str]) -> List[Dict[str, Any]]:
-        """Encontrar conflictos de configuración específicos"""
-        conflicts = []
+    def _find_configuration_conflicts(self, target_domain: str, table: Dict[Tuple[str, int], Dict[str, Any]],
+                                      names: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Encontrar conflictos de configuración en los sockets del dominio
         
-        # Configuraciones que podrían interceptar por orden alfabético
+        Con la tabla socket -> bloques (una pasada sobre todos los vhosts):
+        default_server duplicados, el mismo server_name declarado por otro
+        bloque en el mismo socket y catch-all que quedan como servidor por
+        defecto solo por venir antes en orden alfabético. Los bloques que
+        declaran el dominio salen del índice de server_name.
+        """
+        conflicts = []
+        seen = set()
+        hostname = target_domain.lower()
         target_config_name = f"{target_domain}.conf"
+        # Con o sin punto inicial (".dominio" también lo declara), cada bloque una vez
+        candidates = list({id(block): block for block in names.get(hostname, []) + names.get(f".{hostname}", [])}
+                          .values())
+        
+        def add(conflict_type: str, block: Dict[str, Any], description: str):
+            key = (conflict_type, block['file'], block['line'])
+            if key in seen:
+                return
+            seen.add(key)
+            conflicts.append({
+                'config_file': block['file'],
+                'line': block['line'],
+                'type': conflict_type,
+                'description': description,
+                'server_names': block['server_names'],
+                'listen_ports': [' '.join(args) for args in block['listen']]
+            })
         
-        for config in active_configs:
-            config_basename = os.path.basename(config)
+        for (address, port), entry in sorted(table.items(), key=lambda item: (item[0][1], item[0][0])):
+            if hostname not in entry['exact']:
+                continue
+            socket_name = f"{address}:{port}"
+            
+            # Más de un default_server en el mismo socket: `nginx -t` falla
+            for block in entry['defaults'][1:]:
+                add('duplicate_default_server', block,
+                    f"{os.path.basename(block['file'])} declara un segundo default_server en {socket_name}")
             
-            # Si viene antes alfabéticamente
-            if config_basename < target_config_name:
-                server_names = self.nginx.get_server_names(config)
-                listen_ports = self.nginx.get_listen_ports(config)
-                
-                # Si no tiene server_name específico (catch-all)
-                if not server_names or any('_' in name for name in server_names):
-                    conflicts.append({
-                        'config_file': config,
-                        'type': 'alphabetical_priority_catchall',
-                        'description': f'{config_basename} viene antes alfabéticamente y es catch-all',
-                        'server_names': server_names,
-                        'listen_ports': listen_ports
-                    })
-                
-                # Si escucha en los mismos puertos que necesitamos
-                if any('80' in port or '443' in port for port in listen_ports):
-                    conflicts.append({
-                        'config_file': config,
-                        'type': 'port_conflict',
-                        'description': f'{config_basename} escucha en puertos 80/443',
-                        'server_names': server_names,
-                        'listen_ports': listen_ports
-                    })
+            # Mismo nombre en el mismo socket: nginx usa el primero cargado e ignora el resto
+            declaring = [block for block in candidates if socket_name in block['sockets']]
+            for block in declaring:
+                if len(declaring) > 1 and target_domain not in os.path.basename(block['file']):
+                    add('server_name_conflict', block,
+                        f"{os.path.basename(block['file'])} también declara {target_domain} en {socket_name}")
+            
+            # Catch-all que es el servidor por defecto solo por orden alfabético
+            default = entry['default']
+            default_name = os.path.basename(default['file'])
+            if (not entry['explicit_default'] and all(default is not block for block in declaring)
+                    and is_catch_all(default) and default_name < target_config_name):
+                add('alphabetical_priority_catchall', default,
+                    f'{default_name} viene antes alfabéticamente y es catch-all '
+                    f'(servidor por defecto de {socket_name})')
         
         return conflicts
     
@@ -129,7 +175,8 @@ class NginxAnalyzer:
                 'issue': f'Configuración {config_name} intercepta requests para {target_domain}',
                 'fix': f'Deshabilitar {config_name} agregando .disabled',
                 'risk_level': 'MEDIO',
-                'step_id': f'disable_{config_name.replace(".", "_")}'
+                'step_id': f'disable_{config_name.replace(".", "_")}',
+                'config_file': config_file
             })
         
         # Resolver conflictos de configuración
@@ -142,7 +189,8 @@ class NginxAnalyzer:
                     'issue': f'{config_name} es catch-all y tiene prioridad alfabética',
                     'fix': f'Deshabilitar {config_name} o crear configuración con mayor prioridad',
                     'risk_level': 'MEDIO',
-                    'step_id': f'fix_priority_{config_name.replace(".", "_")}'
+                    'step_id': f'fix_priority_{config_name.replace(".", "_")}',
+                    'config_file': config_file
                 })
         
         # Si no hay configuración activa para el dominio
@@ -156,19 +204,32 @@ class NginxAnalyzer:
         
         return fixes
     
+    @round_trip_budget(2)
     def analyze_all_configurations(self) -> Dict[str, Any]:
-        """Análisis general de todas las configuraciones nginx"""
+        """
+        Análisis general de todas las configuraciones nginx
+        
+        Un snapshot (nginx.conf + vhosts) y el listado de deshabilitadas; el
+        resto es una pasada local sobre la tabla socket -> bloques: catch-all,
+        server_names duplicados por socket, solapamientos de comodines/regex
+        y bloques que nunca atienden un request.
+        """
         analysis = {
             'total_active_configs': 0,
             'total_disabled_configs': 0,
             'active_configs': [],
             'disabled_configs': [],
             'catch_all_configs': [],
-            'duplicate_server_names': []
+            'duplicate_server_names': [],
+            'overlapping_patterns': [],
+            'shadowed_blocks': [],
+            'sockets': []
         }
         
-        # Obtener configuraciones activas
-        active_configs = self.nginx.get_active_configs()
+        # Configuraciones activas y sus bloques server (un solo round trip para todos los archivos)
+        inventory = self.nginx.get_vhost_inventory()
+        blocks = inventory['blocks']
+        active_configs = [path for path in inventory['files'] if path.startswith(f"{self.nginx.vhost_dir}/")]
         analysis['total_active_configs'] = len(active_configs)
         analysis['active_configs'] = active_configs
         
@@ -177,29 +238,21 @@ class NginxAnalyzer:
         analysis['total_disabled_configs'] = len(disabled_configs)
         analysis['disabled_configs'] = disabled_configs
         
-        # Identificar configuraciones catch-all
-        for config in active_configs:
-            server_names = self.nginx.get_server_names(config)
-            if not server_names or any('_' in name for name in server_names):
+        table = build_socket_table(blocks)
+        analysis['sockets'] = [f"{address}:{port}" for address, port in sorted(table, key=lambda s: (s[1], s[0]))]
+        
+        for block in blocks:
+            if is_catch_all(block):
                 analysis['catch_all_configs'].append({
-                    'config_file': config,
-                    'server_names': server_names
+                    'config_file': block['file'],
+                    'line': block['line'],
+                    'server_names': block['server_names'],
+                    'sockets': block['sockets']
                 })
         
-        # Buscar server_names duplicados
-        server_name_map = {}
-        for config in active_configs:
-            server_names = self.nginx.get_server_names(config)
-            for server_name in server_names:
-                if server_name not in server_name_map:
-                    server_name_map[server_name] = []
-                server_name_map[server_name].append(config)
-        
-        for server_name, configs in server_name_map.items():
-            if len(configs) > 1:
-                analysis['duplicate_server_names'].append({
-                    'server_name': server_name,
-                    'configs': configs
-                })
+        conflicts = find_name_conflicts(table)
+        analysis['duplicate_server_names'] = conflicts['duplicates']
+        analysis['overlapping_patterns'] = conflicts['overlaps']
+        analysis['shadowed_blocks'] = conflicts['shadowed']
         
-        return analysis
\ No newline at end of file
+        return analysis
@@ -6,7 +6,7 @@ Este modulo es de solo lectura: no modifica archivos remotos.
 """
 
 from typing import Dict, Any, List, Optional
-from ..core.ssh_manager import SSHManager
+from ..core.ssh_manager import SSHManager, round_trip_budget
 
 
 class AAPanelAnalyzer:
@@ -23,6 +23,7 @@ class AAPanelAnalyzer:
             return ""
         return stdout.strip()
 
+    @round_trip_budget(3)
     def start_aapanel_if_needed(self) -> Dict[str, Any]:
         """Levanta aaPanel si esta caido y devuelve resultado de la operacion."""
         result: Dict[str, Any] = {
@@ -59,6 +60,7 @@ class AAPanelAnalyzer:
 
         return result
 
+    @round_trip_budget(9)
     def analyze_panel_endpoint(
         self,
         public_host: str,
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Resolution Analyzer - Cruce de /etc/hosts y resolver contra las direcciones del propio host
+"""
+
+import base64
+import ipaddress
+import shlex
+from typing import Any, Dict, List, Optional, Set
+from ..core.ssh_manager import SSHManager, round_trip_budget
+from ..core.nginx_manager import NginxManager
+from ..core.hosts_file import HostsFile
+from .coverage_analyzer import expand_server_name
+
+RESOLVE_MARKER = "@@ssl-diag-dns"
+
+# Resoluciones en paralelo en el servidor y tope por nombre (segundos)
+RESOLVE_CONCURRENCY = 64
+RESOLVE_TIMEOUT = 5
+
+# Bytes de nombres por comando (un argumento de `sh -c` no puede superar 128 KiB)
+NAMES_CHUNK = 64 * 1024
+
+# Códigos de salida de `getent`/`timeout`
+GETENT_NOT_FOUND = 2
+TIMEOUT_EXIT = 124
+
+
+def is_ip_literal(value: str) -> bool:
+    try:
+        ipaddress.ip_address(value)
+        return True
+    except ValueError:
+        return False
+
+
+def is_loopback(address: str) -> bool:
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
+
+def parse_resolution_output(stdout: str) -> Dict[str, Any]:
+    """Direcciones locales, /etc/hosts y {nombre: (código, direcciones)} de la salida del comando"""
+    parsed: Dict[str, Any] = {'local': [], 'hosts': '', 'names': {}}
+    for line in stdout.splitlines():
+        parts = line.split()
+        if len(parts) < 2 or parts[0] != RESOLVE_MARKER:
+            continue
+        if parts[1] == 'local':
+            parsed['local'] = parts[2:]
+        elif parts[1] == 'hosts':
+            parsed['hosts'] = base64.b64decode(parts[2]).decode('utf-8', 'replace') if len(parts) > 2 else ''
+        elif parts[1] == 'name' and len(parts) >= 4:
+            # Líneas de getent: "ip STREAM nombre", "ip DGRAM", ...; solo interesan las IPs, sin repetir
+            addresses = sorted({value for value in parts[4:] if is_ip_literal(value)})
+            parsed['names'][parts[2]] = (int(parts[3]) if parts[3].isdigit() else 1, addresses)
+    return parsed
+
+
+class ResolutionAnalyzer:
+    def __init__(self, ssh_manager: SSHManager):
+        self.ssh = ssh_manager
+        self.nginx = NginxManager(ssh_manager)
+        self.hosts_file = "/etc/hosts"
+
+    @round_trip_budget(2)
+    def analyze_resolution(self, expected_addresses: Optional[List[str]] = None,
+                           concurrency: int = RESOLVE_CONCURRENCY) -> Dict[str, Any]:
+        """
+        Resolver cada server_name del snapshot por el camino efectivo (NSS,
+        `getent ahosts`: /etc/hosts y luego DNS) y compararlo con las
+        direcciones del host
+
+        Dos comandos: el snapshot de nginx y uno que trae las direcciones
+        locales, /etc/hosts y todas las resoluciones (con `xargs -P` en
+        paralelo); con miles de nombres, uno más cada NAMES_CHUNK bytes.
+        `expected_addresses` agrega IPs públicas que el host no ve en sus
+        interfaces (NAT, IP flotante).
+        """
+        names = self._collect_names(self.nginx.get_server_blocks())
+
+        analysis = {
+            'success': True,
+            'names_checked': len(names),
+            'local_addresses': [],
+            'ok': 0,
+            'loopback': [],
+            'stale': [],
+            'mixed': [],
+            'unresolved': [],
+            'issues': []
+        }
+        if not names:
+            return analysis
+
+        chunks = self._chunk_names(sorted(names))
+        if len(chunks) > 1:
+            self.ssh.extend_budget(len(chunks) - 1)
+
+        outputs = []
+        for i, chunk in enumerate(chunks):
+            stdout, stderr, exit_code = self.ssh.execute_command(
+                self._build_command(chunk, concurrency, with_context=i == 0),
+                f"Resolviendo {len(chunk)} server_name con getent ahosts",
+                echo_output=False
+            )
+            if exit_code != 0:
+                return {**analysis, 'success': False, 'error': stderr.strip() or f"Código {exit_code}"}
+            outputs.append(stdout)
+
+        parsed = parse_resolution_output('\n'.join(outputs))
+        local: Set[str] = set(parsed['local']) | set(expected_addresses or [])
+        hosts = HostsFile(parsed['hosts'])
+        analysis['local_addresses'] = sorted(local)
+
+        for name in sorted(names):
+            code, addresses = parsed['names'].get(name, (1, []))
+            item = {
+                **names[name],
+                'name': name,
+                'addresses': addresses,
+                'hosts_lines': [entry.line_number for entry in hosts.entries_for(name)],
+            }
+            item['source'] = '/etc/hosts' if item['hosts_lines'] else 'DNS'
+
+            category = self._classify(code, addresses, local)
+            if category == 'ok':
+                analysis['ok'] += 1
+                continue
+            item['description'] = self._describe(item, category, code)
+            analysis[category].append(item)
+            analysis['issues'].append({**item, 'type': category})
+
+        return analysis
+
+    def _collect_names(self, blocks: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Hostnames concretos del snapshot (sin comodines, regex ni IPs) con su primer bloque"""
+        names: Dict[str, Dict[str, Any]] = {}
+        for block in blocks:
+            for server_name in block['server_names']:
+                for hostname in expand_server_name(server_name) or []:
+                    hostname = hostname.lower().rstrip('.')
+                    if (not hostname or hostname in ('_', '""', 'localhost') or hostname.startswith('*')
+                            or is_ip_literal(hostname)):
+                        continue
+                    names.setdefault(hostname, {'config': block['file'], 'line': block['line']})
+        return names
+
+    def _chunk_names(self, names: List[str]) -> List[List[str]]:
+        chunks: List[List[str]] = [[]]
+        size = 0
+        for name in names:
+            if chunks[-1] and size + len(name) + 1 > NAMES_CHUNK:
+                chunks.append([])
+                size = 0
+            chunks[-1].append(name)
+            size += len(name) + 1
+        return chunks
+
+    def _build_command(self, names: List[str], concurrency: int, with_context: bool = True) -> str:
+        """Direcciones locales + /etc/hosts + `getent ahosts` en paralelo, una línea por nombre"""
+        # Sin awk/sort por nombre: la salida cruda se filtra localmente (parse_resolution_output)
+        resolve = (f'out=$(timeout {RESOLVE_TIMEOUT} getent ahosts "$1" 2>/dev/null); '
+                   f'echo "{RESOLVE_MARKER} name $1 $?" $out')
+        encoded = base64.b64encode('\0'.join(names).encode('utf-8')).decode('ascii')
+        script = ["command -v getent >/dev/null 2>&1 || { echo 'getent no disponible en el servidor' >&2; exit 127; }"]
+        if with_context:
+            script += [
+                f"echo \"{RESOLVE_MARKER} local\" $(hostname -I 2>/dev/null || "
+                f"ip -o addr show 2>/dev/null | awk '{{split($4, a, \"/\"); print a[1]}}')",
+                f"echo \"{RESOLVE_MARKER} hosts\" $(base64 -w0 {self.hosts_file} 2>/dev/null)",
+            ]
+        # Los nombres viajan separados por NUL: xargs no interpreta comillas ni espacios
+        script.append(f"echo {encoded} | base64 -d | xargs -0 -r -n 1 -P {max(1, concurrency)} "
+                      f"sh -c {shlex.quote(resolve)} _")
+        return '; '.join(script)
+
+    def _classify(self, code: int, addresses: List[str], local: Set[str]) -> str:
+        if code != 0 or not addresses:
+            return 'unresolved'
+        if any(is_loopback(address) for address in addresses):
+            return 'loopback'
+        foreign = [address for address in addresses if address not in local]
+        if not foreign:
+            return 'ok'
+        # Sin direcciones locales conocidas no se puede decir que la IP sea vieja
+        if not local:
+            return 'ok'
+        return 'stale' if len(foreign) == len(addresses) else 'mixed'
+
+    def _describe(self, item: Dict[str, Any], category: str, code: int) -> str:
+        name, addresses, source = item['name'], ', '.join(item['addresses']), item['source']
+        if item['hosts_lines']:
+            source += f" línea {', '.join(str(line) for line in item['hosts_lines'])}"
+        if category == 'loopback':
+            return f"{name} resuelve a loopback ({addresses}) vía {source}: el tráfico local no llega al sitio público"
+        if category == 'stale':
+            return f"{name} resuelve a {addresses} vía {source}, ninguna es de este servidor (¿IP vieja o proxy/CDN?)"
+        if category == 'mixed':
+            return f"{name} resuelve a {addresses} vía {source}, solo algunas son de este servidor"
+        reason = 'timeout' if code == TIMEOUT_EXIT else ('no existe' if code == GETENT_NOT_FOUND else f'código {code}')
+        return f"{name} no resuelve ({reason})"
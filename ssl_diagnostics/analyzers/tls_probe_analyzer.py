@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+TLS Probe Analyzer - Latencia de handshake, reanudación y ALPN de cada vhost HTTPS
+"""
+
+from collections import Counter
+from typing import Any, Dict, List, Optional
+from ..core.ssh_manager import SSHManager, round_trip_budget
+from ..core.nginx_manager import NginxManager
+from ..core.ssl_manager import SSLManager
+from ..core.tls_probe import summarize_samples
+from .coverage_analyzer import expand_server_name, is_tls_block
+
+
+class TLSProbeAnalyzer:
+    def __init__(self, ssh_manager: SSHManager):
+        self.ssh = ssh_manager
+        self.nginx = NginxManager(ssh_manager)
+        self.ssl = SSLManager(ssh_manager)
+
+    def tls_hostnames(self) -> List[str]:
+        """Hostnames concretos de los bloques que sirven HTTPS (sin comodines ni regex)"""
+        hostnames = set()
+        for block in self.nginx.get_server_blocks():
+            if not is_tls_block(block):
+                continue
+            for server_name in block['server_names']:
+                for hostname in expand_server_name(server_name) or []:
+                    if hostname not in ('_', '""', '') and not hostname.startswith('*'):
+                        hostnames.add(hostname.lower())
+        return sorted(hostnames)
+
+    @round_trip_budget(2)
+    def probe_vhosts(self, hostnames: Optional[List[str]] = None, port: int = 443,
+                     iterations: int = 10, concurrency: int = 16) -> Dict[str, Any]:
+        """
+        Benchmark de handshakes de todos los vhosts HTTPS del host
+
+        Un snapshot de nginx para obtener los hostnames (o los indicados) y
+        un comando con el probe concurrente; el resumen se arma localmente.
+        """
+        if hostnames is None:
+            hostnames = self.tls_hostnames()
+        else:
+            self.ssh.extend_budget(-1)
+
+        results = self.ssl.probe_tls_handshakes(hostnames, port, iterations, concurrency)
+        ok = [item for item in results if not item['error']]
+
+        # Percentiles globales sobre las medianas de cada vhost (cada uno pesa igual)
+        medians = [item['latency_ms']['p50'] for item in ok if item['latency_ms']['count']]
+
+        return {
+            'port': port,
+            'iterations': iterations,
+            'hostnames': len(results),
+            'failed': [{'hostname': item['hostname'], 'error': item['error']} for item in results if item['error']],
+            'latency_ms': summarize_samples(medians),
+            'protocols': dict(Counter(item['protocol'] for item in ok)),
+            'ciphers': dict(Counter(item['cipher'] for item in ok)),
+            'without_resumption': sorted(item['hostname'] for item in ok if not item['resumed']),
+            'without_h2': sorted(item['hostname'] for item in ok if item['alpn'] != 'h2'),
+            'slowest': sorted(ok, key=lambda item: item['latency_ms']['p90'], reverse=True)[:10],
+            'results': results
+        }
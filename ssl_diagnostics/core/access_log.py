@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Access Log - Agregados por vhost de los access logs de nginx
+
+Consumer del lector incremental (log_reader): por vhost cuenta requests,
+bytes, estados por clase, la ventana de tiempo y un sketch de latencia de
+tamaño fijo (buckets logarítmicos con error relativo acotado) a partir de
+`$request_time` al final de cada línea, si el log_format lo incluye.
+"""
+
+from typing import Any, Dict, List, Optional
+from .log_reader import LOG_DIR, build_reader_command
+
+# Error relativo de los percentiles de latencia (buckets de ancho ~4%)
+SKETCH_ACCURACY = 0.02
+SKETCH_GAMMA = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+
+# Consumer remoto; el parámetro se reemplaza en build_access_log_command
+ACCESS_LOG_CONSUMER = r'''
+LOG_GAMMA = math.log(%(gamma)r)
+# combined: [$time_local] "$request" $status $body_bytes_sent ...; $request_time opcional al final
+LINE_RE = re.compile(rb'\[([^\]]+)\] "(?:[^"\\]|\\.)*" (\d{3}) (\d+|-)')
+LATENCY_RE = re.compile(rb'[ =](\d+\.\d+)\s*$')
+# Sufijos anclados: x.log, x.log.1, x.log.2.gz, x.log-20240101.gz (el dominio puede contener "log" o "error")
+LOG_SUFFIX_RE = re.compile(r'\.log(\.\d+)?(\.gz)?$|\.log-\d{8}(\.gz)?$')
+ERROR_SUFFIX_RE = re.compile(r'[._]error\.log(\.\d+)?(\.gz)?$|[._]error\.log-\d{8}(\.gz)?$')
+
+
+def wanted(name):
+    return bool(LOG_SUFFIX_RE.search(name)) and not ERROR_SUFFIX_RE.search(name)
+
+
+def vhost_of(name):
+    return LOG_SUFFIX_RE.sub('', name)
+
+
+def timestamp(raw):
+    try:
+        return datetime.strptime(raw.decode('ascii', 'ignore'), '%%d/%%b/%%Y:%%H:%%M:%%S %%z').timestamp()
+    except ValueError:
+        return None
+
+
+def consume(vhost, stream, limit=0):
+    """Agregar líneas completas; devuelve los bytes consumidos (una línea incompleta se deja)"""
+    stats = vhosts.setdefault(vhost, {'requests': 0, 'bytes': 0, 'status': {}, 'first': None, 'last': None,
+                                      'buckets': {}, 'zero': 0, 'timed': 0})
+    consumed, first, last = 0, None, None
+    for line in stream:
+        if not line.endswith(b'\n') or (limit and consumed >= limit):
+            break
+        consumed += len(line)
+        match = LINE_RE.search(line)
+        if not match:
+            continue
+        stats['requests'] += 1
+        status = match.group(2)[:1].decode() + 'xx'
+        stats['status'][status] = stats['status'].get(status, 0) + 1
+        if match.group(3) != b'-':
+            stats['bytes'] += int(match.group(3))
+        first = first or match.group(1)
+        last = match.group(1)
+        latency = LATENCY_RE.search(line)
+        if latency:
+            stats['timed'] += 1
+            ms = float(latency.group(1)) * 1000
+            if ms < 1:
+                stats['zero'] += 1
+            else:
+                bucket = str(math.ceil(math.log(ms) / LOG_GAMMA))
+                stats['buckets'][bucket] = stats['buckets'].get(bucket, 0) + 1
+    for raw, pick in ((first, min), (last, max)):
+        value = timestamp(raw) if raw else None
+        if value is not None:
+            key = 'first' if pick is min else 'last'
+            stats[key] = value if stats[key] is None else pick(stats[key], value)
+    return consumed
+'''
+
+
+def build_access_log_command(state: Dict[str, Any], log_dir: str = LOG_DIR, max_bytes: int = 0) -> str:
+    """Comando remoto que lee los access logs desde los offsets de `state`"""
+    return build_reader_command(ACCESS_LOG_CONSUMER % {'gamma': SKETCH_GAMMA}, state, log_dir, max_bytes)
+
+
+class LatencySketch:
+    """Sketch de latencia mergeable: bucket k cubre (gamma^(k-1), gamma^k] ms"""
+
+    def __init__(self, buckets: Optional[Dict[str, int]] = None, zero: int = 0):
+        self.buckets: Dict[int, int] = {int(k): v for k, v in (buckets or {}).items()}
+        self.zero = zero
+
+    @property
+    def count(self) -> int:
+        return self.zero + sum(self.buckets.values())
+
+    def merge(self, other: 'LatencySketch'):
+        self.zero += other.zero
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+
+    def quantile(self, q: float) -> float:
+        """Valor aproximado (ms) del cuantil q; error relativo <= SKETCH_ACCURACY"""
+        total = self.count
+        if not total:
+            return 0.0
+        rank = q * (total - 1)
+        seen = self.zero
+        if rank < seen:
+            return 0.0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if rank < seen:
+                return round(2 * SKETCH_GAMMA ** bucket / (SKETCH_GAMMA + 1), 3)
+        return round(2 * SKETCH_GAMMA ** max(self.buckets) / (SKETCH_GAMMA + 1), 3)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'buckets': {str(k): v for k, v in self.buckets.items()}, 'zero': self.zero}
+
+
+def merge_vhost_stats(total: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Sumar los agregados de una corrida a los acumulados de un vhost"""
+    merged = {
+        'requests': total.get('requests', 0) + delta['requests'],
+        'bytes': total.get('bytes', 0) + delta['bytes'],
+        'status': dict(total.get('status', {})),
+        'timed': total.get('timed', 0) + delta['timed'],
+    }
+    for status, count in delta['status'].items():
+        merged['status'][status] = merged['status'].get(status, 0) + count
+    firsts = [value for value in (total.get('first'), delta['first']) if value is not None]
+    lasts = [value for value in (total.get('last'), delta['last']) if value is not None]
+    merged['first'] = min(firsts) if firsts else None
+    merged['last'] = max(lasts) if lasts else None
+
+    sketch = LatencySketch(total.get('buckets'), total.get('zero', 0))
+    sketch.merge(LatencySketch(delta['buckets'], delta['zero']))
+    merged.update(sketch.to_dict())
+    return merged
+
+
+def summarize_vhost(vhost: str, stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Tasa de requests, mezcla de estados, 4xx/5xx y percentiles de latencia de un vhost"""
+    requests = stats['requests']
+    window = (stats['last'] - stats['first']) if stats.get('first') is not None and stats.get('last') else 0
+    sketch = LatencySketch(stats.get('buckets'), stats.get('zero', 0))
+    status = stats.get('status', {})
+    return {
+        'vhost': vhost,
+        'requests': requests,
+        'bytes': stats.get('bytes', 0),
+        'window_seconds': window,
+        'rps': round(requests / window, 3) if window > 0 else float(requests),
+        'status': status,
+        'rate_4xx': round(status.get('4xx', 0) / requests, 4) if requests else 0.0,
+        'rate_5xx': round(status.get('5xx', 0) / requests, 4) if requests else 0.0,
+        'latency_ms': {
+            'count': sketch.count,
+            'p50': sketch.quantile(0.50),
+            'p90': sketch.quantile(0.90),
+            'p99': sketch.quantile(0.99),
+        } if sketch.count else None,
+    }
+
+
+def rank(summaries: List[Dict[str, Any]], key, minimum_requests: int = 0, limit: int = 10,
+         count_key: str = 'requests') -> List[Dict[str, Any]]:
+    """Los `limit` vhosts con mayor `key` entre los que tienen al menos minimum_requests"""
+    eligible = [item for item in summaries if item[count_key] >= minimum_requests and key(item) is not None]
+    return sorted(eligible, key=key, reverse=True)[:limit]
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Analysis Cache - Cache local de análisis de alcance host, compartido entre dominios
+
+`nginx -t`, el inventario de vhosts (archivos y bloques server del snapshot)
+y el análisis de /etc/hosts son del host, no de un dominio: diagnosticar 50
+dominios del mismo servidor no tiene por qué recalcularlos 50 veces. Se
+guardan por host junto con la huella (sha256 del contenido remoto) de la
+fuente de la que salen; cada proceso pide las huellas de todas las fuentes
+en un comando y reusa lo cacheado mientras coincidan. Los fixers invalidan
+la fuente que modifican.
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+from .ssh_manager import SSHManager
+from .cert_cache import default_cache_dir
+
+CACHE_VERSION = 1
+
+FINGERPRINT_MARKER = "@@ssl-diag-fp"
+
+# Fuente -> comando remoto cuya salida se hashea. La de nginx es la
+# configuración efectiva (`nginx -T`: nginx.conf y todo lo que incluye, con
+# rewrite/, proxy/, enable-php-*.conf, mime.types...) más el listado (con
+# mtime) de los certificados, que `nginx -t` también carga.
+SOURCES = {
+    'hosts': "cat /etc/hosts",
+    'nginx': "nginx -T 2>&1; echo \"exit $?\"; ls -lR --time-style=+%s /www/server/panel/vhost/cert",
+}
+
+# Tipo de análisis -> fuente de la que depende
+KINDS = {
+    'hosts_analysis': 'hosts',
+    'vhost_inventory': 'nginx',
+    'nginx_test': 'nginx',
+}
+
+
+class AnalysisCache:
+    # Una instancia por host en el proceso: lo que invalida un fixer lo ven todos los analyzers
+    _shared: Dict[str, 'AnalysisCache'] = {}
+
+    def __init__(self, host: str, cache_dir: Optional[str] = None):
+        self.host = host
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.cache_file = os.path.join(self.cache_dir, f"{host.replace('.', '_').replace(':', '_')}_analysis.json")
+        self.fingerprints: Optional[Dict[str, str]] = None
+        self.hits = 0
+        self.misses = 0
+        self.data = self._load()
+
+    @classmethod
+    def for_connection(cls, ssh: SSHManager) -> 'AnalysisCache':
+        """Cache compartido del host de la conexión"""
+        host = f"{ssh.config['hostname']}:{ssh.config['port']}"
+        if host not in cls._shared:
+            cls._shared[host] = cls(host)
+        return cls._shared[host]
+
+    @classmethod
+    def reset_shared(cls):
+        """Olvidar las instancias compartidas (p. ej. después de cambiar SSL_DIAG_CACHE_DIR)"""
+        cls._shared.clear()
+
+    def _load(self) -> Dict[str, Any]:
+        """Cargar cache desde archivo (vacío si no existe o es de otra versión/host)"""
+        empty = {'version': CACHE_VERSION, 'host': self.host, 'entries': {}}
+
+        if not os.path.exists(self.cache_file):
+            return empty
+
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"⚠️  Error cargando cache de análisis, se descarta: {e}")
+            return empty
+
+        if data.get('version') != CACHE_VERSION or data.get('host') != self.host:
+            return empty
+        return data
+
+    def fingerprint(self, ssh: SSHManager, source: str) -> str:
+        """
+        Huella actual de una fuente ('' si no se pudo calcular)
+
+        La primera consulta del proceso trae las de todas las fuentes en un
+        comando (un round trip extra para el presupuesto activo); después se
+        reusan hasta que invalidate() descarte la de una fuente.
+        """
+        if self.fingerprints is None or source not in self.fingerprints:
+            ssh.extend_budget(1)
+            script = [f'echo "{FINGERPRINT_MARKER} {name}" $({{ {command}; }} 2>/dev/null | sha256sum)'
+                      for name, command in SOURCES.items()]
+            stdout, _, _ = ssh.execute_command('; '.join(script), "Huellas de /etc/hosts y configuración nginx",
+                                               echo_output=False)
+            self.fingerprints = {name: '' for name in SOURCES}
+            for line in stdout.splitlines():
+                parts = line.split()
+                if len(parts) >= 3 and parts[0] == FINGERPRINT_MARKER and len(parts[2]) == 64:
+                    self.fingerprints[parts[1]] = parts[2]
+        return self.fingerprints.get(source, '')
+
+    def lookup(self, ssh: SSHManager, kind: str) -> Optional[Any]:
+        """
+        Análisis cacheado si su fuente no cambió (una copia nueva en cada llamada)
+
+        Con record/replay no se usa (como CertCache): los comandos tienen que
+        ser los mismos en la grabación y en la reproducción, sin depender de
+        lo cacheado localmente. Sin huella tampoco se guarda lo que se calcule.
+        """
+        if ssh.replay or ssh.recorder:
+            return None
+        fingerprint = self.fingerprint(ssh, KINDS[kind])
+        entry = self.data['entries'].get(kind)
+        if fingerprint and entry and entry['fingerprint'] == fingerprint:
+            self.hits += 1
+            # Se guarda serializado: quien lo recibe puede modificarlo sin tocar el cache
+            return json.loads(entry['value'])
+        self.misses += 1
+        return None
+
+    def store(self, kind: str, value: Any):
+        """
+        Guardar un análisis bajo la huella ya conocida de su fuente
+
+        Sin huella (nunca se pidió o se invalidó después de un cambio) no se
+        guarda: el valor podría no corresponder a ninguna huella conocida.
+        """
+        fingerprint = (self.fingerprints or {}).get(KINDS[kind])
+        if not fingerprint:
+            return
+        self.data['entries'][kind] = {
+            'fingerprint': fingerprint,
+            'stored_at': datetime.now().isoformat(),
+            'value': json.dumps(value, ensure_ascii=False, separators=(',', ':')),
+        }
+        self.save()
+
+    def invalidate(self, source: str):
+        """Descartar la huella y los análisis de una fuente que se acaba de modificar"""
+        if self.fingerprints:
+            self.fingerprints.pop(source, None)
+        stale = [kind for kind, kind_source in KINDS.items()
+                 if kind_source == source and kind in self.data['entries']]
+        for kind in stale:
+            del self.data['entries'][kind]
+        if stale:
+            self.save()
+
+    def save(self):
+        """Guardar cache al archivo"""
+        self.data['updated_at'] = datetime.now().isoformat()
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False, separators=(',', ':'))
+        except IOError as e:
+            print(f"⚠️  Error guardando cache de análisis: {e}")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Cert Cache - Cache local de metadatos de certificados por host
+
+Los certificados solo cambian al renovarse: los detalles ya parseados se
+guardan por host, indexados por ruta + sha256 (y mtime) del manifiesto remoto,
+para no volver a transferir ni parsear los que no cambiaron.
+"""
+
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+CACHE_VERSION = 1
+
+
+def default_cache_dir() -> str:
+    """Directorio de los caches locales por host: SSL_DIAG_CACHE_DIR o ssl_diagnostics/cache"""
+    return os.environ.get('SSL_DIAG_CACHE_DIR') or os.path.join(os.path.dirname(__file__), '..', 'cache')
+
+
+class CertCache:
+    def __init__(self, host: str, cache_dir: Optional[str] = None):
+        self.host = host
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.cache_file = os.path.join(self.cache_dir, f"{host.replace('.', '_').replace(':', '_')}_certs.json")
+        self.hits = 0
+        self.misses = 0
+        self.data = self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        """Cargar cache desde archivo (vacío si no existe o es de otra versión/host)"""
+        empty = {'version': CACHE_VERSION, 'host': self.host, 'entries': {}}
+
+        if not os.path.exists(self.cache_file):
+            return empty
+
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"⚠️  Error cargando cache de certificados, se descarta: {e}")
+            return empty
+
+        if data.get('version') != CACHE_VERSION or data.get('host') != self.host:
+            return empty
+        return data
+
+    def since(self, paths: Optional[List[str]] = None) -> Optional[int]:
+        """
+        Momento (reloj del servidor) desde el que hay que volver a transferir
+
+        Es la verificación más antigua entre las rutas pedidas (todas si
+        `paths` es None), menos un segundo por la resolución de mtime. Los
+        archivos reemplazados con un mtime anterior se detectan igual por el
+        sha256. None = transferir todo.
+        """
+        entries = self.data['entries']
+        if paths is None:
+            checked = [entry['checked_at'] for entry in entries.values()]
+        elif all(path in entries for path in paths):
+            checked = [entries[path]['checked_at'] for path in paths]
+        else:
+            return None
+
+        if not checked:
+            return None
+        return int(min(checked)) - 1
+
+    def lookup(self, path: str, sha256: str, checked_at: int) -> Optional[Dict[str, Any]]:
+        """Detalles cacheados si el archivo no cambió desde la última corrida"""
+        entry = self.data['entries'].get(path)
+        if entry and entry['sha256'] == sha256:
+            entry['checked_at'] = checked_at
+            self.hits += 1
+            return dict(entry['details'])
+        self.misses += 1
+        return None
+
+    def store(self, path: str, sha256: str, mtime: Optional[int], checked_at: int,
+              details: Dict[str, Any]):
+        self.data['entries'][path] = {
+            'sha256': sha256,
+            'mtime': mtime,
+            'checked_at': checked_at,
+            'details': details,
+        }
+
+    def retain(self, paths: Iterable[str]):
+        """Descartar entradas de certificados que ya no existen en el servidor"""
+        keep = set(paths)
+        self.data['entries'] = {p: e for p, e in self.data['entries'].items() if p in keep}
+
+    def save(self):
+        """Guardar cache al archivo"""
+        self.data['updated_at'] = datetime.now().isoformat()
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                # Sin indentación: con miles de certificados el archivo se reescribe en cada corrida
+                json.dump(self.data, f, ensure_ascii=False, separators=(',', ':'))
+        except IOError as e:
+            print(f"⚠️  Error guardando cache de certificados: {e}")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Cert Parser - Parseo local de certificados PEM
+
+Reemplaza las invocaciones remotas de `openssl x509`: los PEM se traen del
+servidor en bloque y se parsean acá con `cryptography` (dependencia de paramiko).
+"""
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import dsa, ec, ed448, ed25519, rsa
+from cryptography.x509.oid import NameOID
+
+# Cantidad mínima de certificados para que convenga un pool de procesos
+POOL_THRESHOLD = 1000
+
+PEM_CERT_RE = re.compile(
+    r'-----BEGIN CERTIFICATE-----\s+.*?-----END CERTIFICATE-----', re.DOTALL
+)
+
+
+def split_pem_certificates(text: str) -> List[str]:
+    """Separar los bloques CERTIFICATE de un archivo PEM (p. ej. fullchain.pem)"""
+    return PEM_CERT_RE.findall(text)
+
+
+def validity_utc(cert: x509.Certificate, attribute: str) -> datetime:
+    """`not_valid_before`/`not_valid_after` como datetime aware en UTC"""
+    # cryptography >= 42 expone *_utc; las versiones anteriores devuelven datetimes naive en UTC
+    value = getattr(cert, f"{attribute}_utc", None)
+    if value is None:
+        value = getattr(cert, attribute).replace(tzinfo=timezone.utc)
+    return value
+
+
+def _openssl_date(value: datetime) -> str:
+    """Mismo formato que `openssl x509 -dates` (p. ej. 'Jan  5 00:00:00 2026 GMT')"""
+    return f"{value.strftime('%b')} {value.day:2d} {value.strftime('%H:%M:%S %Y')} GMT"
+
+
+def common_name(name: x509.Name) -> str:
+    """CN de un subject/issuer ('' si no tiene)"""
+    attributes = name.get_attributes_for_oid(NameOID.COMMON_NAME)
+    return str(attributes[0].value) if attributes else ''
+
+
+def _key_info(public_key) -> Dict[str, Any]:
+    if isinstance(public_key, rsa.RSAPublicKey):
+        return {'key_type': 'RSA', 'key_size': public_key.key_size}
+    if isinstance(public_key, ec.EllipticCurvePublicKey):
+        return {'key_type': f"EC ({public_key.curve.name})", 'key_size': public_key.key_size}
+    if isinstance(public_key, dsa.DSAPublicKey):
+        return {'key_type': 'DSA', 'key_size': public_key.key_size}
+    if isinstance(public_key, ed25519.Ed25519PublicKey):
+        return {'key_type': 'Ed25519', 'key_size': 256}
+    if isinstance(public_key, ed448.Ed448PublicKey):
+        return {'key_type': 'Ed448', 'key_size': 456}
+    return {'key_type': type(public_key).__name__, 'key_size': 0}
+
+
+def sha256_fingerprint(data: bytes) -> str:
+    """SHA-256 en hex con ':' (formato de `openssl x509 -fingerprint`)"""
+    digest = hashes.Hash(hashes.SHA256())
+    digest.update(data)
+    return digest.finalize().hex(':').upper()
+
+
+def certificate_details(cert: x509.Certificate) -> Dict[str, Any]:
+    """Detalles de un certificado ya cargado"""
+    not_before = validity_utc(cert, 'not_valid_before')
+    not_after = validity_utc(cert, 'not_valid_after')
+
+    try:
+        san = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName)
+        sans = san.value.get_values_for_type(x509.DNSName)
+    except x509.ExtensionNotFound:
+        sans = []
+
+    public_key = cert.public_key()
+    spki = public_key.public_bytes(
+        serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+    details = {
+        'common_name': common_name(cert.subject),
+        'issuer': common_name(cert.issuer),
+        'subject_dn': cert.subject.rfc4514_string(),
+        'issuer_dn': cert.issuer.rfc4514_string(),
+        'sans': sans,
+        'not_before': _openssl_date(not_before),
+        'not_after': _openssl_date(not_after),
+        'not_before_ts': not_before.timestamp(),
+        'not_after_ts': not_after.timestamp(),
+        'serial': format(cert.serial_number, 'X'),
+        'fingerprint_sha256': sha256_fingerprint(cert.public_bytes(serialization.Encoding.DER)),
+        'spki_sha256': sha256_fingerprint(spki),
+    }
+    details.update(_key_info(public_key))
+    return details
+
+
+def parse_certificate_pem(pem_text: str) -> Dict[str, Any]:
+    """
+    Parsear el certificado hoja de un PEM (el primero del fullchain)
+
+    Devuelve las mismas claves que antes se obtenían con `openssl x509`
+    (common_name, issuer, not_before, not_after) más SANs, validez como
+    timestamp, tipo/tamaño de clave y fingerprints. Si el PEM no se puede
+    parsear se devuelve {'parse_error': ...}.
+    """
+    blocks = split_pem_certificates(pem_text)
+    if not blocks:
+        return {'parse_error': 'No se encontró ningún bloque CERTIFICATE'}
+
+    try:
+        cert = x509.load_pem_x509_certificate(blocks[0].encode('ascii'))
+        details = certificate_details(cert)
+    except (ValueError, UnicodeEncodeError) as e:
+        return {'parse_error': str(e)}
+
+    details['chain_length'] = len(blocks)
+    return details
+
+
+def parse_many(pem_texts: List[str], workers: Optional[int] = None,
+               pool_threshold: int = POOL_THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    Parsear muchos PEM, en un pool de procesos si son suficientes
+
+    Por debajo de `pool_threshold` (o con un solo CPU) el costo de levantar
+    el pool supera al de parsear en serie, así que se parsea en el proceso actual.
+    """
+    workers = workers or os.cpu_count() or 1
+    if len(pem_texts) < pool_threshold or workers == 1:
+        return [parse_certificate_pem(pem) for pem in pem_texts]
+
+    chunksize = max(1, len(pem_texts) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(parse_certificate_pem, pem_texts, chunksize=chunksize))
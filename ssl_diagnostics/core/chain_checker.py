@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Chain Checker - Verificación local de cadenas de certificados
+
+Reemplaza `openssl verify` en el servidor (sin CA file, un round trip por
+dominio): la cadena servida en cada fullchain.pem se arma y se verifica acá
+contra un almacén de confianza (el bundle de certifi si está instalado, o uno
+indicado / del sistema) más un cache de intermediarios vistos en otros
+certificados. Las cadenas incompletas obligan a los clientes a descargar el
+intermediario por AIA (o fallan), lo que alarga el handshake.
+"""
+
+import json
+import os
+import warnings
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+from cryptography.x509.oid import AuthorityInformationAccessOID
+
+from .cert_parser import common_name, sha256_fingerprint, split_pem_certificates, validity_utc
+from .cert_cache import default_cache_dir
+
+# Bundles del sistema, en orden de preferencia, si no hay certifi ni uno indicado
+SYSTEM_TRUST_STORES = (
+    '/etc/ssl/certs/ca-certificates.crt',
+    '/etc/pki/tls/certs/ca-bundle.crt',
+    '/etc/ssl/ca-bundle.pem',
+    '/etc/ssl/cert.pem',
+)
+# Máximo de saltos al armar una cadena (evita ciclos entre certificados cruzados)
+MAX_CHAIN_DEPTH = 8
+
+STORE_VERSION = 1
+
+
+def default_trust_store() -> Optional[str]:
+    """SSL_DIAG_TRUST_STORE, el bundle de certifi (dependencia de requests) o el del sistema"""
+    configured = os.environ.get('SSL_DIAG_TRUST_STORE')
+    if configured:
+        return configured
+
+    try:
+        import certifi
+        return certifi.where()
+    except ImportError:
+        pass
+
+    for path in SYSTEM_TRUST_STORES:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _load_pem_bundle(text: str) -> List[x509.Certificate]:
+    certs = []
+    for block in split_pem_certificates(text):
+        try:
+            certs.append(x509.load_pem_x509_certificate(block.encode('ascii')))
+        except (ValueError, UnicodeEncodeError):
+            continue
+    return certs
+
+
+def _der_fingerprint(cert: x509.Certificate) -> str:
+    return sha256_fingerprint(cert.public_bytes(serialization.Encoding.DER))
+
+
+def _issued_by(cert: x509.Certificate, issuer: x509.Certificate) -> bool:
+    """`issuer` firmó `cert` (nombre + firma; solo nombre si cryptography < 40)"""
+    if cert.issuer != issuer.subject:
+        return False
+    verify = getattr(cert, 'verify_directly_issued_by', None)
+    if verify is None:
+        return True
+    try:
+        verify(issuer)
+        return True
+    except (ValueError, TypeError, InvalidSignature):
+        return False
+
+
+def _ca_issuers_urls(cert: x509.Certificate) -> List[str]:
+    try:
+        aia = cert.extensions.get_extension_for_class(x509.AuthorityInformationAccess).value
+    except x509.ExtensionNotFound:
+        return []
+    return [desc.access_location.value for desc in aia
+            if desc.access_method == AuthorityInformationAccessOID.CA_ISSUERS]
+
+
+class CertificatePool:
+    """Certificados indexados por subject (DER) para buscar emisores con un lookup"""
+
+    def __init__(self, certs: Iterable[x509.Certificate] = ()):
+        self.by_subject: Dict[bytes, List[x509.Certificate]] = {}
+        self.fingerprints: Dict[str, x509.Certificate] = {}
+        for cert in certs:
+            self.add(cert)
+
+    def add(self, cert: x509.Certificate) -> bool:
+        fingerprint = _der_fingerprint(cert)
+        if fingerprint in self.fingerprints:
+            return False
+        self.fingerprints[fingerprint] = cert
+        self.by_subject.setdefault(cert.subject.public_bytes(), []).append(cert)
+        return True
+
+    def __contains__(self, cert: x509.Certificate) -> bool:
+        return _der_fingerprint(cert) in self.fingerprints
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    def find_issuer(self, cert: x509.Certificate) -> Optional[x509.Certificate]:
+        for candidate in self.by_subject.get(cert.issuer.public_bytes(), ()):
+            if _issued_by(cert, candidate):
+                return candidate
+        return None
+
+
+class TrustStore(CertificatePool):
+    """Anclas de confianza cargadas de un bundle PEM local"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_trust_store()
+        certs: List[x509.Certificate] = []
+        if self.path:
+            with open(self.path, 'r', encoding='ascii', errors='ignore') as f, warnings.catch_warnings():
+                # Algunos bundles del sistema traen CAs antiguas con serial no positivo
+                warnings.simplefilter('ignore')
+                certs = _load_pem_bundle(f.read())
+        super().__init__(certs)
+
+
+class IntermediateStore(CertificatePool):
+    """
+    Cache persistente de intermediarios vistos en las cadenas servidas
+
+    Permite saber con qué certificado completar una cadena incompleta sin
+    descargar nada por AIA.
+    """
+
+    def __init__(self, store_file: Optional[str] = None):
+        super().__init__()
+        self.store_file = store_file or os.path.join(default_cache_dir(), 'intermediates.json')
+        self.changed = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.store_file):
+            return
+
+        try:
+            with open(self.store_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"⚠️  Error cargando cache de intermediarios, se descarta: {e}")
+            return
+
+        if data.get('version') != STORE_VERSION:
+            return
+        for cert in _load_pem_bundle('\n'.join(data.get('certificates', {}).values())):
+            super().add(cert)
+
+    def add(self, cert: x509.Certificate) -> bool:
+        """Guardar un certificado CA que no sea autofirmado"""
+        if cert.issuer == cert.subject:
+            return False
+        try:
+            if not cert.extensions.get_extension_for_class(x509.BasicConstraints).value.ca:
+                return False
+        except x509.ExtensionNotFound:
+            return False
+        added = super().add(cert)
+        self.changed = self.changed or added
+        return added
+
+    def save(self):
+        if not self.changed:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.store_file), exist_ok=True)
+            with open(self.store_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': STORE_VERSION,
+                    'updated_at': datetime.now().isoformat(),
+                    'certificates': {
+                        fingerprint: cert.public_bytes(serialization.Encoding.PEM).decode('ascii')
+                        for fingerprint, cert in self.fingerprints.items()
+                    },
+                }, f, ensure_ascii=False, separators=(',', ':'))
+            self.changed = False
+        except IOError as e:
+            print(f"⚠️  Error guardando cache de intermediarios: {e}")
+
+
+def learn_intermediates(pem_texts: Iterable[str], intermediates: IntermediateStore) -> int:
+    """Agregar al cache los intermediarios de las cadenas servidas; devuelve cuántos son nuevos"""
+    added = 0
+    for pem_text in pem_texts:
+        for cert in _load_pem_bundle(pem_text)[1:]:
+            added += intermediates.add(cert)
+    return added
+
+
+def check_chain(pem_text: str, trust: TrustStore, intermediates: Optional[IntermediateStore] = None,
+                now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Armar y verificar la cadena servida en un fullchain.pem
+
+    status: 'complete' (llega a un ancla solo con lo servido), 'incomplete'
+    (falta un intermediario: el cliente depende de AIA; `resolved_by_cache`
+    indica si el cache lo tiene y la cadena completada es confiable),
+    'untrusted' (no llega a ningún ancla) o 'unparsed'. También informa
+    certificados servidos que no forman parte de la cadena, la raíz incluida
+    innecesariamente e intermediarios vencidos.
+    """
+    now = now or datetime.now(timezone.utc)
+    served = _load_pem_bundle(pem_text)
+    result: Dict[str, Any] = {
+        'status': 'unparsed',
+        'served_length': len(served),
+        'path': [],
+        'missing': [],
+        'aia_urls': [],
+        'resolved_by_cache': False,
+        'extra_certificates': 0,
+        'includes_root': False,
+        'expired_intermediates': [],
+    }
+    if not served:
+        return result
+
+    current = served[0]
+    pool = CertificatePool(served[1:])
+    used = set()
+    result['path'].append(common_name(current.subject) or current.subject.rfc4514_string())
+
+    status = 'untrusted'
+    for _ in range(MAX_CHAIN_DEPTH):
+        if current in trust or trust.find_issuer(current) is not None:
+            status = 'complete'
+            break
+
+        issuer = pool.find_issuer(current)
+        if issuer is not None and _der_fingerprint(issuer) not in used:
+            used.add(_der_fingerprint(issuer))
+            if validity_utc(issuer, 'not_valid_after') < now:
+                result['expired_intermediates'].append(common_name(issuer.subject))
+        else:
+            if current.issuer == current.subject:
+                break
+            result['missing'].append(current.issuer.rfc4514_string())
+            result['aia_urls'].extend(_ca_issuers_urls(current))
+            issuer = intermediates.find_issuer(current) if intermediates is not None else None
+            if issuer is None:
+                break
+
+        result['path'].append(common_name(issuer.subject) or issuer.subject.rfc4514_string())
+        current = issuer
+
+    if result['missing']:
+        # Completa con el cache (y confiable): el cliente sin AIA igual falla
+        result['resolved_by_cache'] = status == 'complete'
+        status = 'incomplete' if result['aia_urls'] or status == 'complete' else 'untrusted'
+
+    # La raíz servida no hace falta (el cliente ya la tiene): solo agrega bytes al handshake
+    unused = [cert for cert in served[1:] if _der_fingerprint(cert) not in used]
+    roots = [cert for cert in unused if cert in trust or cert.issuer == cert.subject]
+    result['status'] = status
+    result['includes_root'] = bool(roots)
+    result['extra_certificates'] = len(unused) - len(roots)
+    return result
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Error Log - Clasificación por vhost de los error logs de nginx
+
+Consumer del lector incremental (log_reader): cada línea nueva se clasifica
+con una sola regex precompilada (una alternativa con nombre por clase, la
+primera que coincide gana) y se cuenta por vhost y clase. Para los errores
+SSL se guarda además el motivo de OpenSSL ("SSL routines:...:motivo"), así
+se distingue un cliente viejo de un certificado roto sin bajar las líneas.
+"""
+
+from typing import Any, Dict, List
+from .log_reader import LOG_DIR, build_reader_command
+
+# (clase, patrón) en orden de prioridad
+ERROR_CLASSES = [
+    ('ssl_handshake', r'SSL_do_handshake\(\) failed'),
+    ('ssl_no_certificate', r'no "ssl_certificate" is defined'),
+    ('ssl_certificate_load', r'cannot load certificate|SSL_CTX_use_PrivateKey|PEM_read_bio'),
+    ('ssl_other', r'SSL_\w+\(\) failed|SSL routines'),
+    ('upstream_timeout', r'upstream timed out'),
+    ('upstream_refused', r'\(111: Connection refused\) while connecting to upstream'),
+    ('upstream_closed', r'upstream prematurely closed|\(104: Connection reset by peer\) while reading response header'),
+    ('no_live_upstreams', r'no live upstreams'),
+    ('fastcgi_stderr', r'FastCGI sent in stderr'),
+    ('file_not_found', r'\(2: No such file or directory\)|is not found'),
+    ('permission_denied', r'\(13: Permission denied\)'),
+    ('rate_limited', r'limiting (?:requests|connections)'),
+    ('body_too_large', r'client intended to send too large body'),
+    ('worker_connections', r'worker_connections are not enough'),
+]
+
+SSL_CLASSES = {name for name, _ in ERROR_CLASSES if name.startswith('ssl_')}
+
+# Límites de memoria del script remoto (el Host de la request no se usa: lo elige el cliente)
+MAX_VHOSTS = 2000
+MAX_REASONS = 20
+
+# Consumer remoto; los parámetros se reemplazan en build_error_log_command
+ERROR_LOG_CONSUMER = r'''
+CLASS_RE = re.compile('|'.join('(?P<%%s>%%s)' %% item for item in %(classes)r).encode())
+LINE_RE = re.compile(rb'^(\d{4}/\d\d/\d\d \d\d:\d\d:\d\d) \[(\w+)\]')
+REASON_RE = re.compile(rb'SSL routines:[^:]*:([^)]+)\)')
+SERVER_RE = re.compile(rb', server: ([^,\s]+)')
+MAX_VHOSTS, MAX_REASONS = %(max_vhosts)d, %(max_reasons)d
+# Sufijo anclado x.error.log[.1][.gz] o x.error.log-20240101[.gz] (nginx_error.log es el log global)
+ERROR_SUFFIX_RE = re.compile(r'[._]error\.log(\.\d+)?(\.gz)?$|[._]error\.log-\d{8}(\.gz)?$')
+
+
+def wanted(name):
+    return bool(ERROR_SUFFIX_RE.search(name))
+
+
+def vhost_of(name):
+    return ERROR_SUFFIX_RE.sub('', name)
+
+
+def timestamp(raw):
+    try:
+        return datetime.strptime(raw.decode('ascii', 'ignore'), '%%Y/%%m/%%d %%H:%%M:%%S').timestamp()
+    except ValueError:
+        return None
+
+
+def stats_for(vhost):
+    if vhost not in vhosts and len(vhosts) >= MAX_VHOSTS:
+        vhost = '(otros)'
+    return vhosts.setdefault(vhost, {'events': 0, 'classes': {}, 'levels': {}, 'reasons': {},
+                                     'first': None, 'last': None})
+
+
+def consume(vhost, stream, limit=0):
+    """Clasificar líneas completas; devuelve los bytes consumidos (una línea incompleta se deja)"""
+    consumed = 0
+    for line in stream:
+        if not line.endswith(b'\n') or (limit and consumed >= limit):
+            break
+        consumed += len(line)
+        match = LINE_RE.match(line)
+        if not match:
+            continue
+        server = SERVER_RE.search(line)
+        name = server.group(1).decode('ascii', 'replace') if server else ''
+        # server: es el server_name del bloque; "_" o una IP:puerto no identifican el sitio
+        stats = stats_for(name if name and name != '_' and ':' not in name else vhost)
+        stats['events'] += 1
+        level = match.group(2).decode('ascii', 'replace')
+        stats['levels'][level] = stats['levels'].get(level, 0) + 1
+        kind = CLASS_RE.search(line)
+        kind = kind.lastgroup if kind else 'other'
+        stats['classes'][kind] = stats['classes'].get(kind, 0) + 1
+        if kind.startswith('ssl_'):
+            reason = REASON_RE.search(line)
+            if reason:
+                reason = reason.group(1).decode('ascii', 'replace').strip()
+                if reason in stats['reasons'] or len(stats['reasons']) < MAX_REASONS:
+                    stats['reasons'][reason] = stats['reasons'].get(reason, 0) + 1
+        value = timestamp(match.group(1))
+        if value is not None:
+            stats['first'] = value if stats['first'] is None else min(stats['first'], value)
+            stats['last'] = value if stats['last'] is None else max(stats['last'], value)
+    return consumed
+'''
+
+
+def build_error_log_command(state: Dict[str, Any], log_dir: str = LOG_DIR, max_bytes: int = 0) -> str:
+    """Comando remoto que clasifica los error logs desde los offsets de `state`"""
+    consumer = ERROR_LOG_CONSUMER % {
+        'classes': ERROR_CLASSES,
+        'max_vhosts': MAX_VHOSTS,
+        'max_reasons': MAX_REASONS,
+    }
+    return build_reader_command(consumer, state, log_dir, max_bytes)
+
+
+def _add_counts(total: Dict[str, int], delta: Dict[str, int], limit: int = 0) -> Dict[str, int]:
+    merged = dict(total)
+    for key, count in delta.items():
+        if key in merged or not limit or len(merged) < limit:
+            merged[key] = merged.get(key, 0) + count
+    return merged
+
+
+def merge_error_stats(total: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Sumar los eventos de una corrida a los acumulados de un vhost"""
+    firsts = [value for value in (total.get('first'), delta['first']) if value is not None]
+    lasts = [value for value in (total.get('last'), delta['last']) if value is not None]
+    return {
+        'events': total.get('events', 0) + delta['events'],
+        'classes': _add_counts(total.get('classes', {}), delta['classes']),
+        'levels': _add_counts(total.get('levels', {}), delta['levels']),
+        'reasons': _add_counts(total.get('reasons', {}), delta['reasons'], MAX_REASONS),
+        'first': min(firsts) if firsts else None,
+        'last': max(lasts) if lasts else None,
+    }
+
+
+def summarize_errors(vhost: str, stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Eventos por clase, eventos SSL y motivos SSL más frecuentes de un vhost"""
+    classes = stats.get('classes', {})
+    reasons = sorted(stats.get('reasons', {}).items(), key=lambda item: item[1], reverse=True)
+    return {
+        'vhost': vhost,
+        'events': stats['events'],
+        'ssl_events': sum(count for name, count in classes.items() if name in SSL_CLASSES),
+        'classes': dict(sorted(classes.items(), key=lambda item: item[1], reverse=True)),
+        'levels': stats.get('levels', {}),
+        'top_reasons': reasons[:5],
+        'first': stats.get('first'),
+        'last': stats.get('last'),
+    }
+
+
+def summarize_domain(by_vhost: Dict[str, Dict[str, Any]], domain: str) -> Dict[str, Any]:
+    """Eventos acumulados de un dominio y su www. (`by_vhost`: vhost -> summarize_errors)"""
+    names = dict.fromkeys([domain, domain[4:] if domain.startswith('www.') else f"www.{domain}"])
+    matches = [by_vhost[name] for name in names if name in by_vhost]
+    return {
+        'vhosts': [item['vhost'] for item in matches],
+        'events': sum(item['events'] for item in matches),
+        'ssl_events': sum(item['ssl_events'] for item in matches),
+        'classes': add_class_totals(matches),
+        'top_reasons': sorted(
+            (reason for item in matches for reason in item['top_reasons']),
+            key=lambda reason: reason[1], reverse=True
+        )[:5],
+    }
+
+
+def add_class_totals(summaries: List[Dict[str, Any]]) -> Dict[str, int]:
+    """Eventos por clase sumando todos los vhosts"""
+    totals: Dict[str, int] = {}
+    for item in summaries:
+        totals = _add_counts(totals, item['classes'])
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Expiry Index - Índice persistente de vencimientos de certificados de varios hosts
+
+Cada host se escanea con el inventario de SSLManager (un round trip, casi sin
+transferencia gracias al cache de certificados) y sus vencimientos se guardan
+en un heap ordenado por not_after. Las consultas (`due_within`) no tocan la
+red, y el modo watch solo vuelve a escanear los hosts cuyo próximo vencimiento
+cae dentro del horizonte.
+"""
+
+import heapq
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .ssh_manager import SSHManager
+from .ssl_manager import SSLManager
+from .cert_cache import default_cache_dir
+
+INDEX_VERSION = 1
+DAY = 86400
+
+
+class ExpiryIndex:
+    def __init__(self, index_file: Optional[str] = None):
+        self.index_file = index_file or os.path.join(default_cache_dir(), 'expiry_index.json')
+        # host -> {config_file, scanned_at, certificates, unparsed, error}
+        self.hosts: Dict[str, Dict[str, Any]] = {}
+        # Heap de [not_after_ts, host, dominio]: heap[0] es el próximo vencimiento
+        self.heap: List[List[Any]] = []
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_file):
+            return
+
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"⚠️  Error cargando índice de vencimientos, se reconstruye: {e}")
+            return
+
+        if data.get('version') != INDEX_VERSION:
+            return
+        self.hosts = data.get('hosts', {})
+        self.heap = data.get('heap', [])
+        # Se guarda ya ordenado como heap; heapify es O(n) por si fue editado a mano
+        heapq.heapify(self.heap)
+
+    def save(self):
+        """Guardar el índice (el heap se persiste tal cual)"""
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            with open(self.index_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': INDEX_VERSION,
+                    'updated_at': datetime.now().isoformat(),
+                    'hosts': self.hosts,
+                    'heap': self.heap,
+                }, f, ensure_ascii=False, separators=(',', ':'))
+        except IOError as e:
+            print(f"⚠️  Error guardando índice de vencimientos: {e}")
+
+    def update_host(self, host: str, config_file: str, inventory: List[Dict[str, Any]],
+                    scanned_at: Optional[float] = None):
+        """Reemplazar los vencimientos de un host con un inventario nuevo"""
+        entries = [[row['not_after_ts'], host, row['domain']] for row in inventory if row.get('not_after_ts')]
+
+        self.heap = [entry for entry in self.heap if entry[1] != host]
+        self.heap.extend(entries)
+        heapq.heapify(self.heap)
+
+        self.hosts[host] = {
+            'config_file': config_file,
+            'scanned_at': scanned_at or time.time(),
+            'certificates': len(entries),
+            'next_expiry': min((entry[0] for entry in entries), default=None),
+            'unparsed': [row['domain'] for row in inventory if not row.get('not_after_ts')],
+            'error': '',
+        }
+
+    def record_error(self, host: str, config_file: str, error: str):
+        """Registrar un escaneo fallido sin perder los vencimientos conocidos"""
+        previous = self.hosts.get(host, {})
+        self.hosts[host] = {
+            'config_file': config_file,
+            'scanned_at': previous.get('scanned_at'),
+            'certificates': previous.get('certificates', 0),
+            'next_expiry': previous.get('next_expiry'),
+            'unparsed': previous.get('unparsed', []),
+            'error': error,
+        }
+
+    def next_expiry(self) -> Optional[List[Any]]:
+        """Próximo vencimiento de toda la flota ([not_after_ts, host, dominio])"""
+        return self.heap[0] if self.heap else None
+
+    def due_within(self, seconds: float, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Certificados que vencen antes de now + seconds, ordenados por vencimiento
+
+        Recorre el heap desde la raíz y no desciende por los subárboles cuyo
+        nodo ya queda fuera del horizonte: O(k log k) para k resultados, sin
+        importar cuántos certificados tenga el índice.
+        """
+        now = now or time.time()
+        limit = now + seconds
+        due = []
+        pending = [0] if self.heap else []
+
+        while pending:
+            position = pending.pop()
+            not_after_ts, host, domain = self.heap[position]
+            if not_after_ts > limit:
+                continue
+            due.append({
+                'host': host,
+                'domain': domain,
+                'not_after_ts': not_after_ts,
+                'days_left': int((not_after_ts - now) // DAY),
+            })
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(self.heap):
+                    pending.append(child)
+
+        due.sort(key=lambda item: (item['not_after_ts'], item['host'], item['domain']))
+        return due
+
+    def hosts_to_rescan(self, horizon: float, max_age: Optional[float] = None,
+                        now: Optional[float] = None) -> List[str]:
+        """
+        Hosts que vale la pena volver a escanear
+
+        Los que tienen un vencimiento dentro del horizonte (pueden haberse
+        renovado), los que fallaron y, si se indica max_age, los que no se
+        escanean hace más de max_age segundos.
+        """
+        now = now or time.time()
+        selected = []
+        for host, info in sorted(self.hosts.items()):
+            next_expiry = info.get('next_expiry')
+            stale = max_age is not None and (info.get('scanned_at') or 0) < now - max_age
+            if info.get('error') or stale or (next_expiry is not None and next_expiry <= now + horizon):
+                selected.append(host)
+        return selected
+
+
+class ExpiryScheduler:
+    """Escaneo de la flota (un archivo .env de SSHManager por host) sobre un ExpiryIndex"""
+
+    def __init__(self, index: ExpiryIndex):
+        self.index = index
+
+    def scan_host(self, config_file: str) -> Dict[str, Any]:
+        """Inventario de un host (un round trip con el cache caliente) y actualización del índice"""
+        # Sin el .env SSHManager usaría su host por defecto: se escanearía otro servidor
+        if not os.path.exists(config_file):
+            host = next((known for known, info in self.index.hosts.items() if info['config_file'] == config_file),
+                        config_file)
+            error = f"No existe el archivo de configuración {config_file}"
+            self.index.record_error(host, config_file, error)
+            return {'host': host, 'success': False, 'error': error}
+
+        ssh = SSHManager(config_file)
+        host = f"{ssh.config['hostname']}:{ssh.config['port']}"
+
+        if not ssh.connect():
+            error = "No se pudo establecer conexión SSH"
+            self.index.record_error(host, config_file, error)
+            return {'host': host, 'success': False, 'error': error}
+
+        try:
+            inventory = SSLManager(ssh).get_certificate_inventory()
+            self.index.update_host(host, config_file, inventory)
+            return {'host': host, 'success': True, 'certificates': len(inventory)}
+        except Exception as e:
+            self.index.record_error(host, config_file, str(e))
+            return {'host': host, 'success': False, 'error': str(e)}
+        finally:
+            ssh.close()
+
+    def scan_hosts(self, config_files: List[str]) -> List[Dict[str, Any]]:
+        results = [self.scan_host(config_file) for config_file in config_files]
+        self.index.save()
+        return results
+
+    def watch_cycle(self, config_files: List[str], horizon: float,
+                    max_age: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Una vuelta del modo watch: escanea los hosts nuevos y los que
+        hosts_to_rescan selecciona; el resto se responde desde el índice
+        """
+        known = {info['config_file'] for info in self.index.hosts.values()}
+        rescan = [self.index.hosts[host]['config_file'] for host in self.index.hosts_to_rescan(horizon, max_age)]
+        pending = [config_file for config_file in config_files if config_file not in known] + rescan
+
+        # Sin duplicados y respetando el orden
+        return self.scan_hosts(list(dict.fromkeys(pending)))
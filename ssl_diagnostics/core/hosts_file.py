@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Hosts File - Modelo de /etc/hosts parseado en una sola pasada
+
+El contenido se parsea una vez en entradas por número de línea (ip,
+nombres, comentario) con un índice nombre → líneas. Las correcciones no
+reescriben el texto: se acumulan en un HostsEditPlan sobre el modelo y se
+aplican todas juntas al renderizar, recorriendo las líneas una sola vez.
+"""
+
+import re
+from typing import Dict, List, NamedTuple, Optional, Set
+
+LOOPBACK_IPS = ('127.0.0.1', '::1')
+LOCALHOST_NAMES = ('localhost', 'localhost.localdomain')
+
+# Dos entradas pegadas, p. ej. '127.0.0.1 domain1127.0.0.1 domain2'
+MALFORMED_RE = re.compile(r'127\.0\.0\.1\s*[\w.-]+127\.0\.0\.1')
+# Punto de corte de una línea malformada: una IP loopback pegada al nombre anterior
+MALFORMED_SPLIT_RE = re.compile(r'(?<=\S)(?=127\.0\.0\.1)')
+
+
+class HostsEntry(NamedTuple):
+    line_number: int
+    ip: str
+    names: List[str]
+    comment: str
+
+    @property
+    def family(self) -> str:
+        return 'ipv6' if ':' in self.ip else 'ipv4'
+
+
+class HostsFile:
+    """Líneas de /etc/hosts con sus entradas parseadas y el índice de nombres"""
+
+    def __init__(self, content: str):
+        self.content = content
+        self.lines = content.split('\n')
+        self.entries: Dict[int, HostsEntry] = {}
+        self.malformed: Dict[int, str] = {}
+        self.index: Dict[str, List[int]] = {}
+
+        for line_number, line in enumerate(self.lines, 1):
+            data, _, comment = line.partition('#')
+            parts = data.split()
+            if not parts:
+                continue
+            if MALFORMED_RE.search(data) or len(parts) < 2:
+                self.malformed[line_number] = line.strip()
+                continue
+            entry = HostsEntry(line_number, parts[0], parts[1:], comment.strip())
+            self.entries[line_number] = entry
+            for name in entry.names:
+                self.index.setdefault(name.lower(), []).append(line_number)
+
+    def entries_for(self, name: str) -> List[HostsEntry]:
+        """Entradas activas que declaran exactamente `name` (sin distinguir mayúsculas)"""
+        return [self.entries[line_number] for line_number in self.index.get(name.lower(), [])]
+
+    def duplicated_names(self) -> Dict[str, List[HostsEntry]]:
+        """Nombres declarados en más de una entrada de la misma familia (IPv4/IPv6)"""
+        duplicates = {}
+        for name, line_numbers in self.index.items():
+            if len(line_numbers) < 2 or name in LOCALHOST_NAMES:
+                continue
+            entries = [self.entries[line_number] for line_number in line_numbers]
+            for family in ('ipv4', 'ipv6'):
+                same_family = [entry for entry in entries if entry.family == family]
+                if len(same_family) > 1:
+                    duplicates[name] = same_family
+                    break
+        return duplicates
+
+
+def split_malformed(line: str) -> List[str]:
+    """Separar entradas pegadas; devuelve [] si alguna parte no queda como 'ip nombre...'"""
+    parts = [part.strip() for part in MALFORMED_SPLIT_RE.split(line.partition('#')[0])]
+    if len(parts) < 2 or any(len(part.split()) < 2 for part in parts):
+        return []
+    return [' '.join(part.split()) for part in parts]
+
+
+class HostsEditPlan:
+    """Ediciones pendientes sobre un HostsFile, aplicadas juntas en render()"""
+
+    def __init__(self, hosts: HostsFile):
+        self.hosts = hosts
+        self.replacements: Dict[int, List[str]] = {}
+        self.dropped: Dict[int, Set[str]] = {}
+        self.notes: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return len(set(self.replacements) | set(self.dropped))
+
+    def replace(self, line_number: int, lines: List[str]):
+        """Reemplazar la línea por `lines`"""
+        self.replacements.setdefault(line_number, lines)
+
+    def drop_name(self, line_number: int, name: str, note: str):
+        """Quitar un nombre de la entrada; si no le quedan nombres, la línea se comenta"""
+        self.dropped.setdefault(line_number, set()).add(name.lower())
+        self.notes.setdefault(line_number, note)
+
+    def render(self) -> str:
+        """Contenido nuevo con todas las ediciones aplicadas en una pasada"""
+        output: List[str] = []
+        for line_number, line in enumerate(self.hosts.lines, 1):
+            if line_number in self.replacements:
+                output.extend(self.replacements[line_number])
+            elif line_number in self.dropped:
+                output.append(self._without_names(line_number, line))
+            else:
+                output.append(line)
+        return '\n'.join(output)
+
+    def _without_names(self, line_number: int, line: str) -> str:
+        entry: Optional[HostsEntry] = self.hosts.entries.get(line_number)
+        if entry is None:
+            return line
+        names = [name for name in entry.names if name.lower() not in self.dropped[line_number]]
+        if not names:
+            return f"# {line.strip()} # {self.notes[line_number]}"
+        comment = f" # {entry.comment}" if entry.comment else ''
+        return f"{entry.ip} {' '.join(names)}{comment}"
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Log Reader - Lectura incremental de logs de nginx en el servidor
+
+Base común de los analizadores de logs: un script Python (solo stdlib) que
+se envía al servidor, lee cada log línea a línea desde el offset guardado
+(por inodo) y devuelve solo los agregados que arma un "consumer" propio de
+cada tipo de log (access, error). La memoria no depende del tamaño de los
+logs y no se transfieren líneas. Los offsets y los totales se guardan
+localmente por host y tipo, así cada corrida solo lee los bytes nuevos.
+"""
+
+import base64
+import json
+import os
+import zlib
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from .cert_cache import default_cache_dir
+
+LOG_DIR = "/www/wwwlogs"
+
+STATE_VERSION = 1
+
+# Encabezado del script remoto (parámetros comunes)
+READER_PRELUDE = r'''
+import base64, glob, gzip, json, math, os, re, zlib
+from datetime import datetime
+
+LOG_DIR, MAX_BYTES = %(log_dir)r, %(max_bytes)d
+STATE = json.loads(zlib.decompress(base64.b64decode(%(state)r)))
+vhosts = {}
+truncated = []
+'''
+
+# Cuerpo del script remoto: usa wanted(name), vhost_of(name) y consume(vhost, stream, limit) del consumer
+READER_BODY = r'''
+def read_plain(path, vhost, offset):
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        consumed = consume(vhost, f, MAX_BYTES)
+    if MAX_BYTES and consumed >= MAX_BYTES:
+        truncated.append(os.path.basename(path))
+    return offset + consumed
+
+
+plain = {}
+for path in glob.glob(os.path.join(LOG_DIR, '*.log')) + glob.glob(os.path.join(LOG_DIR, '*.log.1')):
+    if wanted(os.path.basename(path)):
+        plain[path] = os.stat(path)
+by_inode = {st.st_ino: path for path, st in plain.items()}
+
+files = {}
+for path, st in sorted(plain.items()):
+    name = os.path.basename(path)
+    if not name.endswith('.log'):
+        # Historia sin comprimir: solo en la primera corrida (después son bytes ya leídos en vivo)
+        if STATE['first_run']:
+            read_plain(path, vhost_of(name), 0)
+        continue
+    previous = STATE['files'].get(name)
+    offset = 0
+    if previous and previous['inode'] == st.st_ino and previous['offset'] <= st.st_size:
+        offset = previous['offset']
+    elif previous and by_inode.get(previous['inode'], path) != path:
+        # Rotado sin comprimir (x.log -> x.log.1): terminar de leer el archivo anterior
+        read_plain(by_inode[previous['inode']], vhost_of(name), previous['offset'])
+    files[name] = {'inode': st.st_ino, 'offset': read_plain(path, vhost_of(name), offset)}
+
+rotated = {}
+for path in glob.glob(os.path.join(LOG_DIR, '*.gz')):
+    name = os.path.basename(path)
+    if not wanted(name):
+        continue
+    st = os.stat(path)
+    key = '{}:{}'.format(st.st_size, int(st.st_mtime))
+    # Después de la primera corrida, un .gz nuevo es una rotación de bytes ya leídos en vivo
+    if STATE['first_run'] and STATE['rotated'].get(name) != key:
+        try:
+            with gzip.open(path, 'rb') as f:
+                consume(vhost_of(name), f)
+        except (OSError, EOFError):
+            continue
+    rotated[name] = key
+
+print(json.dumps({'files': files, 'rotated': rotated, 'vhosts': vhosts, 'truncated': truncated}))
+'''
+
+
+def build_reader_command(consumer: str, state: Dict[str, Any], log_dir: str = LOG_DIR,
+                         max_bytes: int = 0) -> str:
+    """Comando remoto que lee los logs desde los offsets de `state` con `consumer` (todo viaja en base64)"""
+    compact = {
+        'files': state.get('files', {}),
+        'rotated': state.get('rotated', {}),
+        'first_run': not state.get('files'),
+    }
+    script = READER_PRELUDE % {
+        'log_dir': log_dir,
+        'max_bytes': max(0, max_bytes),
+        'state': base64.b64encode(zlib.compress(json.dumps(compact, separators=(',', ':')).encode())).decode(),
+    } + consumer + READER_BODY
+    encoded = base64.b64encode(script.encode('utf-8')).decode('ascii')
+    return (f"command -v python3 >/dev/null 2>&1 || {{ echo 'python3 no disponible en el servidor' >&2; exit 127; }}; "
+            f"echo {encoded} | base64 -d | python3 -")
+
+
+class LogState:
+    """
+    Offsets por archivo (inodo + bytes leídos) y totales acumulados de un host para un tipo de log
+
+    Con persist=False (record/replay) se empieza de cero y no se guarda: el
+    comando remoto lleva los offsets, y tiene que ser el mismo al grabar y
+    al reproducir sin importar lo que haya en el cache local.
+    """
+
+    def __init__(self, host: str, kind: str, cache_dir: Optional[str] = None, persist: bool = True):
+        self.host = host
+        self.kind = kind
+        self.persist = persist
+        cache_dir = cache_dir or default_cache_dir()
+        self.state_file = os.path.join(cache_dir, f"{host.replace('.', '_').replace(':', '_')}_{kind}_logs.json")
+        self.data = self._load() if persist else self._empty()
+
+    def _empty(self) -> Dict[str, Any]:
+        return {'version': STATE_VERSION, 'host': self.host, 'files': {}, 'rotated': {}, 'vhosts': {}}
+
+    def _load(self) -> Dict[str, Any]:
+        if not os.path.exists(self.state_file):
+            return self._empty()
+
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"⚠️  Error cargando offsets de {self.kind} logs, se empieza de cero: {e}")
+            return self._empty()
+
+        if data.get('version') != STATE_VERSION or data.get('host') != self.host:
+            return self._empty()
+        return data
+
+    @property
+    def first_run(self) -> bool:
+        return not self.data['files']
+
+    def reset(self):
+        self.data = self._empty()
+
+    def apply(self, result: Dict[str, Any], merge: Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]):
+        """Guardar los offsets nuevos y sumar (con `merge`) los agregados de la corrida"""
+        self.data['files'] = result['files']
+        self.data['rotated'] = result['rotated']
+        for vhost, delta in result['vhosts'].items():
+            self.data['vhosts'][vhost] = merge(self.data['vhosts'].get(vhost, {}), delta)
+
+    def save(self):
+        if not self.persist:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.state_file), exist_ok=True)
+            self.data['updated_at'] = datetime.now().isoformat()
+            with open(self.state_file, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, ensure_ascii=False, separators=(',', ':'))
+        except IOError as e:
+            print(f"⚠️  Error guardando offsets de {self.kind} logs: {e}")
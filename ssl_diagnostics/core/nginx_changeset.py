@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Nginx ChangeSet - Cambios de configuración nginx transaccionales
+
+Los cambios (deshabilitar, habilitar, escribir archivos) se acumulan
+localmente y se aplican en un solo comando remoto: se preparan los archivos
+nuevos junto a su destino, se aplican con `mv` (rename atómico en el mismo
+directorio), se corre un único `nginx -t` y, si falla, se deshace todo en
+orden inverso. Opcionalmente termina con un reload graceful (los workers
+terminan las conexiones en curso, a diferencia de `systemctl restart`).
+
+Antes de tocar los archivos en vivo, los cambios se validan en un árbol
+sombra: una copia del directorio conf de nginx (con los include del
+directorio de vhosts reescritos) y de los vhosts (hardlinks, sin copiar
+datos), sobre la que se aplican los cambios y se corre
+`nginx -t -p <prefix> -c <sombra>/conf/nginx.conf`. Si falla, el servidor
+no se modifica.
+"""
+
+import base64
+import os
+import shlex
+from typing import Any, Dict, List, Optional
+from .ssh_manager import round_trip_budget
+from .nginx_manager import NginxManager
+
+# Prefijo de las líneas de control en la salida del commit
+TX_MARKER = "@@ssl-diag-tx"
+# Sufijo de los archivos preparados junto a su destino (no coincide con el include *.conf)
+STAGED_SUFFIX = ".ssl-diag-tx"
+# Reload graceful: systemd si está disponible, si no la señal directa al master
+RELOAD_COMMAND = "systemctl reload nginx 2>/dev/null || nginx -s reload"
+# Prefijo del árbol sombra (junto al directorio de vhosts: los hardlinks no cruzan filesystems)
+SHADOW_PREFIX = ".ssl-diag-shadow"
+
+
+class NginxChangeSet:
+    def __init__(self, nginx_manager: NginxManager):
+        self.nginx = nginx_manager
+        self.ssh = nginx_manager.ssh
+        self.operations: List[Dict[str, Any]] = []
+        self.conf_dir = os.path.dirname(nginx_manager.nginx_conf)
+        # -p: el prefix real, para que pid/logs relativos resuelvan igual que en vivo
+        self.prefix = os.path.dirname(self.conf_dir) + '/'
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def _stage(self, operation: Dict[str, Any]) -> bool:
+        # Un archivo se toca una sola vez por transacción
+        if any(staged['path'] == operation['path'] for staged in self.operations):
+            return False
+        self.operations.append(operation)
+        return True
+
+    def disable(self, config_file: str) -> bool:
+        """Deshabilitar una configuración agregando .disabled"""
+        return self._stage({'action': 'disable', 'path': config_file, 'target': f"{config_file}.disabled"})
+
+    def enable(self, disabled_file: str) -> bool:
+        """Habilitar una configuración removiendo .disabled"""
+        if not disabled_file.endswith('.disabled'):
+            return False
+        return self._stage({'action': 'enable', 'path': disabled_file, 'target': disabled_file[:-9]})
+
+    def write(self, path: str, content: str, create_only: bool = False) -> bool:
+        """Crear o reemplazar un archivo (con create_only se omite si ya existe)"""
+        return self._stage({'action': 'write', 'path': path, 'target': path,
+                            'content': content, 'create_only': create_only})
+
+    def discard(self, path: str) -> bool:
+        """Quitar el cambio preparado para un archivo"""
+        remaining = [op for op in self.operations if op['path'] != path]
+        discarded = len(remaining) != len(self.operations)
+        self.operations = remaining
+        return discarded
+
+    def describe(self) -> List[str]:
+        descriptions = {
+            'disable': "Deshabilitar {path}",
+            'enable': "Habilitar {target}",
+            'write': "Escribir {path}",
+        }
+        return [descriptions[op['action']].format(**op) for op in self.operations]
+
+    def _shadow_path(self, path: str) -> Optional[str]:
+        """Ruta equivalente dentro del árbol sombra ($shadow_dir); None si queda fuera de él"""
+        for live, shadow in ((self.nginx.vhost_dir, 'vhost'), (self.conf_dir, 'conf')):
+            if path.startswith(live + '/'):
+                return f"\"$shadow_dir\"/{shadow}/{shlex.quote(path[len(live) + 1:])}"
+        return None
+
+    def _shadow_script(self) -> List[str]:
+        """
+        Fragmento que arma el árbol sombra, aplica los cambios ahí y corre nginx -t
+
+        Deja `shadow_code` con el resultado. Los vhosts se copian con hardlinks:
+        las escrituras van a un archivo nuevo y se renombran (nunca `>` sobre un
+        archivo enlazado, que modificaría el original).
+        """
+        vhost_dir = shlex.quote(self.nginx.vhost_dir)
+        template = shlex.quote(f"{os.path.dirname(self.nginx.vhost_dir)}/{SHADOW_PREFIX}.XXXXXX")
+        script = [
+            f"shadow_dir=$(mktemp -d {template}) || exit 1",
+            f"cp -a {shlex.quote(self.conf_dir)} \"$shadow_dir/conf\" && "
+            f"{{ cp -al {vhost_dir} \"$shadow_dir/vhost\" 2>/dev/null || cp -a {vhost_dir} \"$shadow_dir/vhost\"; }} || exit 1",
+            f"grep -rlF {shlex.quote(self.nginx.vhost_dir + '/')} \"$shadow_dir/conf\" | "
+            f"while read -r f; do sed -i \"s#{self.nginx.vhost_dir}/#$shadow_dir/vhost/#g\" \"$f\"; done",
+        ]
+
+        for op in self.operations:
+            path, target = self._shadow_path(op['path']), self._shadow_path(op['target'])
+            if path is None or target is None:
+                continue
+            if op['action'] in ('disable', 'enable'):
+                script.append(f"[ -f {path} ] && [ ! -e {target} ] && mv -f {path} {target}")
+                continue
+            encoded = base64.b64encode(op['content'].encode('utf-8')).decode('ascii')
+            write = (f"printf '%s' {encoded} | base64 -d > {path}{STAGED_SUFFIX} && "
+                     f"mv -f {path}{STAGED_SUFFIX} {path}")
+            script.append(f"[ -e {path} ] || {{ {write}; }}" if op['create_only'] else write)
+
+        script += [
+            f"out=$(nginx -t -p {shlex.quote(self.prefix)} -c \"$shadow_dir/conf/{os.path.basename(self.nginx.nginx_conf)}\" 2>&1)",
+            f"shadow_code=$?; rm -rf \"$shadow_dir\"; echo \"{TX_MARKER} shadow $shadow_code\"",
+        ]
+        return script
+
+    def _build_script(self, reload: bool, shadow: bool = True) -> str:
+        """Script remoto: preparar, aplicar, nginx -t y rollback o reload"""
+        stage: List[str] = ['tx=$(mktemp -d) || exit 1']
+        apply: List[str] = []
+        rollback: List[str] = []
+
+        for i, op in enumerate(self.operations):
+            path, target = shlex.quote(op['path']), shlex.quote(op['target'])
+            if op['action'] in ('disable', 'enable'):
+                stage.append(
+                    f"if [ -f {path} ] && [ ! -e {target} ]; then s{i}=1; "
+                    f"else echo '{TX_MARKER} skip {i} missing'; fi"
+                )
+                apply.append(f"[ \"$s{i}\" = 1 ] && mv -f {path} {target} && a{i}=1 && echo '{TX_MARKER} applied {i}'")
+                rollback.append(f"[ \"$a{i}\" = 1 ] && mv -f {target} {path}")
+                continue
+
+            staged = shlex.quote(f"{op['path']}{STAGED_SUFFIX}")
+            encoded = base64.b64encode(op['content'].encode('utf-8')).decode('ascii')
+            exists_check = (f"if [ -e {path} ]; then echo '{TX_MARKER} skip {i} exists'; el"
+                            if op['create_only'] else '')
+            stage.append(
+                f"{exists_check}if printf '%s' {encoded} | base64 -d > {staged}; then s{i}=1; "
+                f"[ -e {path} ] && cp -p {path} \"$tx/{i}\" && b{i}=1; "
+                f"else rm -f {staged}; echo '{TX_MARKER} skip {i} stage_failed'; fi"
+            )
+            apply.append(f"[ \"$s{i}\" = 1 ] && mv -f {staged} {path} && a{i}=1 && echo '{TX_MARKER} applied {i}'")
+            rollback.append(
+                f"[ \"$a{i}\" = 1 ] && {{ if [ \"$b{i}\" = 1 ]; then mv -f \"$tx/{i}\" {path}; else rm -f {path}; fi; }}"
+            )
+
+        finish = f"{RELOAD_COMMAND}; echo \"{TX_MARKER} reload $?\"" if reload else ':'
+        live = '; '.join(
+            stage + apply + [
+                f"out=$(nginx -t 2>&1); code=$?; echo \"{TX_MARKER} test $code\"; echo \"$out\"",
+                f"if [ $code -ne 0 ]; then {'; '.join(reversed(rollback)) or ':'}; "
+                f"echo '{TX_MARKER} rolledback'; else {finish}; fi",
+                "rm -rf \"$tx\"; rm -f " + ' '.join(shlex.quote(f"{op['path']}{STAGED_SUFFIX}")
+                                                  for op in self.operations if op['action'] == 'write'),
+            ]
+        )
+        if not shadow or not self.operations:
+            return live
+
+        # Sin cambios en vivo si la sombra no valida
+        return '; '.join(self._shadow_script() + [
+            f"if [ $shadow_code -ne 0 ]; then echo \"$out\"; exit 0; fi",
+            live,
+        ])
+
+    @round_trip_budget(1)
+    def validate(self) -> Dict[str, Any]:
+        """
+        Validar los cambios preparados solo en el árbol sombra
+
+        No modifica nada en vivo ni vacía el change set: sirve para probar
+        cada corrección propuesta apenas se prepara.
+        """
+        if not self.operations:
+            return {'valid': True, 'output': ''}
+
+        stdout, stderr, exit_code = self.ssh.execute_command(
+            '; '.join(self._shadow_script() + ['echo "$out"']),
+            f"Validando {len(self.operations)} cambios nginx en árbol sombra",
+            echo_output=False
+        )
+        valid = f"{TX_MARKER} shadow 0" in stdout.split('\n')
+        output = '\n'.join(line for line in stdout.split('\n') if not line.startswith(TX_MARKER))
+        return {'valid': valid, 'output': output.strip() or stderr.strip() or f"Código {exit_code}"}
+
+    @round_trip_budget(1)
+    def commit(self, reload: bool = False, shadow: bool = True) -> Dict[str, Any]:
+        """
+        Aplicar todos los cambios en un round trip
+
+        Con shadow=True primero se validan en el árbol sombra y, si nginx -t
+        falla ahí, no se toca ningún archivo en vivo. Después de aplicar corre
+        un `nginx -t` más sobre la configuración real; si falla se restauran
+        los archivos originales (renombres deshechos, backups repuestos,
+        archivos nuevos borrados). Con reload=True y la configuración válida,
+        termina con un reload graceful. Sin cambios pendientes y sin reload no
+        se ejecuta nada.
+        """
+        result: Dict[str, Any] = {
+            'success': True,
+            'applied': [],
+            'skipped': [],
+            'shadow_passed': None,
+            'test_passed': None,
+            'test_output': '',
+            'rolled_back': False,
+            'reloaded': False
+        }
+        if not self.operations and not reload:
+            return result
+
+        stdout, stderr, exit_code = self.ssh.execute_command(
+            self._build_script(reload, shadow),
+            f"Aplicando {len(self.operations)} cambios nginx (nginx -t{' + reload' if reload else ''})",
+            echo_output=False
+        )
+        # Aunque haya rollback el árbol pudo cambiar (mtimes, backups): el cache del host no sirve más
+        self.nginx.cache.invalidate('nginx')
+
+        output: List[str] = []
+        for line in stdout.split('\n'):
+            if not line.startswith(f"{TX_MARKER} "):
+                output.append(line)
+                continue
+
+            fields = line[len(TX_MARKER) + 1:].split()
+            if fields[0] == 'applied':
+                result['applied'].append(self.operations[int(fields[1])]['path'])
+            elif fields[0] == 'skip':
+                result['skipped'].append({'path': self.operations[int(fields[1])]['path'], 'reason': fields[2]})
+            elif fields[0] == 'shadow':
+                result['shadow_passed'] = fields[1] == '0'
+            elif fields[0] == 'test':
+                result['test_passed'] = fields[1] == '0'
+            elif fields[0] == 'rolledback':
+                result['rolled_back'] = True
+            elif fields[0] == 'reload':
+                result['reloaded'] = fields[1] == '0'
+
+        if result['shadow_passed'] is False:
+            result['test_passed'] = False
+        result['test_output'] = '\n'.join(output).strip() or stderr.strip()
+        result['success'] = bool(result['test_passed']) and (result['reloaded'] or not reload)
+        if result['test_passed'] is None:
+            result['test_output'] = result['test_output'] or f"El commit terminó con código {exit_code}"
+
+        self.operations = []
+        return result
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Nginx Config - Parseo local de configuraciones nginx
+
+Los archivos se traen del servidor en un solo comando (ver
+NginxManager.get_config_snapshot) y se parsean acá en bloques `server`
+con sus directivas de primer nivel, en lugar de un `grep` remoto por archivo.
+"""
+
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+# Prefijo de las líneas que separan archivos en el snapshot
+SNAPSHOT_MARKER = "@@ssl-diag-file"
+
+# Un token por alternativa; los espacios y comentarios se consumen sin grupo.
+# Como en nginx, `#` y las comillas solo son especiales al inicio de un token:
+# `return 301 https://a.com/#top;` es una palabra, no un comentario. Las llaves
+# de `${var}` tampoco abren un bloque: `.../cert/${ssl_server_name}/fullchain.pem`
+TOKEN_RE = re.compile(
+    r"(?P<newline>\n)|[ \t\r\f\v]+|#[^\n]*"
+    r'|"(?P<double>(?:\\.|[^"\\])*)"'
+    r"|'(?P<single>(?:\\.|[^'\\])*)'"
+    r"|(?P<punct>[;{}])|(?P<word>(?:\$\{[^}]*\}|[^\s;{}#\"'])(?:\$\{[^}]*\}|[^\s;{}])*)"
+)
+ESCAPE_RE = re.compile(r'\\(.)')
+
+# Directivas del nivel http que heredan los bloques server
+HTTP_INHERITED = ('ssl_certificate', 'ssl_certificate_key')
+
+# Directivas de un bloque server que se conservan (el resto se ignora)
+SERVER_DIRECTIVES = ('server_name', 'listen', 'ssl_certificate', 'ssl_certificate_key', 'root', 'return', 'http2')
+
+# Dirección/puerto de un server sin `listen` (nginx corriendo como root)
+DEFAULT_LISTEN = ('*', 80)
+LISTEN_PORT_RE = re.compile(r'^\d+$')
+PCRE_NAMED_GROUP_RE = re.compile(r'\(\?<(?![=!])')
+
+
+class Listen(NamedTuple):
+    """Una directiva listen normalizada"""
+    address: str
+    port: int
+    ssl: bool
+    http2: bool
+    default_server: bool
+    reuseport: bool
+
+    @property
+    def socket(self) -> Tuple[str, int]:
+        return (self.address, self.port)
+
+
+def parse_listen(args: List[str]) -> Optional[Listen]:
+    """
+    Parsear los argumentos de una directiva listen
+
+    Acepta `443`, `1.2.3.4`, `1.2.3.4:443`, `*:443`, `[::]:443`, `[::1]`,
+    `localhost:8080` y sus parámetros (`ssl`, `http2`, `default_server` o su
+    sinónimo antiguo `default`, `reuseport`). `0.0.0.0` se normaliza a `*`.
+    Devuelve None para sockets unix o argumentos no reconocidos.
+    """
+    if not args or args[0].startswith('unix:'):
+        return None
+
+    target = args[0]
+    if target.startswith('['):
+        address, _, rest = target[1:].partition(']')
+        address = f"[{address}]"
+        port_text = rest[1:] if rest.startswith(':') else ''
+        if rest and not rest.startswith(':'):
+            return None
+    elif LISTEN_PORT_RE.match(target):
+        address, port_text = '*', target
+    elif ':' in target:
+        address, _, port_text = target.rpartition(':')
+    else:
+        address, port_text = target, ''
+
+    if port_text and not LISTEN_PORT_RE.match(port_text):
+        return None
+    if address in ('0.0.0.0', ''):
+        address = '*'
+
+    params = set(args[1:])
+    return Listen(
+        address=address.lower(),
+        port=int(port_text) if port_text else DEFAULT_LISTEN[1],
+        ssl='ssl' in params,
+        http2='http2' in params,
+        default_server='default_server' in params or 'default' in params,
+        reuseport='reuseport' in params,
+    )
+
+
+def block_listens(block: Dict[str, Any]) -> List[Listen]:
+    """Directivas listen de un bloque server (`listen *:80` implícito si no tiene)"""
+    if not block['listen']:
+        return [Listen(DEFAULT_LISTEN[0], DEFAULT_LISTEN[1], False, False, False, False)]
+    http2 = [args for args in block['directives'].get('http2', []) if args]
+    listens = [listen for listen in (parse_listen(args) for args in block['listen']) if listen]
+    if http2 and http2[-1][0] == 'on':
+        # `http2 on;` (nginx >= 1.25.1) aplica a todos los listen del bloque
+        listens = [listen._replace(http2=True) for listen in listens]
+    return listens
+
+
+def parse_snapshot(output: str) -> Dict[str, str]:
+    """Separar la salida del snapshot remoto en {ruta: contenido}"""
+    files: Dict[str, str] = {}
+    current: Optional[str] = None
+    lines: List[str] = []
+
+    for line in output.split('\n'):
+        if line.startswith(f"{SNAPSHOT_MARKER} "):
+            if current is not None:
+                files[current] = '\n'.join(lines)
+            current = line[len(SNAPSHOT_MARKER) + 1:]
+            lines = []
+        elif current is not None:
+            lines.append(line)
+
+    if current is not None:
+        files[current] = '\n'.join(lines)
+    return files
+
+
+def tokenize(text: str) -> List[Tuple[str, int]]:
+    """
+    Tokens de una configuración nginx con su número de línea
+
+    `;`, `{` y `}` son tokens propios; los comentarios se descartan y las
+    comillas agrupan (sin incluirlas en el token).
+    """
+    tokens: List[Tuple[str, int]] = []
+    line = 1
+
+    for match in TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind == 'newline':
+            line += 1
+        elif kind == 'word' or kind == 'punct':
+            tokens.append((match.group(kind), line))
+        elif kind in ('double', 'single'):
+            value = match.group(kind)
+            tokens.append((ESCAPE_RE.sub(r'\1', value), line))
+            line += value.count('\n')
+
+    return tokens
+
+
+def parse_server_blocks(text: str, path: str = "",
+                        http_directives: Optional[Dict[str, List[str]]] = None) -> List[Dict[str, Any]]:
+    """
+    Bloques `server` de una configuración con sus directivas de primer nivel
+
+    Las directivas dentro de `location`/`if` no se consideran del server.
+    Los bloques de `stream {}` se omiten (no son virtual hosts HTTP).
+    Cada bloque: file, line, server_names, listen (lista de argumentos por
+    directiva), ssl_certificate, ssl_certificate_key y directives. Si se
+    pasa `http_directives`, se completa con las directivas heredables del
+    nivel http (los vhosts incluidos quedan dentro de `http {}`).
+    """
+    blocks: List[Dict[str, Any]] = []
+    contexts: List[str] = []
+    open_blocks: List[Optional[Dict[str, Any]]] = []
+    statement: List[Tuple[str, int]] = []
+
+    for token, line in tokenize(text):
+        if token == '{':
+            name = statement[0][0] if statement else ''
+            block = None
+            if name == 'server' and 'stream' not in contexts and (not contexts or contexts[-1] == 'http'):
+                block = {
+                    'file': path,
+                    'line': statement[0][1],
+                    'server_names': [],
+                    'listen': [],
+                    'ssl_certificate': '',
+                    'ssl_certificate_key': '',
+                    'directives': {},
+                }
+                blocks.append(block)
+            contexts.append(name)
+            open_blocks.append(block)
+            statement = []
+        elif token == '}':
+            if contexts:
+                contexts.pop()
+                open_blocks.pop()
+            statement = []
+        elif token == ';':
+            block = open_blocks[-1] if open_blocks else None
+            if block is not None and statement:
+                _add_directive(block, statement[0][0], [value for value, _ in statement[1:]])
+            elif (http_directives is not None and statement and contexts in ([], ['http'])
+                  and statement[0][0] in HTTP_INHERITED):
+                http_directives[statement[0][0]] = [value for value, _ in statement[1:]]
+            statement = []
+        else:
+            statement.append((token, line))
+
+    return blocks
+
+
+def _add_directive(block: Dict[str, Any], name: str, args: List[str]):
+    if name == 'server_name':
+        block['server_names'].extend(args)
+    elif name == 'listen':
+        block['listen'].append(args)
+    elif name in ('ssl_certificate', 'ssl_certificate_key') and args:
+        block[name] = args[0]
+
+    if name in SERVER_DIRECTIVES:
+        block['directives'].setdefault(name, []).append(args)
+
+
+def parse_snapshot_blocks(files: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    Todos los bloques server de un snapshot, en el orden en que nginx los carga
+
+    Los bloques sin `ssl_certificate` propio heredan el del nivel http
+    (marcados con ssl_certificate_inherited).
+    """
+    blocks: List[Dict[str, Any]] = []
+    http_directives: Dict[str, List[str]] = {}
+    for path in files:
+        blocks.extend(parse_server_blocks(files[path], path, http_directives))
+
+    for block in blocks:
+        block['ssl_certificate_inherited'] = not block['ssl_certificate'] and bool(http_directives.get('ssl_certificate'))
+        for name in HTTP_INHERITED:
+            if not block[name] and http_directives.get(name):
+                block[name] = http_directives[name][0]
+    return blocks
+
+
+def is_catch_all(block: Dict[str, Any]) -> bool:
+    """Bloque sin server_name concreto (`server_name _;`, vacío o ausente)"""
+    return not block['server_names'] or all(name in ('_', '""', '') for name in block['server_names'])
+
+
+def build_socket_table(blocks: List[Dict[str, Any]]) -> Dict[Tuple[str, int], Dict[str, Any]]:
+    """
+    Tabla socket (dirección, puerto) -> bloques que escuchan en él
+
+    Para cada socket: `blocks` en orden de carga, `default` (el marcado
+    default_server o, si no hay, el primero cargado), `explicit_default`,
+    `defaults` (todos los que se declaran default_server, más de uno es un
+    error de nginx) e índices de nombres para resolver como nginx: exactos,
+    comodines al inicio/final y regex (el primero cargado gana en cada tabla).
+    Una sola pasada sobre todos los bloques.
+    """
+    table: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+    for block in blocks:
+        listens = block_listens(block)
+        block['sockets'] = [f"{listen.address}:{listen.port}" for listen in listens]
+        for listen in listens:
+            entry = table.get(listen.socket)
+            if entry is None:
+                entry = table[listen.socket] = {
+                    'address': listen.address,
+                    'port': listen.port,
+                    'blocks': [],
+                    'ssl': False,
+                    'defaults': [],
+                    'exact': {},
+                    'wildcard_start': {},
+                    'wildcard_end': {},
+                    'regex': [],
+                }
+            if entry['blocks'] and entry['blocks'][-1] is block:
+                continue
+            entry['blocks'].append(block)
+            entry['ssl'] = entry['ssl'] or listen.ssl
+            if listen.default_server:
+                entry['defaults'].append(block)
+            _index_names(entry, block)
+
+    for entry in table.values():
+        entry['explicit_default'] = bool(entry['defaults'])
+        entry['default'] = entry['defaults'][0] if entry['defaults'] else entry['blocks'][0]
+    return table
+
+
+def index_server_names(blocks: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    server_name en minúsculas (tal como se declara) -> bloques que lo declaran
+
+    En orden de carga. Evaluar muchos dominios contra el mismo snapshot
+    busca acá en lugar de recorrer todos los bloques por dominio.
+    """
+    names: Dict[str, List[Dict[str, Any]]] = {}
+    for block in blocks:
+        for name in dict.fromkeys(name.lower() for name in block['server_names']):
+            names.setdefault(name, []).append(block)
+    return names
+
+
+def _index_names(entry: Dict[str, Any], block: Dict[str, Any]):
+    for name in block['server_names']:
+        if name.startswith('~'):
+            try:
+                # PCRE acepta (?<nombre>...); Python necesita (?P<nombre>...)
+                entry['regex'].append((re.compile(PCRE_NAMED_GROUP_RE.sub('(?P<', name[1:])), block, name))
+            except re.error:
+                continue
+            continue
+        name = name.lower()
+        if name.startswith('.'):
+            entry['exact'].setdefault(name[1:], block)
+            entry['wildcard_start'].setdefault(name[1:], block)
+        elif name.startswith('*.'):
+            entry['wildcard_start'].setdefault(name[2:], block)
+        elif name.endswith('.*'):
+            entry['wildcard_end'].setdefault(name[:-2], block)
+        elif name not in ('_', '""', ''):
+            entry['exact'].setdefault(name, block)
+
+
+def resolve_server(entry: Dict[str, Any], hostname: str) -> Tuple[Dict[str, Any], str]:
+    """
+    Bloque que nginx elige en un socket para un Host/SNI, y por qué
+
+    Mismo orden que nginx: nombre exacto, comodín inicial más largo,
+    comodín final más largo, primera regex que coincide y, si nada
+    coincide, el default server del socket.
+    """
+    hostname = hostname.lower().rstrip('.')
+    if hostname in entry['exact']:
+        return entry['exact'][hostname], 'exact'
+
+    labels = hostname.split('.')
+    for start in range(1, len(labels)):
+        suffix = '.'.join(labels[start:])
+        if suffix in entry['wildcard_start']:
+            return entry['wildcard_start'][suffix], 'wildcard'
+    for end in range(len(labels) - 1, 0, -1):
+        prefix = '.'.join(labels[:end])
+        if prefix in entry['wildcard_end']:
+            return entry['wildcard_end'][prefix], 'wildcard'
+
+    for pattern, block, _ in entry['regex']:
+        if pattern.search(hostname):
+            return block, 'regex'
+    return entry['default'], 'default_server'
+
+
+def _pattern_matches(entry: Dict[str, Any], hostname: str):
+    """Comodines y regex de un socket que también coinciden con un hostname: (bloque, patrón, tipo)"""
+    labels = hostname.split('.')
+    for start in range(1, len(labels)):
+        suffix = '.'.join(labels[start:])
+        if suffix in entry['wildcard_start']:
+            yield entry['wildcard_start'][suffix], f"*.{suffix}", 'wildcard'
+    for end in range(len(labels) - 1, 0, -1):
+        prefix = '.'.join(labels[:end])
+        if prefix in entry['wildcard_end']:
+            yield entry['wildcard_end'][prefix], f"{prefix}.*", 'wildcard'
+    for pattern, block, name in entry['regex']:
+        if pattern.search(hostname):
+            yield block, name, 'regex'
+
+
+def find_name_conflicts(table: Dict[Tuple[str, int], Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Duplicados, solapamientos y bloques inalcanzables en una tabla de sockets
+
+    Una pasada por socket sobre los nombres declarados:
+    - duplicates: el mismo server_name en más de un bloque del socket (nginx
+      usa el primero cargado y avisa "conflicting server name")
+    - overlaps: nombres exactos que además cubre un comodín o regex de otro
+      bloque (el exacto gana; el patrón no atiende esos nombres), agrupados por patrón
+    - shadowed: bloques que no ganan ningún nombre en ninguno de sus sockets
+      y no son servidor por defecto de ninguno: nunca atienden un request
+    """
+    duplicates: List[Dict[str, Any]] = []
+    overlaps: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    blocks: Dict[int, Dict[str, Any]] = {}
+    reachable = set()
+
+    for (address, port), entry in sorted(table.items(), key=lambda item: (item[0][1], item[0][0])):
+        socket = f"{address}:{port}"
+        reachable.add(id(entry['default']))
+        declared: Dict[str, Dict[int, Dict[str, Any]]] = {}
+
+        for block in entry['blocks']:
+            blocks[id(block)] = block
+            for name in block['server_names']:
+                key = name if name.startswith('~') else name.lower()
+                if key not in ('_', '""', ''):
+                    declared.setdefault(key, {}).setdefault(id(block), block)
+
+        for name, declaring in declared.items():
+            winners = list(declaring.values())
+            reachable.add(id(winners[0]))
+            if len(winners) > 1:
+                duplicates.append({
+                    'server_name': name,
+                    'socket': socket,
+                    'configs': [block['file'] for block in winners],
+                    'locations': [f"{block['file']}:{block['line']}" for block in winners],
+                })
+
+        for hostname, block in entry['exact'].items():
+            for other, pattern, kind in _pattern_matches(entry, hostname):
+                if other is block:
+                    continue
+                overlap = overlaps.setdefault((socket, pattern), {
+                    'pattern': pattern,
+                    'kind': kind,
+                    'socket': socket,
+                    'config': f"{other['file']}:{other['line']}",
+                    'hostnames': [],
+                })
+                overlap['hostnames'].append(hostname)
+
+    shadowed = [{
+        'config_file': block['file'],
+        'line': block['line'],
+        'server_names': block['server_names'],
+        'sockets': block.get('sockets', []),
+    } for key, block in blocks.items() if key not in reachable]
+
+    return {'duplicates': duplicates, 'overlaps': list(overlaps.values()), 'shadowed': shadowed}
@@ -6,13 +6,17 @@ Nginx Manager - Manejo centralizado de configuraciones nginx
 import os
 import re
 from typing import List, Dict, Tuple, Optional, Any
-from .ssh_manager import SSHManager
+from .ssh_manager import SSHManager, round_trip_budget
+from .analysis_cache import AnalysisCache
+from .nginx_config import (SNAPSHOT_MARKER, build_socket_table, parse_snapshot, parse_snapshot_blocks,
+                           resolve_server)
 
 class NginxManager:
     def __init__(self, ssh_manager: SSHManager):
         self.ssh = ssh_manager
         self.vhost_dir = "/www/server/panel/vhost/nginx"
         self.nginx_conf = "/www/server/nginx/conf/nginx.conf"
+        self.cache = AnalysisCache.for_connection(ssh_manager)
     
     def get_active_configs(self) -> List[str]:
         """Obtener lista de archivos de configuración activos"""
@@ -30,6 +34,68 @@ class NginxManager:
         )
         return [line.strip() for line in stdout.split('\n') if line.strip()]
     
+    @round_trip_budget(1)
+    def get_config_snapshot(self) -> Dict[str, str]:
+        """
+        Contenido de nginx.conf y de todos los vhosts activos en un round trip
+        
+        Devuelve {ruta: contenido} en el orden en que nginx los carga.
+        """
+        # Un solo awk para todos los archivos (los vacíos no tienen bloques que aportar)
+        stdout, _, _ = self.ssh.execute_command(
+            f"awk 'FNR==1{{print \"{SNAPSHOT_MARKER} \" FILENAME}}1' "
+            f"{self.nginx_conf} {self.vhost_dir}/*.conf 2>/dev/null",
+            "Snapshot de configuraciones nginx",
+            echo_output=False
+        )
+        return parse_snapshot(stdout)
+    
+    @round_trip_budget(1)
+    def get_vhost_inventory(self) -> Dict[str, Any]:
+        """
+        Archivos cargados (`files`, en orden) y sus bloques server (`blocks`)
+        
+        Es del host, no de un dominio: se cachea con la huella de la
+        configuración (AnalysisCache) y mientras no cambie ningún dominio
+        vuelve a traer ni a parsear el snapshot.
+        """
+        inventory = self.cache.lookup(self.ssh, 'vhost_inventory')
+        if inventory is not None:
+            return inventory
+        
+        snapshot = self.get_config_snapshot()
+        inventory = {'files': list(snapshot), 'blocks': parse_snapshot_blocks(snapshot)}
+        if snapshot:
+            self.cache.store('vhost_inventory', inventory)
+        return inventory
+    
+    @round_trip_budget(1)
+    def get_server_blocks(self) -> List[Dict[str, Any]]:
+        """Todos los bloques server (nginx.conf + vhosts) parseados localmente"""
+        return self.get_vhost_inventory()['blocks']
+    
+    @round_trip_budget(1)
+    def get_vhost_domains(self) -> List[str]:
+        """
+        Dominio principal de cada vhost activo, en orden de carga
+        
+        El primer server_name concreto (sin comodines, regex ni IPs) del
+        primer bloque del archivo que tenga uno; sale del inventario del host.
+        """
+        domains: Dict[str, None] = {}
+        seen_files = set()
+        for block in self.get_vhost_inventory()['blocks']:
+            if block['file'] in seen_files or not block['file'].startswith(f"{self.vhost_dir}/"):
+                continue
+            for name in block['server_names']:
+                name = name.lower().rstrip('.')
+                if ('.' in name and not name.startswith(('~', '.')) and '*' not in name and ':' not in name
+                        and not name.replace('.', '').isdigit()):
+                    seen_files.add(block['file'])
+                    domains.setdefault(name)
+                    break
+        return list(domains)
+    
     def get_server_names(self, config_file: str) -> List[str]:
         """Extraer server_name de un archivo de configuración"""
         stdout, _, _ = self.ssh.execute_command(
@@ -63,6 +129,7 @@ class NginxManager:
             f"mv {config_file} {disabled_file}",
             f"Deshabilitando {config_file} → {disabled_file}"
         )
+        self.cache.invalidate('nginx')
         return disabled_file
     
     def enable_config(self, disabled_file: str) -> str:
@@ -73,6 +140,7 @@ class NginxManager:
                 f"mv {disabled_file} {active_file}",
                 f"Habilitando {disabled_file} → {active_file}"
             )
+            self.cache.invalidate('nginx')
             return active_file
         return disabled_file
     
@@ -87,14 +155,27 @@ class NginxManager:
             f"cat > {full_path} << 'EOF'\n{escaped_content}\nEOF",
             f"Creando configuración {full_path}"
         )
+        self.cache.invalidate('nginx')
         return True
     
-    def test_config(self) -> Tuple[bool, str]:
-        """Probar configuración nginx"""
+    def test_config(self, cached: bool = False) -> Tuple[bool, str]:
+        """
+        Probar configuración nginx
+        
+        Con cached=True se reusa el resultado del cache del host si la
+        configuración no cambió (un análisis); después de modificarla hay que
+        llamarlo sin cache.
+        """
+        if cached:
+            result = self.cache.lookup(self.ssh, 'nginx_test')
+            if result is not None:
+                return result['passed'], result['output']
+        
         stdout, stderr, exit_code = self.ssh.execute_command(
             "nginx -t",
             "Probando configuración nginx"
         )
+        self.cache.store('nginx_test', {'passed': exit_code == 0, 'output': stdout + stderr})
         return exit_code == 0, stdout + stderr
     
     def reload_nginx(self) -> bool:
@@ -113,44 +194,79 @@ class NginxManager:
         )
         return stdout
     
-    def find_interceptors(self, target_domain: str) -> List[Dict[str, Any]]:
+    @round_trip_budget(1)
+    def find_interceptors(self, target_domain: str,
+                          blocks: Optional[List[Dict[str, Any]]] = None,
+                          table: Optional[Dict[Tuple[str, int], Dict[str, Any]]] = None,
+                          names: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
         """
-        Encontrar configuraciones que podrían estar interceptando requests
-        para un dominio específico
+        Encontrar configuraciones que interceptan requests para un dominio
+        
+        Resuelve el dominio como nginx en cada socket relevante (tabla
+        socket -> bloques del snapshot): los sockets donde el dominio está
+        declarado, los de una dirección específica en esos puertos donde no lo
+        está y, si el dominio no tiene bloque propio, los de 80/443 sin
+        default_server explícito. Un bloque intercepta si gana la resolución y
+        no es la configuración del dominio. Para muchos dominios sobre el
+        mismo snapshot se pasan `table` y `names` (index_server_names)
+        construidos una sola vez.
         """
-        interceptors = []
-        active_configs = self.get_active_configs()
+        if blocks is None:
+            blocks = self.get_server_blocks()
+        if table is None:
+            table = build_socket_table(blocks)
+        hostname = target_domain.lower()
         
-        for config in active_configs:
-            # Obtener server_names y puertos
-            server_names = self.get_server_names(config)
-            listen_ports = self.get_listen_ports(config)
-            
-            # Verificar si podría interceptar
-            could_intercept = False
-            reason = ""
-            
-            # Si no tiene server_name específico
-            if not server_names or any('_' in name for name in server_names):
-                could_intercept = True
-                reason = "Configuración catch-all (server_name _)"
+        if names is not None:
+            declaring = names.get(hostname, [])
+        else:
+            declaring = [block for block in blocks if hostname in (name.lower() for name in block['server_names'])]
+        own = [block for block in declaring if target_domain in os.path.basename(block['file'])] or declaring
+        own_ids = {id(block) for block in own}
+        own_ports = {port for (address, port), entry in table.items() if hostname in entry['exact']}
+        
+        if own:
+            sockets = [socket for socket, entry in table.items()
+                       if socket[1] in own_ports and (hostname in entry['exact'] or socket[0] not in ('*', '[::]'))]
+        else:
+            sockets = [socket for socket in table if socket[1] in (80, 443)]
+        
+        interceptors: Dict[str, Dict[str, Any]] = {}
+        for socket in sorted(sockets, key=lambda item: (item[1], item[0])):
+            entry = table[socket]
+            block, match = resolve_server(entry, hostname)
+            # Sin bloque propio, solo interesa el default elegido por orden de carga:
+            # un default_server explícito es el fallback buscado
+            if id(block) in own_ids or (not own and (match != 'default_server' or entry['explicit_default'])):
+                continue
             
-            # Si viene antes alfabéticamente que el target
-            config_basename = os.path.basename(config)
-            if config_basename < f"{target_domain}.conf":
-                could_intercept = True
-                reason += " + Orden alfabético anterior"
+            socket_name = f"{socket[0]}:{socket[1]}"
+            if match == 'exact':
+                reason = f"Declara {target_domain} antes que su configuración en {socket_name}"
+            elif match == 'default_server':
+                kind = 'default_server' if entry['explicit_default'] else 'primero en orden alfabético'
+                reason = f"Atiende {target_domain} como servidor por defecto de {socket_name} ({kind})"
+            else:
+                reason = f"Su server_name ({match}) captura {target_domain} en {socket_name}"
             
-            if could_intercept:
-                interceptors.append({
-                    'config_file': config,
-                    'server_names': server_names,
-                    'listen_ports': listen_ports,
-                    'reason': reason.strip()
-                })
+            interceptor = interceptors.setdefault(block['file'], {
+                'config_file': block['file'],
+                'line': block['line'],
+                'server_names': block['server_names'],
+                'listen_ports': [' '.join(args) for args in block['listen']],
+                'sockets': [],
+                'match': match,
+                'reasons': []
+            })
+            interceptor['sockets'].append(socket_name)
+            interceptor['reasons'].append(reason)
         
-        return interceptors
+        for interceptor in interceptors.values():
+            interceptor['reason'] = '; '.join(dict.fromkeys(interceptor.pop('reasons')))
+            interceptor['description'] = interceptor['reason']
+        return list(interceptors.values())
     
+    @round_trip_budget(2)
     def analyze_domain_conflicts(self, target_domain: str) -> Dict[str, Any]:
         """Análisis completo de conflictos para un dominio"""
         analysis = {
@@ -160,21 +276,24 @@ class NginxManager:
             'conflicts': []
         }
         
-        active_configs = self.get_active_configs()
+        blocks = self.get_server_blocks()
+        configs: Dict[str, Dict[str, Any]] = {}
+        for block in blocks:
+            if not block['file'].startswith(f"{self.vhost_dir}/"):
+                continue
+            config_info = configs.setdefault(block['file'], {
+                'file': block['file'],
+                'server_names': [],
+                'listen_ports': []
+            })
+            config_info['server_names'].extend(block['server_names'])
+            config_info['listen_ports'].extend(' '.join(args) for args in block['listen'])
         
-        for config in active_configs:
-            server_names = self.get_server_names(config)
-            listen_ports = self.get_listen_ports(config)
-            
-            config_info = {
-                'file': config,
-                'server_names': server_names,
-                'listen_ports': listen_ports
-            }
+        for config, config_info in configs.items():
             analysis['active_configs'].append(config_info)
             
             # Verificar conflictos directos
-            if target_domain in server_names:
+            if target_domain in config_info['server_names']:
                 analysis['conflicts'].append({
                     'type': 'direct_conflict',
                     'config': config,
@@ -182,6 +301,6 @@ class NginxManager:
                 })
         
         # Encontrar interceptores
-        analysis['interceptors'] = self.find_interceptors(target_domain)
+        analysis['interceptors'] = self.find_interceptors(target_domain, blocks)
         
-        return analysis
\ No newline at end of file
+        return analysis
@@ -4,15 +4,73 @@ SSH Manager - Manejo centralizado de conexiones SSH
 """
 
 import paramiko
+import base64
 import json
 import os
+import time
+import functools
+import shlex
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
-from typing import Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
+
+from server_health_check.transport import CommandRecorder, CommandTimings, ReplayTransport
+
+# Métodos de transporte: el "caller" de un comando es el primer frame fuera de ellos
+TRANSPORT_METHODS = ('execute_command', '_exec_remote', 'file_exists', 'read_file',
+                     'write_file', 'replace_file', 'backup_file')
+
+# Caracteres del comando que se muestran con echo_output=False (scripts y payloads en base64)
+COMMAND_ECHO_LIMIT = 160
+
+class RoundTripBudgetExceeded(RuntimeError):
+    """Un entry point ejecutó más comandos remotos que los declarados en su presupuesto"""
+
+
+class RoundTripBudget:
+    """Contador de round trips de un entry point contra su máximo declarado"""
+    
+    def __init__(self, label: str, limit: int):
+        self.label = label
+        self.limit = limit
+        self.calls = 0
+    
+    @property
+    def exceeded(self) -> bool:
+        return self.calls > self.limit
+    
+    def describe(self) -> str:
+        return f"{self.label}: {self.calls} round trips (presupuesto {self.limit})"
+
+
+def round_trip_budget(limit: int):
+    """
+    Declarar el máximo de comandos remotos de un método de analyzer/fixer
+    
+    El método debe pertenecer a una clase con `self.ssh` (SSHManager). Los
+    costos que dependen de la cantidad de elementos se suman desde el cuerpo
+    del método con `self.ssh.extend_budget(n)` una vez conocido el tamaño.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            label = f"{type(self).__name__}.{func.__name__}"
+            with self.ssh.budget(label, limit):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
 
 class SSHManager:
     def __init__(self, config_file: str = "ssl_diagnostics/.env"):
         self.ssh: Optional[paramiko.SSHClient] = None
         self.config = self._load_config(config_file)
+        self.recorder: Optional[CommandRecorder] = None
+        self.replay: Optional[ReplayTransport] = None
+        self.timings: Optional[CommandTimings] = None
+        self.budgets: List[RoundTripBudget] = []
+        # En modo estricto (tests) exceder un presupuesto es un error en lugar de un warning
+        self.strict_budgets = os.environ.get('SSL_DIAG_STRICT_BUDGETS', '') == '1'
         
     def _load_config(self, config_file: str) -> dict:
         """Cargar configuración desde archivo"""
@@ -33,8 +91,59 @@ class SSHManager:
             **config
         }
     
+    def enable_recording(self, path: str):
+        """Grabar todos los comandos ejecutados en un fixture (se escribe al cerrar)"""
+        self.recorder = CommandRecorder(path, host=self.config['hostname'])
+    
+    def use_replay(self, path: str, rtt: float = 0.0, use_recorded_latency: bool = False):
+        """Servir los comandos desde un fixture grabado en lugar del servidor"""
+        self.replay = ReplayTransport(path, rtt=rtt, use_recorded_latency=use_recorded_latency)
+    
+    def enable_timings(self) -> CommandTimings:
+        """Medir cada comando ejecutado (ver CommandTimings.summary)"""
+        self.timings = CommandTimings(TRANSPORT_METHODS)
+        return self.timings
+    
+    def step(self, name: str):
+        """Atribuir los comandos ejecutados dentro del bloque a un paso del diagnóstico"""
+        return self.timings.step(name) if self.timings else nullcontext()
+    
+    @contextmanager
+    def budget(self, label: str, limit: int, strict: Optional[bool] = None) -> Iterator[RoundTripBudget]:
+        """
+        Contar los comandos remotos ejecutados dentro del bloque
+        
+        Al salir, si se superó `limit` se muestra un warning, o se lanza
+        RoundTripBudgetExceeded en modo estricto.
+        """
+        budget = RoundTripBudget(label, limit)
+        self.budgets.append(budget)
+        try:
+            yield budget
+        finally:
+            self.budgets.remove(budget)
+        
+        if budget.exceeded:
+            if self.strict_budgets if strict is None else strict:
+                raise RoundTripBudgetExceeded(budget.describe())
+            print(f"⚠️  Presupuesto de round trips excedido - {budget.describe()}")
+    
+    def extend_budget(self, extra: int):
+        """Sumar round trips esperados (p. ej. por archivo) a los presupuestos activos"""
+        for budget in self.budgets:
+            budget.limit += extra
+    
     def connect(self) -> bool:
         """Establecer conexión SSH"""
+        if self.replay:
+            print(f"OK: Modo replay, comandos servidos desde {self.replay.path}")
+            return True
+        
+        # Reutilizar una conexión ya abierta (p. ej. inyectada desde la CLI)
+        transport = self.ssh.get_transport() if self.ssh else None
+        if transport and transport.is_active():
+            return True
+        
         try:
             self.ssh = paramiko.SSHClient()
             self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -52,29 +161,63 @@ class SSHManager:
             print(f"ERROR conectando SSH: {e}")
             return False
     
-    def execute_command(self, command: str, description: str = "") -> Tuple[str, str, int]:
+    def execute_command(self, command: str, description: str = "",
+                        echo_output: bool = True) -> Tuple[str, str, int]:
         """
         Ejecutar comando SSH y retornar (stdout, stderr, exit_code)
+        
+        Con echo_output=False no se imprime el stdout (descargas en bloque) y
+        el comando se muestra recortado: suele llevar scripts o archivos en base64.
         """
-        if not self.ssh:
+        if not self.ssh and not self.replay:
             raise ConnectionError("No hay conexión SSH activa")
         
         if description:
             print(f"\nRUN: {description}")
-            print(f"Comando: {command}")
+            if echo_output or len(command) <= COMMAND_ECHO_LIMIT:
+                print(f"Comando: {command}")
+            else:
+                print(f"Comando: {command[:COMMAND_ECHO_LIMIT]}... ({len(command)} bytes)")
         
-        stdin, stdout, stderr = self.ssh.exec_command(command)
-        exit_code = stdout.channel.recv_exit_status()
+        for budget in self.budgets:
+            budget.calls += 1
         
-        stdout_text = stdout.read().decode('utf-8', errors='ignore')
-        stderr_text = stderr.read().decode('utf-8', errors='ignore')
+        started = time.perf_counter()
+        if self.replay:
+            stdout_text, stderr_text, exit_code = self.replay.execute(command)
+        else:
+            stdout_text, stderr_text, exit_code = self._exec_remote(command)
+        
+        if self.timings:
+            self.timings.record(command, description, time.perf_counter() - started,
+                                stdout_text, stderr_text, exit_code)
         
         # Filtrar warnings de npmrc
         if stderr_text and 'npmrc' not in stderr_text:
             print(f"WARN: {stderr_text}")
         
-        if stdout_text:
+        if stdout_text and echo_output:
             print(f"OUT:\n{stdout_text}")
+        elif stdout_text:
+            print(f"OUT: {len(stdout_text)} bytes")
+        
+        return stdout_text, stderr_text, exit_code
+    
+    def _exec_remote(self, command: str) -> Tuple[str, str, int]:
+        """Ejecutar un comando en el servidor (un round trip) y grabarlo si corresponde"""
+        started = time.perf_counter()
+        
+        stdin, stdout, stderr = self.ssh.exec_command(command)
+        
+        # Leer antes de esperar el exit status: con salidas más grandes que la
+        # ventana del canal el servidor se bloquea hasta que se consuman
+        stdout_text = stdout.read().decode('utf-8', errors='ignore')
+        stderr_text = stderr.read().decode('utf-8', errors='ignore')
+        exit_code = stdout.channel.recv_exit_status()
+        
+        if self.recorder:
+            self.recorder.record(command, stdout_text, stderr_text, exit_code,
+                                 time.perf_counter() - started)
         
         return stdout_text, stderr_text, exit_code
     
@@ -105,6 +248,36 @@ class SSHManager:
             print(f"Error escribiendo archivo {filepath}: {e}")
             return False
     
+    def replace_file(self, filepath: str, content: str, backup_path: Optional[str] = None) -> bool:
+        """
+        Reemplazar un archivo de forma atómica en un solo comando
+        
+        El contenido viaja en base64 a un temporal junto al archivo (mismos
+        permisos y dueño) que se renombra encima; con `backup_path` se copia
+        antes el original. Si el rename no es posible (p. ej. /etc/hosts
+        montado por Docker) se sobrescribe en el lugar.
+        """
+        path = shlex.quote(filepath)
+        encoded = base64.b64encode(content.encode('utf-8')).decode('ascii')
+        script = [
+            f"tmp=$(mktemp {shlex.quote(filepath + '.ssl-diag.XXXXXX')}) || exit 1",
+            f"if ! printf '%s' {encoded} | base64 -d > \"$tmp\"; then rm -f \"$tmp\"; exit 1; fi",
+            f"{{ chmod --reference={path} \"$tmp\"; chown --reference={path} \"$tmp\"; }} 2>/dev/null",
+            f"mv -f \"$tmp\" {path} 2>/dev/null || {{ cat \"$tmp\" > {path}; rc=$?; rm -f \"$tmp\"; exit $rc; }}",
+        ]
+        if backup_path:
+            script.insert(1, f"cp -p {path} {shlex.quote(backup_path)} || {{ rm -f \"$tmp\"; exit 1; }}")
+        
+        try:
+            _, stderr, exit_code = self.execute_command('; '.join(script), f"Reemplazando {filepath}",
+                                                        echo_output=False)
+            if exit_code != 0:
+                print(f"Error reemplazando archivo {filepath}: {stderr.strip()}")
+            return exit_code == 0
+        except Exception as e:
+            print(f"Error escribiendo archivo {filepath}: {e}")
+            return False
+    
     def backup_file(self, filepath: str, backup_suffix: Optional[str] = None) -> str:
         """Crear backup de un archivo"""
         if backup_suffix is None:
@@ -119,6 +292,9 @@ class SSHManager:
     
     def close(self):
         """Cerrar conexión SSH"""
+        if self.recorder:
+            print(f"Fixture grabado en {self.recorder.save()}")
+        
         if self.ssh:
             self.ssh.close()
             print("Conexion SSH cerrada")
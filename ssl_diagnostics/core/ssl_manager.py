@@ -4,48 +4,272 @@ SSL Manager - Manejo centralizado de certificados SSL
 """
 
 import os
-import re
-from typing import Dict, List, Optional, Tuple, Any
-from .ssh_manager import SSHManager
+import io
+import json
+import time
+import base64
+import shlex
+import tarfile
+from typing import Dict, List, Optional, Set, Tuple, Any
+from .ssh_manager import SSHManager, round_trip_budget
+from .cert_parser import parse_certificate_pem, parse_many
+from .cert_cache import CertCache
+from .tls_probe import PROBE_BATCH, build_probe_command, summarize_samples
+from .chain_checker import IntermediateStore, TrustStore, check_chain, learn_intermediates
+
+# Prefijo de las líneas de control en la salida de la descarga en bloque
+CERT_MARKER = "@@ssl-diag"
+# Dominios por comando remoto al pedir una lista explícita
+CERT_FETCH_BATCH = 2000
+# Procesos `openssl pkey` simultáneos en el servidor al verificar claves
+KEY_HASH_JOBS = 4
+# sha256 de una entrada vacía: `openssl pkey` no pudo leer la clave
+EMPTY_SHA256 = "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855"
+# Columnas por las que se puede ordenar el inventario
+INVENTORY_SORT_KEYS = {
+    'expiry': lambda row: (row['not_after_ts'] is None, row['not_after_ts'] or 0, row['domain']),
+    'domain': lambda row: row['domain'],
+    'issuer': lambda row: (row['issuer'], row['domain']),
+}
 
 class SSLManager:
-    def __init__(self, ssh_manager: SSHManager):
+    def __init__(self, ssh_manager: SSHManager, use_cache: bool = True):
         self.ssh = ssh_manager
         self.cert_dir = "/www/server/panel/vhost/cert"
+        host = f"{self.ssh.config['hostname']}:{self.ssh.config['port']}"
+        self.cache = CertCache(host) if use_cache else None
+    
+    def _active_cache(self) -> Optional[CertCache]:
+        # Con record/replay los comandos tienen que ser deterministas: sin cache
+        if self.ssh.replay or self.ssh.recorder:
+            return None
+        return self.cache
     
+    @round_trip_budget(1)
     def get_certificate_info(self, domain: str) -> Dict[str, Any]:
         """Obtener información de certificado para un dominio"""
-        cert_path = f"{self.cert_dir}/{domain}"
+        return self.get_certificates_info([domain])[0]
+    
+    @round_trip_budget(1)
+    def get_certificates_info(self, domains: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Obtener información de varios certificados en un solo comando remoto
+        
+        Los PEM se traen en bloque y se parsean localmente (ver cert_parser).
+        Con `domains=None` se incluyen todos los directorios de cert_dir. Los
+        certificados que no cambiaron desde la última corrida salen del cache.
+        """
+        # Un solo argumento de `sh -c` no puede superar 128 KiB: se agrupan dominios
+        if domains and len(domains) > CERT_FETCH_BATCH:
+            self.ssh.extend_budget((len(domains) - 1) // CERT_FETCH_BATCH)
+            infos = []
+            for start in range(0, len(domains), CERT_FETCH_BATCH):
+                infos.extend(self._fetch_certificates(domains[start:start + CERT_FETCH_BATCH]))
+            return infos
+        return self._fetch_certificates(domains)
+    
+    def _fetch_certificates(self, domains: Optional[List[str]]) -> List[Dict[str, Any]]:
+        """Un round trip (dos si el cache quedó desactualizado) para un grupo de dominios"""
+        cache = self._active_cache()
+        paths = None if domains is None else [f"{d}/fullchain.pem" for d in domains]
+        since = cache.since(paths) if cache else None
+        
+        infos, transferred, manifest, checked_at = self._fetch_certificates_remote(domains, since)
+        if cache is None or checked_at is None:
+            return infos
+        
+        stale = []
+        for info in infos:
+            path = f"{info['domain']}/fullchain.pem"
+            if not info['fullchain_exists']:
+                continue
+            sha256, mtime = manifest.get(path, ('', None))
+            if info['domain'] in transferred:
+                cache.store(path, sha256, mtime, checked_at, info['certificate_details'])
+                continue
+            cached = cache.lookup(path, sha256, checked_at)
+            if cached is None:
+                stale.append(info)
+            else:
+                info['certificate_details'] = cached
+        
+        # Reemplazados con un mtime anterior al último escaneo: se traen completos
+        if stale:
+            fresh, fresh_manifest = self._refetch_stale([info['domain'] for info in stale])
+            for info in stale:
+                path = f"{info['domain']}/fullchain.pem"
+                info.update(fresh[info['domain']])
+                sha256, mtime = fresh_manifest.get(path, ('', None))
+                cache.store(path, sha256, mtime, checked_at, info['certificate_details'])
+        
+        if domains is None:
+            cache.retain(manifest)
+        cache.save()
+        return infos
+    
+    @round_trip_budget(1)
+    def get_certificates_by_path(self, paths: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Detalles de certificados en rutas arbitrarias (p. ej. `ssl_certificate`
+        fuera de cert_dir) en un solo comando remoto
+        
+        Devuelve {ruta: {'exists': bool, 'certificate_details': {...}}}.
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        if not paths:
+            return results
+        
+        batches = [paths[start:start + CERT_FETCH_BATCH] for start in range(0, len(paths), CERT_FETCH_BATCH)]
+        self.ssh.extend_budget(len(batches) - 1)
+        for batch in batches:
+            stdout, _, _ = self.ssh.execute_command(
+                f"for f in {' '.join(shlex.quote(p) for p in batch)}; do "
+                f"echo \"{CERT_MARKER} $f\"; [ -f \"$f\" ] && echo '{CERT_MARKER}pem' && cat \"$f\" && echo; "
+                f"done",
+                f"Obteniendo {len(batch)} certificados por ruta",
+                echo_output=False
+            )
+            
+            current = None
+            pem_lines: List[str] = []
+            for line in stdout.split('\n') + [f"{CERT_MARKER} "]:
+                if line.startswith(f"{CERT_MARKER} "):
+                    if current is not None and results[current]['exists']:
+                        results[current]['certificate_details'] = parse_certificate_pem('\n'.join(pem_lines))
+                    current = line[len(CERT_MARKER) + 1:]
+                    if current:
+                        results[current] = {'exists': False, 'certificate_details': {}}
+                    pem_lines = []
+                elif line == f"{CERT_MARKER}pem" and current:
+                    results[current]['exists'] = True
+                elif current:
+                    pem_lines.append(line)
+        
+        for path in paths:
+            results.setdefault(path, {'exists': False, 'certificate_details': {}})
+        return results
+    
+    def _refetch_stale(self, domains: List[str]) -> Tuple[
+            Dict[str, Dict[str, Any]], Dict[str, Tuple[str, Optional[int]]]]:
+        """Traer sin cache los certificados cuyo sha256 no coincide con el cacheado"""
+        self.ssh.extend_budget((len(domains) - 1) // CERT_FETCH_BATCH + 1)
+        infos: Dict[str, Dict[str, Any]] = {}
+        manifest: Dict[str, Tuple[str, Optional[int]]] = {}
+        for start in range(0, len(domains), CERT_FETCH_BATCH):
+            batch, _, batch_manifest, _ = self._fetch_certificates_remote(
+                domains[start:start + CERT_FETCH_BATCH], None)
+            infos.update((info['domain'], info) for info in batch)
+            manifest.update(batch_manifest)
+        return infos, manifest
+    
+    def _fetch_certificates_remote(self, domains: Optional[List[str]], since: Optional[int]) -> Tuple[
+            List[Dict[str, Any]], Set[str], Dict[str, Tuple[str, Optional[int]]], Optional[int]]:
+        """
+        Un round trip: existencia de directorio/archivos, manifiesto (sha256 y
+        mtime de cada fullchain.pem) y contenido de los fullchain.pem
+        
+        Con `since` solo se transfieren los modificados después de ese momento
+        (reloj del servidor). Devuelve (infos, dominios transferidos,
+        manifiesto por ruta, hora del servidor al iniciar).
+        """
+        if domains is None:
+            # Todos los directorios reales (los symlinks se omiten, como en el listado original)
+            loop_head = 'for d in */; do d=${d%/}; [ -L "$d" ] && continue; [ -d "$d" ] || continue; '
+        else:
+            loop_head = f"for d in {' '.join(shlex.quote(d) for d in domains)}; do "
+        
+        newer = ''
+        reference = ''
+        if since is not None:
+            reference = f"touch -d @{since} \"$list.ref\"; "
+            newer = ' && [ "$d/fullchain.pem" -nt "$list.ref" ]'
+        
+        # Un solo awk emite todos los PEM a transferir (un fork en lugar de un cat por archivo)
+        stdout, _, _ = self.ssh.execute_command(
+            f"cd {self.cert_dir} 2>/dev/null || exit 0; "
+            f"echo \"{CERT_MARKER}now $(date +%s)\"; list=$(mktemp); {reference}{loop_head}"
+            f"echo \"{CERT_MARKER} $d\"; "
+            f"[ -d \"$d\" ] || continue; echo '{CERT_MARKER}dir'; "
+            f"[ -f \"$d/privkey.pem\" ] && echo '{CERT_MARKER}privkey'; "
+            f"[ -f \"$d/fullchain.pem\" ] && echo \"$d/fullchain.pem\" >> \"$list\" "
+            f"&& echo '{CERT_MARKER}fullchain'{newer} && echo \"$d/fullchain.pem\" >> \"$list.send\"; "
+            f"done; echo '{CERT_MARKER}pems'; [ -s \"$list.send\" ] && "
+            f"xargs -r -d '\\n' awk 'FNR==1{{print \"{CERT_MARKER}pem \" FILENAME}}1' < \"$list.send\"; "
+            f"echo '{CERT_MARKER}manifest'; xargs -r -d '\\n' sha256sum < \"$list\"; "
+            f"echo '{CERT_MARKER}mtimes'; xargs -r -d '\\n' stat -c '%Y %n' < \"$list\"; "
+            f"rm -f \"$list\" \"$list.ref\" \"$list.send\"",
+            "Obteniendo certificados en bloque",
+            echo_output=False
+        )
         
-        info = {
+        infos = {d: self._empty_info(d) for d in (domains or [])}
+        pems: Dict[str, List[str]] = {}
+        manifest: Dict[str, Tuple[str, Optional[int]]] = {}
+        checked_at: Optional[int] = None
+        current: Optional[Dict[str, Any]] = None
+        pem_lines: Optional[List[str]] = None
+        section = 'certs'
+        
+        for line in stdout.split('\n'):
+            if line.startswith(f"{CERT_MARKER}now "):
+                checked_at = int(line.split()[-1])
+            elif line in (f"{CERT_MARKER}pems", f"{CERT_MARKER}manifest", f"{CERT_MARKER}mtimes"):
+                section = line[len(CERT_MARKER):]
+            elif section == 'certs' and line.startswith(f"{CERT_MARKER} "):
+                domain = line[len(CERT_MARKER) + 1:]
+                current = infos.setdefault(domain, self._empty_info(domain))
+            elif section == 'certs' and current is not None:
+                if line == f"{CERT_MARKER}dir":
+                    current['cert_dir_exists'] = True
+                elif line == f"{CERT_MARKER}privkey":
+                    current['privkey_exists'] = True
+                elif line == f"{CERT_MARKER}fullchain":
+                    current['fullchain_exists'] = True
+            elif section == 'pems':
+                if line.startswith(f"{CERT_MARKER}pem "):
+                    pem_lines = pems.setdefault(os.path.dirname(line[len(CERT_MARKER) + 4:]), [])
+                elif pem_lines is not None:
+                    pem_lines.append(line)
+            elif section == 'manifest' and '  ' in line:
+                sha256, _, path = line.partition('  ')
+                manifest[path] = (sha256, None)
+            elif section == 'mtimes' and ' ' in line:
+                mtime, _, path = line.partition(' ')
+                if path in manifest and mtime.isdigit():
+                    manifest[path] = (manifest[path][0], int(mtime))
+        
+        transferred = set(pems)
+        parsed = parse_many(['\n'.join(lines) for lines in pems.values()])
+        for domain, details in zip(pems, parsed):
+            if domain in infos:
+                infos[domain]['certificate_details'] = details
+        
+        return list(infos.values()), transferred, manifest, checked_at
+    
+    def _empty_info(self, domain: str) -> Dict[str, Any]:
+        return {
             'domain': domain,
             'cert_dir_exists': False,
             'fullchain_exists': False,
             'privkey_exists': False,
             'certificate_details': {}
         }
-        
-        # Verificar si existe el directorio
-        if self.ssh.file_exists(cert_path):
-            info['cert_dir_exists'] = True
-            
-            # Verificar archivos de certificado
-            fullchain_path = f"{cert_path}/fullchain.pem"
-            privkey_path = f"{cert_path}/privkey.pem"
-            
-            info['fullchain_exists'] = self.ssh.file_exists(fullchain_path)
-            info['privkey_exists'] = self.ssh.file_exists(privkey_path)
-            
-            # Obtener detalles del certificado si existe
-            if info['fullchain_exists']:
-                info['certificate_details'] = self._get_cert_details(fullchain_path)
-        
-        return info
     
+    @round_trip_budget(1)
     def analyze_ssl_status(self, domain: str) -> Dict[str, Any]:
         """Analizar estado SSL completo para un dominio"""
-        cert_info = self.get_certificate_info(domain)
-        
+        return self.analyze_ssl_statuses([domain])[domain]
+    
+    @round_trip_budget(1)
+    def analyze_ssl_statuses(self, domains: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Estado SSL de varios dominios con todos los certificados traídos juntos"""
+        domains = list(dict.fromkeys(domains))
+        # Por dominio, no por posición: la salida remota no repite ni garantiza el orden pedido
+        by_domain = {info['domain']: info for info in self.get_certificates_info(domains)}
+        return {domain: self._ssl_status(domain, by_domain.get(domain) or self._empty_info(domain))
+                for domain in domains}
+    
+    def _ssl_status(self, domain: str, cert_info: Dict[str, Any]) -> Dict[str, Any]:
         analysis = {
             'domain': domain,
             'certificate_valid': False,
@@ -68,58 +292,121 @@ class SSLManager:
         
         return analysis
     
-    def _get_cert_details(self, cert_file: str) -> Dict[str, str]:
-        """Extraer detalles del certificado"""
-        details = {}
+    @round_trip_budget(1)
+    def verify_certificate_chain(self, domain: str) -> Tuple[bool, str]:
+        """Verificar cadena de certificados (localmente, ver check_certificate_chains)"""
+        report = self.check_certificate_chains([domain])
+        if not report['results']:
+            return False, f"Archivo de certificado no encontrado: {self.cert_dir}/{domain}/fullchain.pem"
         
-        # Obtener subject
-        stdout, _, _ = self.ssh.execute_command(
-            f"openssl x509 -in {cert_file} -noout -subject",
-            f"Obteniendo subject de {cert_file}"
-        )
-        if stdout:
-            subject_match = re.search(r'CN\s*=\s*([^,\n]+)', stdout)
-            if subject_match:
-                details['common_name'] = subject_match.group(1).strip()
+        result = report['results'][0]
+        return result['status'] == 'complete', result['description']
+    
+    @round_trip_budget(1)
+    def get_fullchain_pems(self, domains: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        Contenido completo de los fullchain.pem (dominio -> PEM) en un round trip
         
-        # Obtener fechas de validez
-        stdout, _, _ = self.ssh.execute_command(
-            f"openssl x509 -in {cert_file} -noout -dates",
-            f"Obteniendo fechas de {cert_file}"
-        )
-        if stdout:
-            for line in stdout.split('\n'):
-                if 'notBefore=' in line:
-                    details['not_before'] = line.split('=', 1)[1].strip()
-                elif 'notAfter=' in line:
-                    details['not_after'] = line.split('=', 1)[1].strip()
+        A diferencia del inventario no pasa por el cache: la verificación de
+        cadenas necesita los intermediarios, no solo los detalles del certificado hoja.
+        """
+        if domains is None:
+            # find no sigue los directorios symlink, igual que el listado de certificados
+            listing = "find . -mindepth 2 -maxdepth 2 -name fullchain.pem -print0 | xargs -0 -r "
+            batches: List[Optional[List[str]]] = [None]
+        else:
+            batches = [domains[start:start + CERT_FETCH_BATCH] for start in range(0, len(domains), CERT_FETCH_BATCH)]
+            self.ssh.extend_budget(max(0, len(batches) - 1))
         
-        # Obtener issuer
-        stdout, _, _ = self.ssh.execute_command(
-            f"openssl x509 -in {cert_file} -noout -issuer",
-            f"Obteniendo issuer de {cert_file}"
-        )
-        if stdout:
-            issuer_match = re.search(r'CN\s*=\s*([^,\n]+)', stdout)
-            if issuer_match:
-                details['issuer'] = issuer_match.group(1).strip()
+        pems: Dict[str, List[str]] = {}
+        for batch in batches:
+            if batch is not None:
+                listing = (f"for d in {' '.join(shlex.quote(d) for d in batch)}; do "
+                           f"[ -f \"$d/fullchain.pem\" ] && printf '%s\\0' \"$d/fullchain.pem\"; done | xargs -0 -r ")
+            stdout, _, _ = self.ssh.execute_command(
+                f"cd {self.cert_dir} 2>/dev/null || exit 0; "
+                f"{listing}awk 'FNR==1{{print \"{CERT_MARKER}pem \" FILENAME}}1'",
+                "Obteniendo cadenas completas de certificados",
+                echo_output=False
+            )
+            
+            lines: Optional[List[str]] = None
+            for line in stdout.split('\n'):
+                if line.startswith(f"{CERT_MARKER}pem "):
+                    path = os.path.normpath(line[len(CERT_MARKER) + 4:])
+                    lines = pems.setdefault(os.path.dirname(path), [])
+                elif lines is not None:
+                    lines.append(line)
         
-        return details
+        return {domain: '\n'.join(lines) for domain, lines in sorted(pems.items())}
     
-    def verify_certificate_chain(self, domain: str) -> Tuple[bool, str]:
-        """Verificar cadena de certificados"""
-        cert_file = f"{self.cert_dir}/{domain}/fullchain.pem"
+    @round_trip_budget(1)
+    def check_certificate_chains(self, domains: Optional[List[str]] = None,
+                                 trust_store: Optional[str] = None,
+                                 intermediates: Optional[IntermediateStore] = None) -> Dict[str, Any]:
+        """
+        Verificar localmente la cadena servida por cada fullchain.pem
         
-        if not self.ssh.file_exists(cert_file):
-            return False, f"Archivo de certificado no encontrado: {cert_file}"
+        Todas las cadenas se traen en un round trip y se arman contra el
+        almacén de confianza local (ver chain_checker.default_trust_store)
+        más el cache de intermediarios, que aprende los intermediarios
+        servidos por cualquier dominio del host. Señala las cadenas
+        incompletas: el cliente tiene que descargar el intermediario por AIA,
+        lo que agrega un round trip (o un fallo) al primer handshake.
+        """
+        pems = self.get_fullchain_pems(domains)
+        trust = TrustStore(trust_store)
+        if intermediates is None:
+            intermediates = IntermediateStore()
+        learned = learn_intermediates(pems.values(), intermediates)
+        intermediates.save()
         
-        stdout, stderr, exit_code = self.ssh.execute_command(
-            f"openssl verify {cert_file}",
-            f"Verificando cadena de certificados para {domain}"
-        )
+        report = {
+            'trust_store': trust.path,
+            'trust_anchors': len(trust),
+            'cached_intermediates': len(intermediates),
+            'learned_intermediates': learned,
+            'checked': len(pems),
+            'complete': 0,
+            'incomplete': [],
+            'untrusted': [],
+            'unparsed': [],
+            'includes_root': [],
+            'expired_intermediates': [],
+            'results': []
+        }
+        
+        for domain, pem_text in pems.items():
+            result = check_chain(pem_text, trust, intermediates)
+            result['domain'] = domain
+            result['description'] = self._describe_chain(domain, result)
+            report['results'].append(result)
+            
+            if result['status'] == 'complete':
+                report['complete'] += 1
+            else:
+                report[result['status']].append(domain)
+            if result['includes_root']:
+                report['includes_root'].append(domain)
+            if result['expired_intermediates']:
+                report['expired_intermediates'].append(domain)
+        
+        return report
+    
+    def _describe_chain(self, domain: str, result: Dict[str, Any]) -> str:
+        if result['status'] == 'unparsed':
+            return f"{domain}: fullchain.pem no contiene certificados legibles"
+        if result['status'] == 'complete':
+            return f"{domain}: cadena completa ({' -> '.join(result['path'])})"
         
-        return exit_code == 0, stdout + stderr
+        missing = result['missing'][0] if result['missing'] else ''
+        if result['status'] == 'incomplete':
+            hint = ("el intermediario está en el cache local" if result['resolved_by_cache']
+                    else f"AIA: {', '.join(result['aia_urls'])}")
+            return f"{domain}: cadena incompleta, falta {missing} ({hint})"
+        return f"{domain}: la cadena no llega a ninguna CA de confianza (emisor: {missing or result['path'][-1]})"
     
+    @round_trip_budget(1)
     def test_ssl_connection(self, domain: str, port: int = 443) -> Dict[str, Any]:
         """Probar conexión SSL a un dominio"""
         result = {
@@ -146,26 +433,247 @@ class SSLManager:
         
         return result
     
+    @round_trip_budget(1)
+    def probe_tls_handshakes(self, hostnames: List[str], port: int = 443, iterations: int = 10,
+                             concurrency: int = 16, timeout: float = 5.0) -> List[Dict[str, Any]]:
+        """
+        Benchmark de handshakes TLS contra localhost:port con SNI de cada hostname
+        
+        Un solo comando (por lote de PROBE_BATCH hostnames) ejecuta en el
+        servidor `iterations` handshakes completos por hostname, con hasta
+        `concurrency` hostnames en paralelo, más un intento de reanudación de
+        sesión. Devuelve por hostname los percentiles de latencia del
+        handshake (ms, sin contar el connect TCP), protocolo, cifrado, ALPN
+        negociado con ['h2', 'http/1.1'] y si la sesión se reanudó.
+        """
+        if not hostnames:
+            return []
+        
+        batches = [hostnames[start:start + PROBE_BATCH] for start in range(0, len(hostnames), PROBE_BATCH)]
+        self.ssh.extend_budget(len(batches) - 1)
+        
+        results = []
+        for batch in batches:
+            stdout, stderr, exit_code = self.ssh.execute_command(
+                build_probe_command(batch, port, iterations, concurrency, timeout),
+                f"Benchmark de handshakes TLS ({len(batch)} hostnames)",
+                echo_output=False
+            )
+            
+            try:
+                raw = json.loads(stdout.strip().split('\n')[-1]) if stdout.strip() else None
+            except ValueError:
+                raw = None
+            if not isinstance(raw, list):
+                error = (stderr.strip().split('\n') or [''])[-1] or f"El probe terminó con código {exit_code}"
+                raw = [{'hostname': name, 'samples': [], 'protocol': '', 'cipher': '', 'alpn': '',
+                        'resumed': False, 'resumed_ms': None, 'error': error} for name in batch]
+            
+            for item in raw:
+                item['latency_ms'] = summarize_samples(item.pop('samples'))
+                results.append(item)
+        
+        return results
+    
+    @round_trip_budget(1)
     def list_all_certificates(self) -> List[Dict[str, Any]]:
         """Listar todos los certificados disponibles"""
+        return self.get_certificates_info()
+    
+    @round_trip_budget(1)
+    def get_certificate_inventory(self, sort_by: str = 'expiry',
+                                  workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Inventario de todos los certificados del host en un round trip
+        
+        Los fullchain.pem que cambiaron desde la última corrida se transfieren
+        como un único tar.gz (base64) y se parsean localmente en un pool de
+        procesos; el resto sale del cache. De privkey.pem solo se transfiere
+        la existencia: las claves privadas no salen del servidor.
+        """
+        cache = self._active_cache()
+        since = cache.since() if cache else None
+        
+        find_chains = "find . -mindepth 2 -maxdepth 2 -name fullchain.pem"
+        newer = ''
+        reference = ''
+        if since is not None:
+            reference = f"ref=$(mktemp); touch -d @{since} \"$ref\"; "
+            newer = ' -newer "$ref"'
+        
+        stdout, _, _ = self.ssh.execute_command(
+            f"cd {self.cert_dir} 2>/dev/null || exit 0; "
+            f"echo \"{CERT_MARKER}now $(date +%s)\"; {reference}"
+            f"find . -mindepth 2 -maxdepth 2 -name privkey.pem; "
+            f"echo '{CERT_MARKER}manifest'; {find_chains} -exec sha256sum {{}} +; "
+            f"echo '{CERT_MARKER}mtimes'; {find_chains} -printf '%Ts %p\\n'; "
+            f"echo '{CERT_MARKER}archive'; "
+            f"{find_chains}{newer} -print0 | tar --null -T - -czf - 2>/dev/null | base64 -w0; "
+            f"[ -n \"$ref\" ] && rm -f \"$ref\"",
+            "Inventario de certificados (archivo único)",
+            echo_output=False
+        )
+        
+        head, _, archive = stdout.partition(f"{CERT_MARKER}archive")
+        checked_at: Optional[int] = None
+        with_privkey = set()
+        manifest: Dict[str, Tuple[str, Optional[int]]] = {}
+        section = 'privkeys'
+        for line in head.split('\n'):
+            line = line.strip()
+            if line.startswith(f"{CERT_MARKER}now "):
+                checked_at = int(line.split()[-1])
+            elif line in (f"{CERT_MARKER}manifest", f"{CERT_MARKER}mtimes"):
+                section = line[len(CERT_MARKER):]
+            elif section == 'privkeys' and line:
+                with_privkey.add(os.path.normpath(os.path.dirname(line)))
+            elif section == 'manifest' and '  ' in line:
+                sha256, _, path = line.partition('  ')
+                manifest[os.path.normpath(path)] = (sha256, None)
+            elif section == 'mtimes' and ' ' in line:
+                mtime, _, path = line.partition(' ')
+                path = os.path.normpath(path)
+                if path in manifest and mtime.isdigit():
+                    manifest[path] = (manifest[path][0], int(mtime))
+        
+        domains: List[str] = []
+        pems: List[str] = []
+        if archive.strip():
+            data = base64.b64decode(archive.strip())
+            with tarfile.open(fileobj=io.BytesIO(data), mode='r:gz') as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    domains.append(os.path.normpath(os.path.dirname(member.name)))
+                    pems.append(tar.extractfile(member).read().decode('utf-8', errors='ignore'))
+        
+        details_by_domain = dict(zip(domains, parse_many(pems, workers)))
+        
+        if cache is not None and checked_at is not None:
+            stale = []
+            for path, (sha256, mtime) in manifest.items():
+                domain = os.path.dirname(path)
+                if domain in details_by_domain:
+                    cache.store(path, sha256, mtime, checked_at, details_by_domain[domain])
+                    continue
+                cached = cache.lookup(path, sha256, checked_at)
+                if cached is None:
+                    stale.append(domain)
+                else:
+                    details_by_domain[domain] = cached
+            
+            if stale:
+                fresh, fresh_manifest = self._refetch_stale(stale)
+                for domain in stale:
+                    path = f"{domain}/fullchain.pem"
+                    details_by_domain[domain] = fresh[domain]['certificate_details']
+                    sha256, mtime = fresh_manifest.get(path, ('', None))
+                    cache.store(path, sha256, mtime, checked_at, details_by_domain[domain])
+            
+            cache.retain(manifest)
+            cache.save()
+        
+        now = time.time()
+        rows = []
+        for domain, details in sorted(details_by_domain.items()):
+            not_after_ts = details.get('not_after_ts')
+            rows.append({
+                'domain': domain,
+                'common_name': details.get('common_name', ''),
+                'issuer': details.get('issuer', ''),
+                'sans': details.get('sans', []),
+                'not_after': details.get('not_after', ''),
+                'not_after_ts': not_after_ts,
+                'days_left': int((not_after_ts - now) // 86400) if not_after_ts else None,
+                'key_type': details.get('key_type', ''),
+                'key_size': details.get('key_size', 0),
+                'fingerprint_sha256': details.get('fingerprint_sha256', ''),
+                'spki_sha256': details.get('spki_sha256', ''),
+                'privkey_exists': domain in with_privkey,
+                'parse_error': details.get('parse_error', ''),
+            })
+        
+        rows.sort(key=INVENTORY_SORT_KEYS[sort_by])
+        return rows
+    
+    @round_trip_budget(2)
+    def verify_key_pairs(self, workers: Optional[int] = None,
+                         inventory: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Verificar que cada privkey.pem corresponda a su fullchain.pem
+        
+        Compara el sha256 de la clave pública (SPKI) de cada par: la del
+        certificado sale del inventario (parseo local en paralelo, con cache)
+        y la de la clave se calcula en el servidor con `openssl pkey -pubout`
+        en un solo comando, así que las claves privadas no salen del servidor.
+        Se puede pasar un inventario ya obtenido para ahorrar ese round trip.
+        """
+        if inventory is None:
+            inventory = self.get_certificate_inventory(sort_by='domain', workers=workers)
+        
+        key_hash = ('echo "$(openssl pkey -in "$1" -pubout -outform DER 2>/dev/null '
+                    '| sha256sum | cut -c1-64) $1"')
         stdout, _, _ = self.ssh.execute_command(
-            f"ls -la {self.cert_dir}/",
-            "Listando todos los certificados"
+            f"cd {self.cert_dir} 2>/dev/null || exit 0; "
+            f"find . -mindepth 2 -maxdepth 2 -name privkey.pem -print0 "
+            f"| xargs -0 -r -n 1 -P {KEY_HASH_JOBS} sh -c {shlex.quote(key_hash)} _",
+            "Huella de clave pública de cada privkey.pem",
+            echo_output=False
         )
         
-        certificates = []
+        key_hashes = {}
         for line in stdout.split('\n'):
-            if line.strip() and ' -> ' not in line and line.startswith('d'):
-                # Es un directorio
-                parts = line.split()
-                if len(parts) >= 9:
-                    domain = parts[8]
-                    if domain not in ['.', '..']:
-                        cert_info = self.get_certificate_info(domain)
-                        certificates.append(cert_info)
+            digest, _, path = line.strip().partition(' ')
+            if path:
+                key_hashes[os.path.normpath(os.path.dirname(path))] = digest
         
-        return certificates
+        results = {
+            'checked': 0,
+            'matched': 0,
+            'mismatches': [],
+            'missing_keys': [],
+            'unreadable_keys': [],
+            'unparsed_certificates': []
+        }
+        
+        for row in inventory:
+            domain = row['domain']
+            if not row['privkey_exists'] or domain not in key_hashes:
+                results['missing_keys'].append(domain)
+                continue
+            if not row['spki_sha256']:
+                results['unparsed_certificates'].append(domain)
+                continue
+            if key_hashes[domain] == EMPTY_SHA256:
+                results['unreadable_keys'].append(domain)
+                continue
+            
+            results['checked'] += 1
+            cert_spki = row['spki_sha256'].replace(':', '').lower()
+            if cert_spki == key_hashes[domain]:
+                results['matched'] += 1
+            else:
+                results['mismatches'].append({
+                    'domain': domain,
+                    'certificate_spki_sha256': cert_spki,
+                    'key_spki_sha256': key_hashes[domain]
+                })
+        
+        return results
+    
+    def format_inventory_table(self, rows: List[Dict[str, Any]]) -> str:
+        """Tabla de texto del inventario (una fila por certificado)"""
+        lines = [f"{'DÍAS':>5}  {'VENCE':<24}  {'CLAVE':<18}  {'KEY':<3}  {'EMISOR':<28}  DOMINIO"]
+        for row in rows:
+            days = '?' if row['days_left'] is None else str(row['days_left'])
+            key = f"{row['key_type']} {row['key_size']}".strip() if row['key_type'] else '-'
+            privkey = 'sí' if row['privkey_exists'] else 'NO'
+            issuer = row['issuer'] or (f"ERROR: {row['parse_error']}" if row['parse_error'] else '-')
+            lines.append(f"{days:>5}  {row['not_after'] or '-':<24}  {key:<18}  {privkey:<3}  "
+                         f"{issuer[:28]:<28}  {row['domain']}")
+        return '\n'.join(lines)
     
+    @round_trip_budget(1)
     def extract_certificate_from_server(self, domain: str, port: int = 443) -> str:
         """Extraer certificado desde el servidor en vivo"""
         stdout, _, _ = self.ssh.execute_command(
@@ -1,69 +1,51 @@
 #!/usr/bin/env python3
 """
 State Manager - Persistencia de estado para evitar repetir pasos completados
+
+El estado vive en memoria y cada cambio se describe como un registro que
+el backend persiste sin reescribir todo (ver state_store): por defecto una
+base SQLite compartida por todos los dominios y hosts.
 """
 
-import json
+import atexit
 import os
 from datetime import datetime
 from typing import Dict, Any, Optional, Set
+from .state_store import (JournalStateBackend, SQLiteStateBackend, apply_record, default_state, default_state_dir,
+                          open_state_index, selected_backend)
 
 class StateManager:
-    def __init__(self, domain: str, state_dir: Optional[str] = None):
+    def __init__(self, domain: str, state_dir: Optional[str] = None, host: str = '',
+                 backend: Optional[str] = None):
         self.domain = domain
-        self.state_dir = state_dir or os.path.join(os.path.dirname(__file__), '..', 'state')
-        self.state_file = os.path.join(self.state_dir, f"{domain.replace('.', '_')}_state.json")
+        self.host = host
+        self.state_dir = state_dir or default_state_dir()
         
         # Crear directorio state si no existe
         os.makedirs(self.state_dir, exist_ok=True)
         
-        self.state = self._load_state()
-    
-    def _load_state(self) -> Dict[str, Any]:
-        """Cargar estado desde archivo"""
-        default_state = {
-            'domain': self.domain,
-            'created_at': datetime.now().isoformat(),
-            'last_updated': datetime.now().isoformat(),
-            'completed_steps': [],
-            'session_data': {},
-            'analysis_results': {},
-            'version': '1.0'
-        }
-        
-        if not os.path.exists(self.state_file):
-            return default_state
+        backend = backend or selected_backend()
+        if backend == 'journal':
+            self.store = JournalStateBackend(self.state_dir, domain)
+        else:
+            self.store = SQLiteStateBackend(self.state_dir, domain, host)
+        self.state_file = self.store.location
         
-        try:
-            with open(self.state_file, 'r', encoding='utf-8') as f:
-                state = json.load(f)
-                
-            # Verificar que es para el dominio correcto
-            if state.get('domain') != self.domain:
-                print(f"⚠️  Estado existente es para {state.get('domain')}, creando nuevo estado para {self.domain}")
-                return default_state
-            
-            # Actualizar campos que podrían faltar
-            for key, value in default_state.items():
-                if key not in state:
-                    state[key] = value
-            
-            return state
-        
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"⚠️  Error cargando estado, creando nuevo: {e}")
-            return default_state
-    
-    def _save_state(self):
-        """Guardar estado actual al archivo"""
-        try:
-            self.state['last_updated'] = datetime.now().isoformat()
-            
-            with open(self.state_file, 'w', encoding='utf-8') as f:
-                json.dump(self.state, f, indent=2, ensure_ascii=False)
-        
-        except IOError as e:
-            print(f"⚠️  Error guardando estado: {e}")
+        self.state = self.store.load(default_state(domain, host))
+        atexit.register(self.close)
+    
+    def _append(self, op: str, **fields):
+        """Registrar un cambio: aplicarlo en memoria y persistir solo el registro"""
+        record = {'seq': self.state['journal_seq'] + 1, 'op': op, 'at': datetime.now().isoformat(), **fields}
+        apply_record(self.state, record)
+        self.store.write(record, self.state)
+    
+    def flush(self):
+        """Asegurar en disco los cambios pendientes"""
+        self.store.flush()
+    
+    def close(self):
+        self.store.close()
     
     def is_step_completed(self, step_id: str) -> bool:
         """Verificar si un paso ya fue completado"""
@@ -71,19 +53,10 @@ class StateManager:
     
     def mark_step_completed(self, step_id: str, details: Optional[Dict[str, Any]] = None):
         """Marcar un paso como completado"""
-        if step_id not in self.state['completed_steps']:
-            self.state['completed_steps'].append(step_id)
-        
-        # Guardar detalles del paso si se proporcionan
-        if details:
-            if 'step_details' not in self.state:
-                self.state['step_details'] = {}
-            self.state['step_details'][step_id] = {
-                'completed_at': datetime.now().isoformat(),
-                'details': details
-            }
+        if step_id in self.state['completed_steps'] and not details:
+            return
         
-        self._save_state()
+        self._append('step', step=step_id, details=details)
     
     def get_completed_steps(self) -> Set[str]:
         """Obtener conjunto de pasos completados"""
@@ -91,29 +64,17 @@ class StateManager:
     
     def clear_step(self, step_id: str):
         """Limpiar un paso específico (forzar que se ejecute de nuevo)"""
-        if step_id in self.state['completed_steps']:
-            self.state['completed_steps'].remove(step_id)
-        
-        if 'step_details' in self.state and step_id in self.state['step_details']:
-            del self.state['step_details'][step_id]
-        
-        self._save_state()
+        self._append('clear_step', step=step_id)
         print(f"🔄 Paso {step_id} marcado para re-ejecutar")
     
     def clear_all_steps(self):
         """Limpiar todos los pasos (empezar desde cero)"""
-        self.state['completed_steps'] = []
-        self.state['step_details'] = {}
-        self._save_state()
+        self._append('clear_steps')
         print("🔄 Todos los pasos marcados para re-ejecutar")
     
     def save_analysis_result(self, analysis_type: str, result: Dict[str, Any]):
         """Guardar resultado de análisis para referencia futura"""
-        self.state['analysis_results'][analysis_type] = {
-            'timestamp': datetime.now().isoformat(),
-            'result': result
-        }
-        self._save_state()
+        self._append('analysis', type=analysis_type, result=result)
     
     def get_analysis_result(self, analysis_type: str) -> Optional[Dict[str, Any]]:
         """Obtener resultado de análisis previo"""
@@ -123,8 +84,7 @@ class StateManager:
     
     def save_session_data(self, key: str, value: Any):
         """Guardar datos de sesión"""
-        self.state['session_data'][key] = value
-        self._save_state()
+        self._append('session', key=key, value=value)
     
     def get_session_data(self, key: str, default: Any = None) -> Any:
         """Obtener datos de sesión"""
@@ -159,42 +119,30 @@ class StateManager:
             analysis_types = list(self.state.get('analysis_results', {}).keys())
             print(f"   Análisis guardados: {', '.join(analysis_types)}")
     
-    def reset_state(self):
-        """Resetear completamente el estado"""
-        if os.path.exists(self.state_file):
-            os.remove(self.state_file)
+    def reset_state(self) -> bool:
+        """Resetear completamente el estado; devuelve si había uno guardado"""
+        deleted = self.store.delete()
+        if deleted:
             print(f"🗑️  Estado eliminado: {self.state_file}")
         
-        self.state = self._load_state()
+        self.state = default_state(self.domain, self.host)
         print(f"🔄 Estado reseteado para {self.domain}")
+        return deleted
 
 # Función de utilidad para limpiar estados antiguos
 def cleanup_old_states(state_dir: Optional[str] = None, days: int = 30):
-    """Limpiar archivos de estado más antiguos que X días"""
-    if not state_dir:
-        state_dir = os.path.join(os.path.dirname(__file__), '..', 'state')
-    
-    if not os.path.exists(state_dir):
-        return
-    
-    from datetime import datetime, timedelta
-    cutoff_date = datetime.now() - timedelta(days=days)
-    
-    cleaned_count = 0
-    for filename in os.listdir(state_dir):
-        if filename.endswith('_state.json'):
-            filepath = os.path.join(state_dir, filename)
-            try:
-                # Verificar fecha de modificación del archivo
-                mod_time = datetime.fromtimestamp(os.path.getmtime(filepath))
-                if mod_time < cutoff_date:
-                    os.remove(filepath)
-                    cleaned_count += 1
-                    print(f"🗑️  Estado antiguo eliminado: {filename}")
-            except OSError:
-                continue
-    
-    if cleaned_count > 0:
-        print(f"✅ {cleaned_count} estados antiguos eliminados")
+    """Limpiar estados sin cambios hace más de X días (con SQLite, una consulta indexada por fecha)"""
+    db = open_state_index(state_dir)
+    try:
+        removed = db.cleanup(days)
+    finally:
+        db.close()
+    
+    for row in removed:
+        host = f" ({row['host']})" if row['host'] else ''
+        print(f"🗑️  Estado antiguo eliminado: {row['domain']}{host}")
+    
+    if removed:
+        print(f"✅ {len(removed)} estados antiguos eliminados")
     else:
-        print("ℹ️  No hay estados antiguos para limpiar")
\ No newline at end of file
+        print("ℹ️  No hay estados antiguos para limpiar")
@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+"""
+State Store - Backends de persistencia de StateManager
+
+StateManager mantiene el estado en memoria y describe cada cambio como un
+registro (`step`, `clear_step`, `clear_steps`, `analysis`, `session`); el
+backend solo persiste ese registro, así guardar cuesta O(cambio):
+
+- SQLiteStateBackend (default): una base `state/states.db` en modo WAL para
+  todos los dominios y hosts, con índices por host, dominio, paso y fecha;
+  listar, limpiar o buscar dominios trabados en un paso no abre archivos.
+- JournalStateBackend: snapshot JSON por dominio más un journal NDJSON
+  append-only, compactado al crecer (SSL_DIAG_STATE_BACKEND=journal).
+"""
+
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+DATABASE_NAME = "states.db"
+
+# Compactar el journal al superar cualquiera de estos límites
+COMPACT_RECORDS = 500
+COMPACT_BYTES = 1024 * 1024
+
+# fsync del journal cada FSYNC_BATCH registros o FSYNC_INTERVAL segundos (y siempre al compactar/cerrar)
+FSYNC_BATCH = 32
+FSYNC_INTERVAL = 1.0
+
+# Estados JSON de versiones anteriores ya importados a la base
+IMPORTED_SUFFIX = ".imported"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS states (
+    host TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    last_step TEXT,
+    steps_completed INTEGER NOT NULL DEFAULT 0,
+    seq INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (host, domain)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS states_updated ON states (updated_at);
+CREATE INDEX IF NOT EXISTS states_domain ON states (domain, updated_at);
+CREATE INDEX IF NOT EXISTS states_host ON states (host, updated_at);
+CREATE INDEX IF NOT EXISTS states_last_step ON states (last_step, updated_at);
+
+CREATE TABLE IF NOT EXISTS steps (
+    host TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    step TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    completed_at TEXT NOT NULL,
+    details TEXT,
+    PRIMARY KEY (host, domain, step)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS steps_step ON steps (step, completed_at);
+
+CREATE TABLE IF NOT EXISTS entries (
+    host TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (host, domain, kind, key)
+) WITHOUT ROWID;
+"""
+
+
+def default_state(domain: str, host: str = '') -> Dict[str, Any]:
+    return {
+        'domain': domain,
+        'host': host,
+        'created_at': datetime.now().isoformat(),
+        'last_updated': datetime.now().isoformat(),
+        'completed_steps': [],
+        'session_data': {},
+        'analysis_results': {},
+        'journal_seq': 0,
+        'version': '1.0'
+    }
+
+
+def apply_record(state: Dict[str, Any], record: Dict[str, Any]):
+    """Aplicar un registro de cambio al estado en memoria"""
+    op, at = record['op'], record['at']
+
+    if op == 'step':
+        if record['step'] not in state['completed_steps']:
+            state['completed_steps'].append(record['step'])
+        if record.get('details'):
+            state.setdefault('step_details', {})[record['step']] = {
+                'completed_at': at,
+                'details': record['details']
+            }
+    elif op == 'clear_step':
+        if record['step'] in state['completed_steps']:
+            state['completed_steps'].remove(record['step'])
+        state.get('step_details', {}).pop(record['step'], None)
+    elif op == 'clear_steps':
+        state['completed_steps'] = []
+        state['step_details'] = {}
+    elif op == 'analysis':
+        state['analysis_results'][record['type']] = {'timestamp': at, 'result': record['result']}
+    elif op == 'session':
+        state['session_data'][record['key']] = record['value']
+
+    state['journal_seq'] = record['seq']
+    state['last_updated'] = at
+
+
+def default_state_dir() -> str:
+    return os.path.join(os.path.dirname(__file__), '..', 'state')
+
+
+def selected_backend() -> str:
+    """Backend elegido con SSL_DIAG_STATE_BACKEND ('sqlite' por defecto o 'journal')"""
+    return os.environ.get('SSL_DIAG_STATE_BACKEND', 'sqlite')
+
+
+def open_state_index(state_dir: Optional[str] = None):
+    """Índice de estados del backend elegido: StateDatabase o JournalStateIndex"""
+    if selected_backend() == 'journal':
+        return JournalStateIndex(state_dir)
+    return StateDatabase(state_dir)
+
+
+def iter_journal_states(state_dir: str):
+    """(backend, estado) de cada `*_state.json` + journal del directorio"""
+    for filename in sorted(os.listdir(state_dir)):
+        if not filename.endswith('_state.json'):
+            continue
+        path = os.path.join(state_dir, filename)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                domain = json.load(f).get('domain')
+        except (json.JSONDecodeError, IOError):
+            continue
+        if not domain:
+            continue
+
+        backend = JournalStateBackend(state_dir, domain)
+        # Un archivo cuyo nombre no es el del dominio que declara no es de este backend
+        if backend.state_file != path:
+            continue
+        state = backend.load(default_state(domain))
+        backend.close()
+        yield backend, state
+
+
+def summarize_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Fila de listado (como las de la tabla `states`) de un estado completo"""
+    steps = state['completed_steps']
+    return {
+        'host': state.get('host', ''),
+        'domain': state['domain'],
+        'created_at': state['created_at'],
+        'updated_at': state['last_updated'],
+        'last_step': steps[-1] if steps else None,
+        'steps_completed': len(steps),
+    }
+
+
+class StateDatabase:
+    """Base SQLite (WAL) con el estado de todos los dominios y hosts"""
+
+    def __init__(self, state_dir: Optional[str] = None):
+        self.state_dir = state_dir or default_state_dir()
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.path = os.path.join(self.state_dir, DATABASE_NAME)
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # En WAL, NORMAL no pierde consistencia ante un crash y agrupa los fsync en los checkpoints
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._import_legacy_states()
+
+    def close(self):
+        self.conn.close()
+
+    def load(self, host: str, domain: str) -> Optional[Dict[str, Any]]:
+        """Estado completo de un dominio en un host, o None si no hay registro"""
+        row = self.conn.execute("SELECT * FROM states WHERE host = ? AND domain = ?", (host, domain)).fetchone()
+        if row is None:
+            return None
+
+        state = default_state(domain, host)
+        state.update({'created_at': row['created_at'], 'last_updated': row['updated_at'], 'journal_seq': row['seq']})
+        for step in self.conn.execute("SELECT step, completed_at, details FROM steps WHERE host = ? AND domain = ? "
+                                      "ORDER BY position", (host, domain)):
+            state['completed_steps'].append(step['step'])
+            if step['details']:
+                state.setdefault('step_details', {})[step['step']] = {
+                    'completed_at': step['completed_at'],
+                    'details': json.loads(step['details'])
+                }
+        for entry in self.conn.execute("SELECT kind, key, value FROM entries WHERE host = ? AND domain = ?",
+                                       (host, domain)):
+            value = json.loads(entry['value'])
+            if entry['kind'] == 'analysis':
+                state['analysis_results'][entry['key']] = value
+            else:
+                state['session_data'][entry['key']] = value
+        return state
+
+    def write(self, host: str, domain: str, record: Dict[str, Any], state: Dict[str, Any]):
+        """Persistir un registro (una transacción) y actualizar la fila del dominio"""
+        op, at = record['op'], record['at']
+        with self.conn:
+            self._upsert_state(host, domain, state)
+            if op == 'step':
+                details = record.get('details')
+                self.conn.execute(
+                    "INSERT INTO steps (host, domain, step, position, completed_at, details) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (host, domain, step) DO UPDATE SET completed_at = excluded.completed_at, "
+                    "details = excluded.details",
+                    (host, domain, record['step'], record['seq'], at,
+                     json.dumps(details, ensure_ascii=False) if details else None)
+                )
+            elif op == 'clear_step':
+                self.conn.execute("DELETE FROM steps WHERE host = ? AND domain = ? AND step = ?",
+                                  (host, domain, record['step']))
+            elif op == 'clear_steps':
+                self.conn.execute("DELETE FROM steps WHERE host = ? AND domain = ?", (host, domain))
+            elif op in ('analysis', 'session'):
+                key = record['type'] if op == 'analysis' else record['key']
+                value = state['analysis_results'][key] if op == 'analysis' else record['value']
+                self._upsert_entry(host, domain, op, key, value, at)
+
+    def import_state(self, host: str, domain: str, state: Dict[str, Any]):
+        """Cargar un estado completo (p. ej. de un JSON anterior) si el dominio no tiene registro"""
+        with self.conn:
+            if self.conn.execute("SELECT 1 FROM states WHERE host = ? AND domain = ?", (host, domain)).fetchone():
+                return
+            self._upsert_state(host, domain, state)
+            details = state.get('step_details', {})
+            steps = state['completed_steps']
+            # Posiciones negativas: quedan antes de los pasos que se agreguen después (posición = seq)
+            self.conn.executemany(
+                "INSERT INTO steps (host, domain, step, position, completed_at, details) VALUES (?, ?, ?, ?, ?, ?)",
+                [(host, domain, step, position, details.get(step, {}).get('completed_at', state['last_updated']),
+                  json.dumps(details[step]['details'], ensure_ascii=False) if step in details else None)
+                 for position, step in enumerate(steps, -len(steps))]
+            )
+            for key, value in state.get('analysis_results', {}).items():
+                self._upsert_entry(host, domain, 'analysis', key, value, state['last_updated'])
+            for key, value in state.get('session_data', {}).items():
+                self._upsert_entry(host, domain, 'session', key, value, state['last_updated'])
+
+    def claim(self, host: str, domain: str) -> bool:
+        """Pasar a `host` el estado de un dominio guardado sin host (importado de un JSON anterior)"""
+        if not host:
+            return False
+        with self.conn:
+            if self.conn.execute("SELECT 1 FROM states WHERE host = ? AND domain = ?", (host, domain)).fetchone():
+                return False
+            claimed = self.conn.execute("UPDATE states SET host = ? WHERE host = '' AND domain = ?",
+                                        (host, domain)).rowcount
+            for table in ('steps', 'entries'):
+                self.conn.execute(f"UPDATE {table} SET host = ? WHERE host = '' AND domain = ?", (host, domain))
+            return claimed > 0
+
+    def delete(self, host: str, domain: str) -> bool:
+        with self.conn:
+            deleted = self.conn.execute("DELETE FROM states WHERE host = ? AND domain = ?", (host, domain)).rowcount
+            self.conn.execute("DELETE FROM steps WHERE host = ? AND domain = ?", (host, domain))
+            self.conn.execute("DELETE FROM entries WHERE host = ? AND domain = ?", (host, domain))
+        return deleted > 0
+
+    def list_states(self, host: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Todos los estados (o los de un host), los más recientes primero"""
+        query = "SELECT host, domain, created_at, updated_at, last_step, steps_completed FROM states"
+        if host is not None:
+            rows = self.conn.execute(query + " WHERE host = ? ORDER BY updated_at DESC", (host,))
+        else:
+            rows = self.conn.execute(query + " ORDER BY updated_at DESC")
+        return [dict(row) for row in rows]
+
+    def stuck_at(self, step: str, idle_hours: float = 0, host: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Dominios cuyo último paso completado es `step` y no avanzan hace al menos `idle_hours`"""
+        cutoff = (datetime.now() - timedelta(hours=idle_hours)).isoformat()
+        query = ("SELECT host, domain, updated_at, steps_completed FROM states "
+                 "WHERE last_step = ? AND updated_at <= ?")
+        params: Tuple[Any, ...] = (step, cutoff)
+        if host is not None:
+            query += " AND host = ?"
+            params += (host,)
+        return [dict(row) for row in self.conn.execute(query + " ORDER BY updated_at", params)]
+
+    def domains_with_step(self, step: str) -> List[Dict[str, Any]]:
+        """Dominios que completaron `step`"""
+        return [dict(row) for row in self.conn.execute(
+            "SELECT host, domain, completed_at FROM steps WHERE step = ? ORDER BY completed_at", (step,))]
+
+    def cleanup(self, days: int) -> List[Dict[str, Any]]:
+        """Borrar los estados sin cambios hace más de `days` días; devuelve los borrados"""
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        with self.conn:
+            old = [dict(row) for row in self.conn.execute(
+                "SELECT host, domain, updated_at FROM states WHERE updated_at < ?", (cutoff,))]
+            self.conn.executemany("DELETE FROM steps WHERE host = ? AND domain = ?",
+                                  [(row['host'], row['domain']) for row in old])
+            self.conn.executemany("DELETE FROM entries WHERE host = ? AND domain = ?",
+                                  [(row['host'], row['domain']) for row in old])
+            self.conn.execute("DELETE FROM states WHERE updated_at < ?", (cutoff,))
+        return old
+
+    def _upsert_state(self, host: str, domain: str, state: Dict[str, Any]):
+        steps = state['completed_steps']
+        self.conn.execute(
+            "INSERT INTO states (host, domain, created_at, updated_at, last_step, steps_completed, seq) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (host, domain) DO UPDATE SET "
+            "updated_at = excluded.updated_at, last_step = excluded.last_step, "
+            "steps_completed = excluded.steps_completed, seq = excluded.seq",
+            (host, domain, state['created_at'], state['last_updated'], steps[-1] if steps else None,
+             len(steps), state['journal_seq'])
+        )
+
+    def _upsert_entry(self, host: str, domain: str, kind: str, key: str, value: Any, at: str):
+        self.conn.execute(
+            "INSERT INTO entries (host, domain, kind, key, value, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (host, domain, kind, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            (host, domain, kind, key, json.dumps(value, ensure_ascii=False, separators=(',', ':')), at)
+        )
+
+    def _import_legacy_states(self):
+        """
+        Importar los `*_state.json` + journal de versiones anteriores o del backend
+        journal, una sola vez (bajo su host, o sin host si no lo registraban)
+
+        Solo se abre la base con el backend SQLite elegido (ver open_state_index):
+        con SSL_DIAG_STATE_BACKEND=journal esos archivos son el estado vivo.
+        """
+        for legacy, state in list(iter_journal_states(self.state_dir)):
+            self.import_state(state.get('host', ''), legacy.domain, state)
+            os.replace(legacy.state_file, legacy.state_file + IMPORTED_SUFFIX)
+            if os.path.exists(legacy.journal_file):
+                os.remove(legacy.journal_file)
+            print(f"📦 Estado de {legacy.domain} importado a {DATABASE_NAME}")
+
+
+class SQLiteStateBackend:
+    """Estado de un dominio en un host dentro de la base compartida"""
+
+    def __init__(self, state_dir: str, domain: str, host: str = ''):
+        self.domain = domain
+        self.host = host
+        self.db = StateDatabase(state_dir)
+        self.location = f"{self.db.path} ({host or 'sin host'} / {domain})"
+
+    def load(self, default: Dict[str, Any]) -> Dict[str, Any]:
+        state = self.db.load(self.host, self.domain)
+        if state is None and self.db.claim(self.host, self.domain):
+            state = self.db.load(self.host, self.domain)
+        return state or default
+
+    def write(self, record: Dict[str, Any], state: Dict[str, Any]):
+        try:
+            self.db.write(self.host, self.domain, record, state)
+        except sqlite3.Error as e:
+            print(f"⚠️  Error guardando estado: {e}")
+
+    def flush(self):
+        """Cada cambio es una transacción: no hay nada pendiente"""
+
+    def delete(self) -> bool:
+        return self.db.delete(self.host, self.domain)
+
+    def close(self):
+        self.db.close()
+
+
+class JournalStateBackend:
+    """Snapshot JSON compacto + journal NDJSON append-only de un dominio"""
+
+    def __init__(self, state_dir: str, domain: str):
+        self.domain = domain
+        self.state_file = os.path.join(state_dir, f"{domain.replace('.', '_')}_state.json")
+        self.journal_file = self.state_file[:-len('.json')] + '.journal'
+        self.location = self.state_file
+        self.state: Optional[Dict[str, Any]] = None
+
+        self._journal = None
+        self._journal_records = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def load(self, default: Dict[str, Any]) -> Dict[str, Any]:
+        """Cargar estado desde el snapshot y aplicar el journal"""
+        state = default
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+
+                # Verificar que es para el dominio correcto
+                if state.get('domain') != self.domain:
+                    print(f"⚠️  Estado existente es para {state.get('domain')}, creando nuevo estado para {self.domain}")
+                    self._discard_journal()
+                    return default
+
+                # Actualizar campos que podrían faltar
+                for key, value in default.items():
+                    if key not in state:
+                        state[key] = value
+
+            except (json.JSONDecodeError, IOError) as e:
+                print(f"⚠️  Error cargando estado, creando nuevo: {e}")
+                state = default
+
+        self._replay_journal(state)
+        self.state = state
+        return state
+
+    def _replay_journal(self, state: Dict[str, Any]):
+        """Aplicar los registros del journal posteriores al snapshot; truncar una cola inválida"""
+        if not os.path.exists(self.journal_file):
+            return
+
+        valid_bytes = 0
+        try:
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError("línea incompleta")
+                        record = json.loads(line)
+                        if not isinstance(record, dict) or 'seq' not in record:
+                            raise ValueError("registro inválido")
+                    except ValueError:
+                        print(f"⚠️  Journal de estado cortado en el byte {valid_bytes}, se descarta el resto")
+                        break
+                    valid_bytes += len(line)
+                    self._journal_records += 1
+                    # Los registros ya incluidos en el snapshot (compactación interrumpida) se saltean
+                    if record['seq'] > state['journal_seq']:
+                        apply_record(state, record)
+
+            if valid_bytes != os.path.getsize(self.journal_file):
+                with open(self.journal_file, 'r+b') as f:
+                    f.truncate(valid_bytes)
+        except IOError as e:
+            print(f"⚠️  Error leyendo journal de estado: {e}")
+
+    def write(self, record: Dict[str, Any], state: Dict[str, Any]):
+        """Agregar una línea al journal (el registro ya está aplicado en `state`)"""
+        self.state = state
+
+        # Sin snapshot todavía: el primer cambio lo crea (así el dominio figura en list-states)
+        if not os.path.exists(self.state_file):
+            self.compact()
+            return
+
+        try:
+            if self._journal is None:
+                self._journal = open(self.journal_file, 'a', encoding='utf-8')
+            self._journal.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+            self._journal.flush()
+            self._journal_records += 1
+            self._unsynced += 1
+
+            if self._unsynced >= FSYNC_BATCH or time.monotonic() - self._last_sync >= FSYNC_INTERVAL:
+                self.flush()
+            if self._journal_records >= COMPACT_RECORDS or self._journal.tell() >= COMPACT_BYTES:
+                self.compact()
+        except IOError as e:
+            print(f"⚠️  Error guardando estado: {e}")
+
+    def flush(self):
+        """fsync de los registros pendientes del journal"""
+        if self._journal is not None and self._unsynced:
+            os.fsync(self._journal.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def compact(self):
+        """Escribir el estado completo en un snapshot nuevo (atómico) y vaciar el journal"""
+        try:
+            tmp_file = f"{self.state_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.state_file)
+
+            # Un crash acá deja registros ya compactados: al cargar se saltean por journal_seq
+            self._discard_journal()
+        except IOError as e:
+            print(f"⚠️  Error guardando estado: {e}")
+
+    def _discard_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self._journal_records = 0
+        self._unsynced = 0
+
+    def delete(self) -> bool:
+        self._discard_journal()
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
+            return True
+        return False
+
+    def close(self):
+        """fsync y cierre del journal"""
+        if self._journal is not None:
+            self.flush()
+            self._journal.close()
+            self._journal = None
+
+
+class JournalStateIndex:
+    """
+    Listado y limpieza de los estados del backend journal
+
+    Misma interfaz que StateDatabase para list-states y cleanup; sin base
+    ni índices, cada consulta carga todos los snapshots del directorio.
+    """
+
+    def __init__(self, state_dir: Optional[str] = None):
+        self.state_dir = state_dir or default_state_dir()
+        os.makedirs(self.state_dir, exist_ok=True)
+
+    def close(self):
+        """Cada consulta abre y cierra sus archivos"""
+
+    def _rows(self, host: Optional[str] = None) -> List[Dict[str, Any]]:
+        rows = [summarize_state(state) for _, state in iter_journal_states(self.state_dir)]
+        return [row for row in rows if host is None or row['host'] == host]
+
+    def list_states(self, host: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Todos los estados (o los de un host), los más recientes primero"""
+        return sorted(self._rows(host), key=lambda row: row['updated_at'], reverse=True)
+
+    def stuck_at(self, step: str, idle_hours: float = 0, host: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Dominios cuyo último paso completado es `step` y no avanzan hace al menos `idle_hours`"""
+        cutoff = (datetime.now() - timedelta(hours=idle_hours)).isoformat()
+        return sorted((row for row in self._rows(host) if row['last_step'] == step and row['updated_at'] <= cutoff),
+                      key=lambda row: row['updated_at'])
+
+    def cleanup(self, days: int) -> List[Dict[str, Any]]:
+        """Borrar los estados sin cambios hace más de `days` días; devuelve los borrados"""
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        removed = []
+        for backend, state in list(iter_journal_states(self.state_dir)):
+            if state['last_updated'] < cutoff:
+                backend.delete()
+                removed.append(summarize_state(state))
+        return removed
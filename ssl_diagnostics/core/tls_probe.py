@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+TLS Probe - Benchmark de handshakes TLS ejecutado en el servidor
+
+En lugar de un `openssl s_client` por dominio, se envía un script Python
+(solo stdlib) que hace los handshakes contra localhost con SNI, todos los
+vhosts en paralelo con un pool acotado, y devuelve las mediciones crudas en
+JSON. Los percentiles se calculan acá.
+"""
+
+import base64
+import json
+from typing import Any, Dict, List
+
+# Hostnames por comando: el script va embebido en un solo argumento de `sh -c` (máx. 128 KiB)
+PROBE_BATCH = 1000
+
+# Script remoto; los parámetros se reemplazan en build_probe_command
+PROBE_SCRIPT = r'''
+import json, socket, ssl, time
+from concurrent.futures import ThreadPoolExecutor
+
+HOST, PORT, ITERATIONS, CONCURRENCY, TIMEOUT = %(host)r, %(port)d, %(iterations)d, %(concurrency)d, %(timeout)r
+NAMES = json.loads(%(names)r)
+
+
+def context(alpn):
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    if alpn:
+        ctx.set_alpn_protocols(['h2', 'http/1.1'])
+    return ctx
+
+
+ALPN_CONTEXT = context(True)
+
+
+def handshake(ctx, name, session=None):
+    sock = socket.create_connection((HOST, PORT), timeout=TIMEOUT)
+    started = time.perf_counter()
+    try:
+        tls = ctx.wrap_socket(sock, server_hostname=name, session=session)
+    except BaseException:
+        sock.close()
+        raise
+    return tls, round((time.perf_counter() - started) * 1000, 3)
+
+
+def resumption(name):
+    # Contexto propio por hostname: los tickets de sesión quedan asociados al contexto
+    ctx = context(False)
+    tls, _ = handshake(ctx, name)
+    try:
+        # Con TLS 1.3 el ticket llega después del handshake: hay que leer algo
+        tls.sendall(('HEAD / HTTP/1.1\r\nHost: %%s\r\nConnection: close\r\n\r\n' %% name).encode())
+        tls.recv(1)
+    except (OSError, ssl.SSLError):
+        pass
+    session = tls.session
+    tls.close()
+    if session is None:
+        return False, None
+    tls, elapsed = handshake(ctx, name, session)
+    reused = tls.session_reused
+    tls.close()
+    return reused, elapsed
+
+
+def probe(name):
+    result = {'hostname': name, 'samples': [], 'protocol': '', 'cipher': '', 'alpn': '',
+              'resumed': False, 'resumed_ms': None, 'error': ''}
+    try:
+        for attempt in range(ITERATIONS):
+            tls, elapsed = handshake(ALPN_CONTEXT, name)
+            result['samples'].append(elapsed)
+            if attempt == 0:
+                result['protocol'] = tls.version() or ''
+                result['cipher'] = (tls.cipher() or ('',))[0]
+                result['alpn'] = tls.selected_alpn_protocol() or ''
+            tls.close()
+        result['resumed'], result['resumed_ms'] = resumption(name)
+    except (OSError, ssl.SSLError, ValueError) as e:
+        result['error'] = str(e) or type(e).__name__
+    return result
+
+
+with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+    print(json.dumps(list(pool.map(probe, NAMES))))
+'''
+
+
+def build_probe_command(hostnames: List[str], port: int = 443, iterations: int = 10,
+                        concurrency: int = 16, timeout: float = 5.0, host: str = 'localhost') -> str:
+    """Comando remoto que ejecuta el probe para `hostnames` (el script viaja en base64)"""
+    script = PROBE_SCRIPT % {
+        'host': host,
+        'port': port,
+        'iterations': max(1, iterations),
+        'concurrency': max(1, min(concurrency, len(hostnames) or 1)),
+        'timeout': float(timeout),
+        'names': json.dumps(hostnames),
+    }
+    encoded = base64.b64encode(script.encode('utf-8')).decode('ascii')
+    return (f"command -v python3 >/dev/null 2>&1 || {{ echo 'python3 no disponible en el servidor' >&2; exit 127; }}; "
+            f"echo {encoded} | base64 -d | python3 -")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil con interpolación lineal (values ya ordenados)"""
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * pct / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize_samples(samples: List[float]) -> Dict[str, Any]:
+    """min/p50/p90/p99/max/mean en milisegundos"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {'count': 0, 'min': 0.0, 'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0, 'mean': 0.0}
+    return {
+        'count': len(ordered),
+        'min': round(ordered[0], 3),
+        'p50': round(percentile(ordered, 50), 3),
+        'p90': round(percentile(ordered, 90), 3),
+        'p99': round(percentile(ordered, 99), 3),
+        'max': round(ordered[-1], 3),
+        'mean': round(sum(ordered) / len(ordered), 3),
+    }
@@ -8,14 +8,14 @@ from typing import Set, Optional
 from .state_manager import StateManager
 
 class UserInteraction:
-    def __init__(self, domain: Optional[str] = None):
+    def __init__(self, domain: Optional[str] = None, host: str = ''):
         self.domain = domain
         self.state_manager: Optional[StateManager] = None
         self.completed_steps: Set[str] = set()
         
         # Si se proporciona dominio, usar state manager
         if domain:
-            self.state_manager = StateManager(domain)
+            self.state_manager = StateManager(domain, host=host)
             self.completed_steps = self.state_manager.get_completed_steps()
     
     def confirm(self, message: str) -> bool:
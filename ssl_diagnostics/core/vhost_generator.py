@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Vhost Generator - Creación masiva de vhosts nginx desde una plantilla
+
+La plantilla se compila una sola vez (texto literal + campos `{nombre}`; las
+llaves de nginx quedan tal cual) y se renderiza localmente para cada dominio.
+Todos los archivos viajan en un único tar.gz y se validan juntos en el árbol
+sombra con un solo `nginx -t`. Si falla, el error (archivo:línea) se traduce
+al dominio y a la línea de la plantilla (si el error no trae ubicación, como
+`cannot load certificate "…"`, al archivo generado que nombra esa ruta), ese
+archivo se excluye y se vuelve a probar, de modo que un solo comando informa
+todos los que fallan. Nada se
+toca en vivo hasta que la sombra valida.
+"""
+
+import base64
+import io
+import os
+import re
+import shlex
+import tarfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from .ssh_manager import round_trip_budget
+from .nginx_manager import NginxManager
+from .nginx_changeset import RELOAD_COMMAND, SHADOW_PREFIX, TX_MARKER
+
+# Campos de la plantilla: `{domain}`; `{` seguido de espacio o salto de línea es de nginx
+FIELD_RE = re.compile(r'\{([a-z_][a-z0-9_]*)\}')
+# Nombres de dominio aceptados (también son el nombre del archivo .conf)
+DOMAIN_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9.-]*$')
+# Ubicación del error en la salida de nginx -t
+ERROR_LOCATION_RE = re.compile(r'^nginx: \[(\w+)\] (.*) in (\S+):(\d+)$')
+# Errores sin archivo:línea (certificados que no cargan, rutas que no existen)
+ERROR_RE = re.compile(r'^nginx: \[(\w+)\] (.*)$')
+# Base64 por comando: el payload va en un solo argumento de `sh -c` (máx. 128 KiB)
+UPLOAD_CHUNK = 96 * 1024
+
+DEFAULT_VHOST_TEMPLATE = r"""server {
+    listen 80;
+    listen 443 ssl http2;
+    server_name {domain} www.{domain};
+
+    index index.php index.html index.htm default.php default.htm default.html;
+    root /www/wwwroot/{domain};
+
+    # SSL Configuration
+    ssl_certificate /www/server/panel/vhost/cert/{domain}/fullchain.pem;
+    ssl_certificate_key /www/server/panel/vhost/cert/{domain}/privkey.pem;
+    ssl_protocols TLSv1.1 TLSv1.2 TLSv1.3;
+    ssl_ciphers EECDH+CHACHA20:EECDH+CHACHA20-draft:EECDH+AES128:RSA+AES128:EECDH+AES256:RSA+AES256:EECDH+3DES:RSA+3DES:!MD5;
+    ssl_prefer_server_ciphers on;
+    ssl_session_cache shared:SSL:10m;
+    ssl_session_timeout 10m;
+    add_header Strict-Transport-Security "max-age=31536000";
+
+    # Force HTTPS
+    if ($server_port !~ 443) {
+        rewrite ^(.*)$ https://$host$1 permanent;
+    }
+
+    # Error and Access logs
+    error_log  /www/wwwlogs/{domain}.error.log;
+    access_log  /www/wwwlogs/{domain}.access.log;
+
+    # PHP Configuration
+    location ~ \.php$ {
+        try_files $uri =404;
+        fastcgi_pass unix:/tmp/php-cgi-74.sock;
+        fastcgi_index index.php;
+        include fastcgi.conf;
+    }
+
+    # WordPress specific rules
+    location / {
+        try_files $uri $uri/ /index.php?$args;
+    }
+
+    # Security headers
+    add_header X-Frame-Options "SAMEORIGIN" always;
+    add_header X-XSS-Protection "1; mode=block" always;
+    add_header X-Content-Type-Options "nosniff" always;
+    add_header Referrer-Policy "no-referrer-when-downgrade" always;
+
+    # Deny access to sensitive files
+    location ~ /\. {
+        deny all;
+    }
+
+    location ~* \.(log|conf)$ {
+        deny all;
+    }
+}
+"""
+
+
+class VhostTemplate:
+    """Plantilla compilada: pares (literal, campo) que se unen sin volver a parsear"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lines = text.split('\n')
+        self.parts: List[Tuple[str, Optional[str]]] = []
+        position = 0
+        for match in FIELD_RE.finditer(text):
+            self.parts.append((text[position:match.start()], match.group(1)))
+            position = match.end()
+        self.parts.append((text[position:], None))
+        self.fields = sorted({field for _, field in self.parts if field})
+
+    @classmethod
+    def from_file(cls, path: str) -> 'VhostTemplate':
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(f.read())
+
+    def render(self, **values: str) -> str:
+        missing = [field for field in self.fields if field not in values]
+        if missing:
+            raise ValueError(f"Faltan valores para la plantilla: {', '.join(missing)}")
+        # Sin saltos de línea en los valores: la línea N del archivo es la línea N de la plantilla
+        if any('\n' in str(value) for value in values.values()):
+            raise ValueError("Los valores de la plantilla no pueden contener saltos de línea")
+        return ''.join(literal + (str(values[field]) if field else '') for literal, field in self.parts)
+
+    def template_line(self, line: int) -> str:
+        return self.lines[line - 1].strip() if 0 < line <= len(self.lines) else ''
+
+
+DEFAULT_TEMPLATE = VhostTemplate(DEFAULT_VHOST_TEMPLATE)
+
+
+def build_archive(files: Dict[str, str]) -> bytes:
+    """tar.gz en memoria con {nombre: contenido} (los vhosts comparten casi todo: comprime mucho)"""
+    buffer = io.BytesIO()
+    now = time.time()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, content in files.items():
+            data = content.encode('utf-8')
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o644
+            info.mtime = now
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class VhostGenerator:
+    def __init__(self, nginx_manager: NginxManager):
+        self.nginx = nginx_manager
+        self.ssh = nginx_manager.ssh
+        self.conf_dir = os.path.dirname(nginx_manager.nginx_conf)
+        self.prefix = os.path.dirname(self.conf_dir) + '/'
+
+    def render_all(self, domains: List[str], template: VhostTemplate = DEFAULT_TEMPLATE,
+                   values: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+        """Renderizar {dominio: configuración}; dominios inválidos o repetidos se rechazan"""
+        rendered = {}
+        for domain in domains:
+            if not DOMAIN_RE.match(domain):
+                raise ValueError(f"Dominio inválido: {domain!r}")
+            rendered.setdefault(domain, template.render(**{**(values or {}), 'domain': domain}))
+        return rendered
+
+    def _build_script(self, payload: str, skip_failed: bool, reload: bool) -> str:
+        """Extraer el tar, validar en el árbol sombra (excluyendo los que fallan) y aplicar"""
+        vhost_dir = self.nginx.vhost_dir
+        parent = os.path.dirname(vhost_dir)
+        live_vhosts = shlex.quote(vhost_dir)
+        finish = f"{RELOAD_COMMAND}; echo \"{TX_MARKER} reload $?\"" if reload else ':'
+        # Con fallas, --skip-failed aplica los que validaron; si no, no se aplica nada
+        apply_condition = ('[ -z "$aborted" ]' if skip_failed
+                           else '[ -z "$aborted" ] && [ -z "$failed" ]')
+
+        return '; '.join([
+            f"stage=$(mktemp -d {shlex.quote(f'{parent}/{SHADOW_PREFIX}-bulk.XXXXXX')}) || exit 1",
+            f"shadow_dir=$(mktemp -d {shlex.quote(f'{parent}/{SHADOW_PREFIX}.XXXXXX')}) || exit 1",
+            f"{payload} | base64 -d | tar -xzf - -C \"$stage\" || {{ rm -rf \"$stage\" \"$shadow_dir\"; exit 1; }}",
+            # Los que ya existen no se pisan
+            f"for f in \"$stage\"/*.conf; do n=${{f##*/}}; "
+            f"if [ -e {live_vhosts}/\"$n\" ]; then echo \"{TX_MARKER} exists $n\"; rm -f \"$f\"; fi; done",
+            f"cp -a {shlex.quote(self.conf_dir)} \"$shadow_dir/conf\" && "
+            f"{{ cp -al {live_vhosts} \"$shadow_dir/vhost\" 2>/dev/null || cp -a {live_vhosts} \"$shadow_dir/vhost\"; }}",
+            f"grep -rlF {shlex.quote(vhost_dir + '/')} \"$shadow_dir/conf\" | "
+            f"while read -r f; do sed -i \"s#{vhost_dir}/#$shadow_dir/vhost/#g\" \"$f\"; done",
+            "cp \"$stage\"/*.conf \"$shadow_dir/vhost/\" 2>/dev/null",
+            # Un nginx -t; cada falla en un archivo generado lo excluye y se vuelve a probar
+            "failed=''; aborted=''; runs=0",
+            f"while :; do runs=$((runs+1)); "
+            f"out=$(nginx -t -p {shlex.quote(self.prefix)} -c \"$shadow_dir/conf/{os.path.basename(self.nginx.nginx_conf)}\" 2>&1) && break; "
+            f"p=''; f=$(printf '%s\\n' \"$out\" | sed -n 's/^nginx: \\[[a-z]*\\] .* in \\(.*\\):[0-9]*$/\\1/p' | head -n 1); "
+            # Sin archivo:línea (p. ej. `cannot load certificate "…"`): el archivo generado que nombra esa ruta
+            f"if [ -z \"$f\" ]; then p=$(printf '%s\\n' \"$out\" | sed -n 's/^nginx: \\[[a-z]*\\] [^\"]*\"\\([^\"]*\\)\".*/\\1/p' | head -n 1); "
+            f"s=''; [ -n \"$p\" ] && s=$(grep -lF -- \"$p\" \"$stage\"/*.conf 2>/dev/null | head -n 1); "
+            f"[ -n \"$s\" ] && f=\"$shadow_dir/vhost/${{s##*/}}\"; fi; n=${{f##*/}}; "
+            f"case \"$f\" in \"$shadow_dir/vhost/\"*) ;; *) n='';; esac; "
+            f"if [ -z \"$n\" ] || [ ! -e \"$stage/$n\" ]; then aborted=1; echo \"{TX_MARKER} aborted\"; echo \"$out\"; break; fi; "
+            f"failed=1; echo \"{TX_MARKER} failed $n\"; printf '%s\\n' \"$out\" | grep -F -- \"${{p:-$f:}}\" | head -n 1; "
+            f"rm -f \"$f\" \"$stage/$n\"; done",
+            f"echo \"{TX_MARKER} runs $runs\"",
+            # Aplicar con rename (mismo filesystem), nginx -t en vivo y rollback si falla
+            f"if {apply_condition}; then applied=''; "
+            f"for f in \"$stage\"/*.conf; do [ -e \"$f\" ] || continue; n=${{f##*/}}; "
+            f"mv -f \"$f\" {live_vhosts}/\"$n\" && applied=\"$applied $n\" && echo \"{TX_MARKER} applied $n\"; done; "
+            f"out=$(nginx -t 2>&1); code=$?; echo \"{TX_MARKER} test $code\"; "
+            f"if [ $code -ne 0 ]; then echo \"$out\"; for n in $applied; do rm -f {live_vhosts}/\"$n\"; done; "
+            f"echo \"{TX_MARKER} rolledback\"; else {finish}; fi; fi",
+            "rm -rf \"$stage\" \"$shadow_dir\"",
+        ])
+
+    @round_trip_budget(1)
+    def generate(self, domains: List[str], template: VhostTemplate = DEFAULT_TEMPLATE,
+                 values: Optional[Dict[str, str]] = None, skip_failed: bool = False,
+                 reload: bool = False) -> Dict[str, Any]:
+        """
+        Crear vhosts para todos los dominios con una sola transferencia y validación
+
+        Un round trip (más uno por cada 96 KiB de tar.gz en base64 adicionales).
+        Los dominios que ya tienen configuración se omiten. Si algún archivo
+        generado no valida, no se aplica ninguno salvo con skip_failed=True,
+        en cuyo caso se aplican los que sí validaron.
+        """
+        rendered = self.render_all(domains, template, values)
+        archive = base64.b64encode(build_archive({f"{domain}.conf": content
+                                                  for domain, content in rendered.items()})).decode('ascii')
+        by_file = {f"{domain}.conf": domain for domain in rendered}
+
+        result: Dict[str, Any] = {
+            'requested': len(rendered),
+            'upload_bytes': len(archive),
+            'existing': [],
+            'failed': [],
+            'aborted': '',
+            'validations': 0,
+            'applied': [],
+            'test_passed': None,
+            'rolled_back': False,
+            'reloaded': False,
+            'success': False
+        }
+        if not rendered:
+            result['success'] = True
+            return result
+
+        # Payload grande: se sube por partes a un archivo temporal
+        chunks = [archive[i:i + UPLOAD_CHUNK] for i in range(0, len(archive), UPLOAD_CHUNK)]
+        if len(chunks) == 1:
+            payload = f"printf '%s' {chunks[0]}"
+            upload = None
+        else:
+            self.ssh.extend_budget(len(chunks))
+            stdout, _, _ = self.ssh.execute_command("mktemp", "Archivo temporal para vhosts", echo_output=False)
+            upload = stdout.strip()
+            for i, chunk in enumerate(chunks[:-1], 1):
+                self.ssh.execute_command(f"printf '%s' {chunk} >> {shlex.quote(upload)}",
+                                         f"Subiendo vhosts ({i}/{len(chunks)})", echo_output=False)
+            payload = f"{{ cat {shlex.quote(upload)}; printf '%s' {chunks[-1]}; rm -f {shlex.quote(upload)}; }}"
+
+        stdout, stderr, exit_code = self.ssh.execute_command(
+            self._build_script(payload, skip_failed, reload),
+            f"Creando {len(rendered)} vhosts (un nginx -t en árbol sombra)",
+            echo_output=False
+        )
+        self.nginx.cache.invalidate('nginx')
+
+        output: List[str] = []
+        failure: Optional[Dict[str, Any]] = None
+        for line in stdout.split('\n'):
+            if line.startswith(f"{TX_MARKER} "):
+                fields = line[len(TX_MARKER) + 1:].split()
+                failure = None
+                if fields[0] == 'exists':
+                    result['existing'].append(by_file.get(fields[1], fields[1]))
+                elif fields[0] == 'failed':
+                    failure = {'domain': by_file.get(fields[1], fields[1]), 'line': 0,
+                               'template_line': '', 'message': ''}
+                    result['failed'].append(failure)
+                elif fields[0] == 'aborted':
+                    result['aborted'] = 'nginx -t falla en una configuración existente'
+                elif fields[0] == 'runs':
+                    result['validations'] = int(fields[1])
+                elif fields[0] == 'applied':
+                    result['applied'].append(by_file.get(fields[1], fields[1]))
+                elif fields[0] == 'test':
+                    result['test_passed'] = fields[1] == '0'
+                elif fields[0] == 'rolledback':
+                    result['rolled_back'] = True
+                elif fields[0] == 'reload':
+                    result['reloaded'] = fields[1] == '0'
+                continue
+
+            match = ERROR_LOCATION_RE.match(line)
+            if failure is not None and match:
+                # Línea del archivo generado = línea de la plantilla
+                failure['message'] = match.group(2)
+                failure['line'] = int(match.group(4))
+                failure['template_line'] = template.template_line(failure['line'])
+                failure = None
+            elif failure is not None and ERROR_RE.match(line):
+                # Atribuido por la ruta que nombra el error: sin línea de plantilla
+                failure['message'] = ERROR_RE.match(line).group(2)
+                failure = None
+            elif line.strip():
+                output.append(line)
+
+        if result['aborted']:
+            result['aborted'] = '\n'.join(output).strip() or result['aborted']
+        elif result['test_passed'] is None and not result['failed']:
+            result['aborted'] = stderr.strip() or f"El comando terminó con código {exit_code}"
+
+        result['success'] = (bool(result['test_passed']) and not result['rolled_back']
+                             and (result['reloaded'] or not reload)
+                             and (skip_failed or not result['failed']))
+        return result
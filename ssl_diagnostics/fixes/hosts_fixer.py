@@ -3,20 +3,28 @@
 Hosts Fixer - Correcciones automáticas de archivo /etc/hosts
 """
 
-import re
-from typing import List, Dict, Tuple, Any
-from ..core.ssh_manager import SSHManager
+from typing import Dict, Any
+from ..core.ssh_manager import SSHManager, round_trip_budget
 from ..core.user_interaction import UserInteraction
+from ..core.hosts_file import HostsEditPlan, HostsFile, split_malformed
 from ..analyzers.hosts_analyzer import HostsAnalyzer
 
+HOSTS_BACKUP = "/etc/hosts.backup"
+
 class HostsFixer:
     def __init__(self, ssh_manager: SSHManager):
         self.ssh = ssh_manager
         self.ui = UserInteraction()
         self.analyzer = HostsAnalyzer(ssh_manager)
     
+    @round_trip_budget(2)
     def fix_all_issues(self) -> Dict[str, Any]:
-        """Corregir todos los problemas detectados en /etc/hosts"""
+        """
+        Corregir todos los problemas detectados en /etc/hosts
+        
+        Las correcciones se acumulan en un solo HostsEditPlan sobre el modelo
+        del análisis y se escriben con un único reemplazo atómico (con backup).
+        """
         step_id = "fix_hosts_file_issues"
         
         if not self.ui.should_continue(step_id, "Analizar y corregir problemas en /etc/hosts"):
@@ -42,26 +50,16 @@ class HostsFixer:
             'success': False,
             'issues_found': len(analysis['issues']),
             'fixes_applied': 0,
+            'lines_changed': 0,
             'backup_created': False,
             'fixes_details': []
         }
         
-        # Crear backup del archivo original
-        backup_result = self._create_hosts_backup()
-        results['backup_created'] = backup_result
-        
-        if not backup_result:
-            print("❌ Error creando backup. Abortando correcciones por seguridad.")
-            return results
-        
-        # Aplicar correcciones
-        current_content = analysis['content']
-        fixed_content = current_content
-        
+        # Armar todas las correcciones sobre el mismo modelo
+        plan = HostsEditPlan(analysis['hosts'])
         for issue in analysis['issues']:
-            fix_result = self._apply_issue_fix(issue, fixed_content)
+            fix_result = self._plan_issue_fix(issue, plan)
             if fix_result['success']:
-                fixed_content = fix_result['new_content']
                 results['fixes_applied'] += 1
                 results['fixes_details'].append(fix_result['description'])
                 print(f"✅ {fix_result['description']}")
@@ -70,180 +68,99 @@ class HostsFixer:
         
         # Escribir archivo corregido si hubo cambios
         if results['fixes_applied'] > 0:
-            write_success = self._write_hosts_file(fixed_content)
-            if write_success:
+            results['lines_changed'] = len(plan)
+            if self._write_hosts_file(plan.render()):
+                results['backup_created'] = True
                 print(f"\n✅ Archivo /etc/hosts corregido exitosamente")
-                print(f"   - {results['fixes_applied']} problemas corregidos")
-                print(f"   - Backup guardado en /etc/hosts.backup")
+                print(f"   - {results['fixes_applied']} problemas corregidos ({len(plan)} líneas)")
+                print(f"   - Backup guardado en {HOSTS_BACKUP}")
                 results['success'] = True
                 self.ui.mark_step_completed(step_id)
             else:
-                print(f"\n❌ Error escribiendo archivo corregido")
-                self._restore_from_backup()
+                print(f"\n❌ Error escribiendo archivo corregido (el original no se modificó)")
         else:
             print(f"\n⚠️  No se pudieron aplicar correcciones")
         
         return results
     
-    def _create_hosts_backup(self) -> bool:
-        """Crear backup del archivo /etc/hosts"""
-        try:
-            stdout, stderr, exit_code = self.ssh.execute_command("cp /etc/hosts /etc/hosts.backup")
-            return exit_code == 0
-        except Exception as e:
-            print(f"Error creando backup: {e}")
-            return False
-    
-    def _restore_from_backup(self) -> bool:
-        """Restaurar archivo desde backup"""
-        try:
-            stdout, stderr, exit_code = self.ssh.execute_command("cp /etc/hosts.backup /etc/hosts")
-            success = exit_code == 0
-            if success:
-                print("📋 Archivo restaurado desde backup")
-            return success
-        except Exception as e:
-            print(f"Error restaurando backup: {e}")
-            return False
-    
-    def _apply_issue_fix(self, issue: Dict[str, Any], content: str) -> Dict[str, Any]:
-        """Aplicar corrección para un problema específico"""
+    def _plan_issue_fix(self, issue: Dict[str, Any], plan: HostsEditPlan) -> Dict[str, Any]:
+        """Agregar al plan la corrección de un problema específico"""
         issue_type = issue['type']
         
         if issue_type == 'malformed_line':
-            return self._fix_malformed_line(issue, content)
+            return self._fix_malformed_line(issue, plan)
         elif issue_type == 'problematic_domain':
-            return self._fix_problematic_domain(issue, content)
+            return self._fix_problematic_domain(issue, plan)
         elif issue_type == 'duplicate_entry':
-            return self._fix_duplicate_entry(issue, content)
+            return self._fix_duplicate_entry(issue, plan)
         else:
             return {
                 'success': False,
-                'description': f"Tipo de problema no reconocido: {issue_type}",
-                'new_content': content
+                'description': f"Tipo de problema no reconocido: {issue_type}"
             }
     
-    def _fix_malformed_line(self, issue: Dict[str, Any], content: str) -> Dict[str, Any]:
-        """Corregir línea malformada"""
-        malformed_line = issue['line']
-        line_number = issue.get('line_number', 0)
-        
-        # Detectar el patrón problemático: IP sin espacio + dominio + IP + dominio
-        pattern = r'(\d+\.\d+\.\d+\.\d+)([a-zA-Z0-9.-]+)(\d+\.\d+\.\d+\.\d+)\s+([a-zA-Z0-9.-]+)'
-        match = re.search(pattern, malformed_line)
-        
-        if match:
-            ip1, domain1, ip2, domain2 = match.groups()
-            
-            # Crear líneas separadas y correctamente formateadas
-            fixed_line1 = f"{ip1} {domain1}"
-            fixed_line2 = f"{ip2} {domain2}"
-            
-            # Reemplazar la línea malformada
-            lines = content.split('\n')
-            for i, line in enumerate(lines):
-                if line.strip() == malformed_line.strip():
-                    lines[i] = f"{fixed_line1}\n{fixed_line2}"
-                    break
-            
-            new_content = '\n'.join(lines)
-            
+    def _fix_malformed_line(self, issue: Dict[str, Any], plan: HostsEditPlan) -> Dict[str, Any]:
+        """Separar las entradas pegadas de una línea malformada"""
+        line_number = issue['line_number']
+        fixed_lines = split_malformed(issue['line'])
+        
+        if fixed_lines:
+            plan.replace(line_number, fixed_lines)
+            names = ' y '.join(line.split(None, 1)[1] for line in fixed_lines)
             return {
                 'success': True,
-                'description': f"Línea malformada corregida: {domain1} y {domain2} separados",
-                'new_content': new_content
+                'description': f"Línea malformada corregida: {names} separados"
             }
         
         return {
             'success': False,
-            'description': f"No se pudo corregir línea malformada en línea {line_number}",
-            'new_content': content
+            'description': f"No se pudo corregir línea malformada en línea {line_number}"
         }
     
-    def _fix_problematic_domain(self, issue: Dict[str, Any], content: str) -> Dict[str, Any]:
-        """Corregir dominio problemático"""
+    def _fix_problematic_domain(self, issue: Dict[str, Any], plan: HostsEditPlan) -> Dict[str, Any]:
+        """Quitar el dominio problemático de las entradas que lo apuntan a localhost"""
         domain = issue['domain']
-        current_ip = issue.get('current_ip', '')
         
-        # Si el dominio está apuntando a localhost, comentar la línea
-        if current_ip in ['127.0.0.1', '::1']:
-            pattern = rf'^(\s*)(\d+\.\d+\.\d+\.\d+|\:\:1)\s+.*{re.escape(domain)}.*$'
-            
-            def comment_line(match):
-                indent = match.group(1)
-                line = match.group(0)
-                return f"{indent}# {line.strip()} # Comentado automáticamente"
-            
-            new_content = re.sub(pattern, comment_line, content, flags=re.MULTILINE)
-            
-            if new_content != content:
-                return {
-                    'success': True,
-                    'description': f"Entrada problemática para {domain} comentada",
-                    'new_content': new_content
-                }
+        for line_number in issue['line_numbers']:
+            plan.drop_name(line_number, domain, "Comentado automáticamente")
+        
+        if issue['line_numbers']:
+            return {
+                'success': True,
+                'description': f"Entrada problemática para {domain} quitada"
+            }
         
         return {
             'success': False,
-            'description': f"No se pudo corregir dominio problemático: {domain}",
-            'new_content': content
+            'description': f"No se pudo corregir dominio problemático: {domain}"
         }
     
-    def _fix_duplicate_entry(self, issue: Dict[str, Any], content: str) -> Dict[str, Any]:
-        """Corregir entrada duplicada"""
+    def _fix_duplicate_entry(self, issue: Dict[str, Any], plan: HostsEditPlan) -> Dict[str, Any]:
+        """Conservar la primera entrada del dominio y quitarlo de las demás"""
         domain = issue['domain']
-        ips = issue.get('ips', [])
+        line_numbers = issue.get('line_numbers', [])
         
-        if len(ips) < 2:
+        if len(line_numbers) < 2:
             return {
                 'success': False,
-                'description': f"No hay suficientes IPs duplicadas para {domain}",
-                'new_content': content
+                'description': f"No hay suficientes entradas duplicadas para {domain}"
             }
         
-        # Comentar todas las entradas del dominio excepto la primera
-        lines = content.split('\n')
-        domain_entries_found = 0
-        
-        for i, line in enumerate(lines):
-            if domain in line and not line.strip().startswith('#'):
-                # Si es la primera entrada, la dejamos
-                if domain_entries_found == 0:
-                    domain_entries_found += 1
-                    continue
-                
-                # Comentar entradas adicionales
-                lines[i] = f"# {line.strip()} # Duplicado comentado automáticamente"
-                domain_entries_found += 1
-        
-        if domain_entries_found > 1:
-            new_content = '\n'.join(lines)
-            return {
-                'success': True,
-                'description': f"Eliminadas {domain_entries_found - 1} entradas duplicadas para {domain}",
-                'new_content': new_content
-            }
+        for line_number in line_numbers[1:]:
+            plan.drop_name(line_number, domain, "Duplicado comentado automáticamente")
         
         return {
-            'success': False,
-            'description': f"No se encontraron duplicados para eliminar: {domain}",
-            'new_content': content
+            'success': True,
+            'description': f"Eliminadas {len(line_numbers) - 1} entradas duplicadas para {domain}"
         }
     
     def _write_hosts_file(self, content: str) -> bool:
-        """Escribir contenido corregido al archivo /etc/hosts"""
-        try:
-            # Usar el método write_file del SSHManager
-            success = self.ssh.write_file("/etc/hosts", content)
-            
-            if not success:
-                print(f"Error escribiendo archivo")
-            
-            return success
-        except Exception as e:
-            print(f"Error escribiendo archivo /etc/hosts: {e}")
-            return False
+        """Reemplazar /etc/hosts en un solo comando atómico, con backup del original"""
+        written = self.ssh.replace_file(self.analyzer.hosts_file, content, backup_path=HOSTS_BACKUP)
+        self.analyzer.cache.invalidate('hosts')
+        return written
     
+    @round_trip_budget(2)
     def clean_specific_domain(self, domain: str) -> Dict[str, Any]:
         """Limpiar entradas específicas de un dominio del archivo hosts"""
         step_id = f"clean_hosts_domain_{domain.replace('.', '_')}"
@@ -254,57 +171,39 @@ class HostsFixer:
         print(f"\n🔍 Buscando entradas de {domain} en /etc/hosts...")
         
         try:
-            success, content = self.ssh.read_file("/etc/hosts")
+            success, content = self.ssh.read_file(self.analyzer.hosts_file)
             if not success:
                 return {'success': False, 'error': 'No se pudo leer /etc/hosts'}
             
-            lines = content.split('\n')
-            domain_lines = []
-            
-            for i, line in enumerate(lines, 1):
-                if domain in line and not line.strip().startswith('#'):
-                    domain_lines.append({'line_number': i, 'content': line.strip()})
+            hosts = HostsFile(content)
+            entries = hosts.entries_for(domain)
             
-            if not domain_lines:
+            if not entries:
                 print(f"✅ No se encontraron entradas activas para {domain}")
                 self.ui.mark_step_completed(step_id)
                 return {'success': True, 'entries_found': 0, 'entries_cleaned': 0}
             
-            print(f"\n📋 Encontradas {len(domain_lines)} entradas para {domain}:")
-            for entry in domain_lines:
-                print(f"  Línea {entry['line_number']}: {entry['content']}")
+            print(f"\n📋 Encontradas {len(entries)} entradas para {domain}:")
+            for entry in entries:
+                print(f"  Línea {entry.line_number}: {hosts.lines[entry.line_number - 1].strip()}")
             
-            if not self.ui.confirm(f"\n¿Comentar estas {len(domain_lines)} entradas?"):
+            if not self.ui.confirm(f"\n¿Quitar {domain} de estas {len(entries)} entradas?"):
                 return {'cancelled': True, 'reason': 'Usuario canceló'}
             
-            # Crear backup
-            if not self._create_hosts_backup():
-                return {'success': False, 'error': 'No se pudo crear backup'}
-            
-            # Comentar las líneas
-            new_lines = []
-            entries_cleaned = 0
-            
-            for line in lines:
-                if domain in line and not line.strip().startswith('#'):
-                    new_lines.append(f"# {line.strip()} # Limpiado automáticamente")
-                    entries_cleaned += 1
-                else:
-                    new_lines.append(line)
-            
-            new_content = '\n'.join(new_lines)
+            plan = HostsEditPlan(hosts)
+            for entry in entries:
+                plan.drop_name(entry.line_number, domain, "Limpiado automáticamente")
             
-            if self._write_hosts_file(new_content):
-                print(f"✅ {entries_cleaned} entradas de {domain} comentadas exitosamente")
+            if self._write_hosts_file(plan.render()):
+                print(f"✅ {len(entries)} entradas de {domain} limpiadas exitosamente")
                 self.ui.mark_step_completed(step_id)
                 return {
                     'success': True,
-                    'entries_found': len(domain_lines),
-                    'entries_cleaned': entries_cleaned
+                    'entries_found': len(entries),
+                    'entries_cleaned': len(plan)
                 }
             else:
-                self._restore_from_backup()
                 return {'success': False, 'error': 'Error escribiendo archivo corregido'}
                 
         except Exception as e:
-            return {'success': False, 'error': f'Error procesando /etc/hosts: {e}'}
\ No newline at end of file
+            return {'success': False, 'error': f'Error procesando /etc/hosts: {e}'}
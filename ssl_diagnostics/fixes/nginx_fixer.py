@@ -5,8 +5,11 @@ Nginx Fixer - Correcciones automáticas de configuraciones nginx
 
 import os
 from typing import List, Dict, Any
-from ..core.ssh_manager import SSHManager
+from ..core.ssh_manager import SSHManager, round_trip_budget
 from ..core.nginx_manager import NginxManager
+from ..core.nginx_changeset import NginxChangeSet
+from ..core.vhost_generator import DEFAULT_TEMPLATE
+from ..core.ssl_manager import SSLManager
 from ..core.user_interaction import UserInteraction
 from ..analyzers.nginx_analyzer import NginxAnalyzer
 
@@ -14,11 +17,51 @@ class NginxFixer:
     def __init__(self, ssh_manager: SSHManager):
         self.ssh = ssh_manager
         self.nginx = NginxManager(ssh_manager)
+        self.ssl = SSLManager(ssh_manager)
         self.ui = UserInteraction()
         self.analyzer = NginxAnalyzer(ssh_manager)
+        # Cambios pendientes: se aplican todos juntos con un solo nginx -t (commit_changes)
+        self.changes = NginxChangeSet(self.nginx)
+        self.pending_steps: List[str] = []
     
-    def fix_domain_issues(self, target_domain: str) -> Dict[str, Any]:
-        """Corregir todos los problemas nginx para un dominio específico"""
+    @round_trip_budget(1)
+    def commit_changes(self, reload: bool = False) -> Dict[str, Any]:
+        """
+        Aplicar los cambios preparados en un round trip
+        
+        Validación previa en el árbol sombra, un nginx -t en vivo con rollback
+        completo si falla y, con reload=True, un reload graceful. Los pasos de los cambios preparados se marcan
+        como completados solo si la configuración resultante es válida.
+        """
+        pending = len(self.changes)
+        result = self.changes.commit(reload=reload)
+        
+        for skipped in result['skipped']:
+            print(f"⚠️  {os.path.basename(skipped['path'])} omitido ({skipped['reason']})")
+        
+        if result['shadow_passed'] is False:
+            print(f"❌ nginx -t falló en el árbol sombra: {pending} cambios descartados sin tocar el servidor")
+            print(f"   {result['test_output']}")
+        elif result['rolled_back']:
+            print(f"❌ nginx -t falló: {pending} cambios revertidos")
+            print(f"   {result['test_output']}")
+        elif pending and result['test_passed']:
+            print(f"✅ {len(result['applied'])} cambios nginx aplicados (nginx -t OK)")
+        
+        if result['success']:
+            for step_id in self.pending_steps:
+                self.ui.mark_step_completed(step_id)
+        self.pending_steps = []
+        return result
+    
+    @round_trip_budget(5)
+    def fix_domain_issues(self, target_domain: str, commit: bool = True) -> Dict[str, Any]:
+        """
+        Corregir todos los problemas nginx para un dominio específico
+        
+        Las correcciones se preparan en el change set; con commit=False quedan
+        pendientes para aplicarlas junto con otras (commit_changes).
+        """
         step_id = f"fix_nginx_domain_{target_domain.replace('.', '_')}"
         
         if not self.ui.should_continue(step_id, f"Corregir problemas nginx para {target_domain}"):
@@ -58,7 +101,7 @@ class NginxFixer:
             'fixes_details': []
         }
         
-        # Aplicar correcciones una por una
+        # Preparar las correcciones (sin tocar el servidor)
         for fix in fixes:
             fix_result = self._apply_fix(fix, target_domain)
             if fix_result['success']:
@@ -68,17 +111,92 @@ class NginxFixer:
             else:
                 print(f"❌ {fix_result['description']}")
         
-        # Verificar nginx después de las correcciones
         if results['fixes_applied'] > 0:
-            if self._test_nginx_config():
+            self.pending_steps.append(step_id)
+            if not commit:
+                results['success'] = True
+                return results
+            
+            # Aplicar y verificar nginx en un solo paso (rollback si nginx -t falla)
+            commit_result = self.commit_changes()
+            results['commit'] = commit_result
+            if commit_result['success']:
                 print(f"\n✅ Configuraciones nginx corregidas exitosamente")
                 results['success'] = True
-                self.ui.mark_step_completed(step_id)
             else:
                 print(f"\n❌ Errores en configuración nginx después de las correcciones")
         
         return results
     
+    @round_trip_budget(2)
+    def fix_domains(self, analyses: Dict[str, Dict[str, Any]], commit: bool = True) -> Dict[str, Any]:
+        """
+        Corregir en un solo change set los problemas nginx de varios dominios
+        
+        `analyses` sale de NginxAnalyzer.analyze_domains (un snapshot). Las
+        correcciones se agrupan: una confirmación para todas, cada archivo se
+        toca una sola vez y nunca se deshabilita la configuración activa de
+        otro de los dominios diagnosticados (se informa para resolverla a
+        mano). Con commit=False quedan pendientes (commit_changes).
+        """
+        results: Dict[str, Any] = {
+            'success': True,
+            'domains_with_issues': 0,
+            'fixes_applied': 0,
+            'fixes_details': [],
+            'protected': []
+        }
+        owners = {analysis['active_config_file']: domain
+                  for domain, analysis in analyses.items() if analysis['active_config_file']}
+        
+        planned: Dict[str, Dict[str, Any]] = {}
+        for domain, analysis in analyses.items():
+            if not analysis['issues']:
+                continue
+            results['domains_with_issues'] += 1
+            for fix in self.analyzer.suggest_fixes(analysis):
+                owner = owners.get(fix.get('config_file', ''))
+                if owner and owner != domain:
+                    results['protected'].append({'domain': domain, 'config_file': fix['config_file'], 'owner': owner})
+                    continue
+                planned.setdefault(fix['step_id'], {**fix, 'domains': []})['domains'].append(domain)
+        
+        for item in results['protected']:
+            print(f"⚠️  {os.path.basename(item['config_file'])} afecta a {item['domain']} pero es la configuración "
+                  f"de {item['owner']}: no se deshabilita, revisar a mano")
+        
+        if not planned:
+            print(f"✅ Sin correcciones nginx automáticas para {len(analyses)} dominios")
+            return results
+        
+        print(f"\n🔧 Correcciones sugeridas ({results['domains_with_issues']} dominio(s) con problemas):")
+        for i, fix in enumerate(planned.values(), 1):
+            risk_indicator = "🔴" if fix['risk_level'] == 'ALTO' else "🟡" if fix['risk_level'] == 'MEDIO' else "🟢"
+            domains = ', '.join(fix['domains'][:3]) + (f" y {len(fix['domains']) - 3} más" if len(fix['domains']) > 3 else '')
+            print(f"  {i}. {risk_indicator} {fix['fix']} ({domains})")
+        
+        if not self.ui.confirm(f"\n¿Aplicar estas {len(planned)} correcciones en un solo cambio?"):
+            return {**results, 'success': False, 'cancelled': True, 'reason': 'Usuario canceló las correcciones'}
+        
+        # Cada configuración nueva se valida al prepararla (un nginx -t en el árbol sombra)
+        self.ssh.extend_budget(sum(1 for step_id in planned if step_id.startswith('create_config_')))
+        
+        for fix in planned.values():
+            fix_result = self._apply_fix(fix, fix['domains'][0])
+            if fix_result['success']:
+                results['fixes_applied'] += 1
+                results['fixes_details'].append(fix_result['description'])
+                print(f"✅ {fix_result['description']}")
+            else:
+                print(f"❌ {fix_result['description']}")
+        
+        if results['fixes_applied'] and commit:
+            commit_result = self.commit_changes()
+            results['commit'] = commit_result
+            results['success'] = commit_result['success']
+        
+        return results
+    
     def _apply_fix(self, fix: Dict[str, str], target_domain: str) -> Dict[str, Any]:
         """Aplicar una corrección específica"""
         step_id = fix['step_id']
@@ -98,46 +216,27 @@ class NginxFixer:
             }
     
     def _disable_config_file(self, fix: Dict[str, str], step_id: str) -> Dict[str, Any]:
-        """Deshabilitar archivo de configuración agregando .disabled"""
-        # Extraer nombre del archivo del step_id
-        config_name = step_id.replace('disable_', '').replace('_', '.')
-        
-        if not config_name.endswith('.conf'):
-            config_name += '.conf'
-        
-        config_path = f"/www/server/panel/vhost/nginx/{config_name}"
-        disabled_path = f"{config_path}.disabled"
-        
-        try:
-            # Verificar que el archivo existe
-            stdout, stderr, exit_code = self.ssh.execute_command(f"test -f {config_path}")
-            exists = exit_code == 0
-            if not exists:
-                return {
-                    'success': False,
-                    'description': f"Archivo {config_name} no encontrado"
-                }
-            
-            # Renombrar para deshabilitar
-            stdout, stderr, exit_code = self.ssh.execute_command(f"mv {config_path} {disabled_path}")
-            success = exit_code == 0
-            
-            if success:
-                return {
-                    'success': True,
-                    'description': f"Configuración {config_name} deshabilitada"
-                }
-            else:
-                return {
-                    'success': False,
-                    'description': f"Error deshabilitando {config_name}: {stderr}"
-                }
+        """Preparar la deshabilitación de un archivo de configuración (.disabled)"""
+        config_path = fix.get('config_file')
+        if not config_path:
+            # Extraer nombre del archivo del step_id
+            config_name = step_id.replace('disable_', '').replace('_', '.')
+            if not config_name.endswith('.conf'):
+                config_name += '.conf'
+            config_path = f"{self.nginx.vhost_dir}/{config_name}"
+        config_name = os.path.basename(config_path)
         
-        except Exception as e:
+        if not self.changes.disable(config_path):
+            # Interceptor y conflicto de prioridad suelen ser el mismo archivo
             return {
-                'success': False,
-                'description': f"Error deshabilitando configuración: {e}"
+                'success': any(op['path'] == config_path and op['action'] == 'disable'
+                               for op in self.changes.operations),
+                'description': f"{config_name} ya tiene un cambio preparado"
             }
+        return {
+            'success': True,
+            'description': f"Configuración {config_name} se deshabilitará"
+        }
     
     def _fix_priority_conflict(self, fix: Dict[str, str], step_id: str) -> Dict[str, Any]:
         """Corregir conflicto de prioridad alfabética"""
@@ -147,98 +246,32 @@ class NginxFixer:
         return self._disable_config_file(fix, f"disable_{config_name.replace('.', '_')}")
     
     def _create_domain_config(self, fix: Dict[str, str], target_domain: str) -> Dict[str, Any]:
-        """Crear configuración nginx optimizada para el dominio"""
+        """Preparar la configuración nginx optimizada para el dominio (no pisa una existente)"""
         config_content = self._generate_domain_config(target_domain)
-        config_path = f"/www/server/panel/vhost/nginx/{target_domain}.conf"
-        
-        try:
-            # Verificar si ya existe
-            stdout, stderr, exit_code = self.ssh.execute_command(f"test -f {config_path}")
-            exists = exit_code == 0
-            if exists:
-                return {
-                    'success': False,
-                    'description': f"Ya existe configuración para {target_domain}"
-                }
-            
-            # Escribir configuración
-            success = self.ssh.write_file(config_path, config_content)
-            
-            if success:
-                return {
-                    'success': True,
-                    'description': f"Configuración nginx creada para {target_domain}"
-                }
-            else:
-                return {
-                    'success': False,
-                    'description': f"Error escribiendo configuración para {target_domain}"
-                }
+        config_path = f"{self.nginx.vhost_dir}/{target_domain}.conf"
+        
+        if not self.changes.write(config_path, config_content, create_only=True):
+            return {
+                'success': False,
+                'description': f"Ya hay un cambio preparado para {config_path}"
+            }
         
-        except Exception as e:
+        # La configuración generada se valida apenas se prepara (árbol sombra, sin tocar el servidor)
+        validation = self.changes.validate()
+        if not validation['valid']:
+            self.changes.discard(config_path)
             return {
                 'success': False,
-                'description': f"Error creando configuración: {e}"
+                'description': f"La configuración generada para {target_domain} no pasa nginx -t: {validation['output']}"
             }
+        return {
+            'success': True,
+            'description': f"Configuración nginx para {target_domain} se creará"
+        }
     
     def _generate_domain_config(self, domain: str) -> str:
-        """Generar contenido de configuración nginx optimizada"""
-        return f"""server {{
-    listen 80;
-    listen 443 ssl http2;
-    server_name {domain} www.{domain};
-    
-    index index.php index.html index.htm default.php default.htm default.html;
-    root /www/wwwroot/{domain};
-    
-    # SSL Configuration
-    ssl_certificate /www/server/panel/vhost/cert/{domain}/fullchain.pem;
-    ssl_certificate_key /www/server/panel/vhost/cert/{domain}/privkey.pem;
-    ssl_protocols TLSv1.1 TLSv1.2 TLSv1.3;
-    ssl_ciphers EECDH+CHACHA20:EECDH+CHACHA20-draft:EECDH+AES128:RSA+AES128:EECDH+AES256:RSA+AES256:EECDH+3DES:RSA+3DES:!MD5;
-    ssl_prefer_server_ciphers on;
-    ssl_session_cache shared:SSL:10m;
-    ssl_session_timeout 10m;
-    add_header Strict-Transport-Security "max-age=31536000";
-    
-    # Force HTTPS
-    if ($server_port !~ 443) {{
-        rewrite ^(.*)$ https://$host$1 permanent;
-    }}
-    
-    # Error and Access logs
-    error_log  /www/wwwlogs/{domain}.error.log;
-    access_log  /www/wwwlogs/{domain}.access.log;
-    
-    # PHP Configuration
-    location ~ \\.php$ {{
-        try_files $uri =404;
-        fastcgi_pass unix:/tmp/php-cgi-74.sock;
-        fastcgi_index index.php;
-        include fastcgi.conf;
-    }}
-    
-    # WordPress specific rules
-    location / {{
-        try_files $uri $uri/ /index.php?$args;
-    }}
-    
-    # Security headers
-    add_header X-Frame-Options "SAMEORIGIN" always;
-    add_header X-XSS-Protection "1; mode=block" always;
-    add_header X-Content-Type-Options "nosniff" always;
-    add_header Referrer-Policy "no-referrer-when-downgrade" always;
-    
-    # Deny access to sensitive files
-    location ~ /\\. {{
-        deny all;
-    }}
-    
-    location ~* \\.(log|conf)$ {{
-        deny all;
-    }}
-}}
-"""
+        """Generar contenido de configuración nginx optimizada (plantilla compilada)"""
+        return DEFAULT_TEMPLATE.render(domain=domain)
     
     def _fix_nginx_syntax(self) -> Dict[str, Any]:
         """Intentar corregir errores de sintaxis nginx"""
@@ -256,13 +289,29 @@ class NginxFixer:
             'description': f"Errores de sintaxis nginx requieren corrección manual: {test_output}"
         }
     
-    def _test_nginx_config(self) -> bool:
-        """Verificar que la configuración nginx sea válida"""
-        test_passed, _ = self.nginx.test_config()
-        return test_passed
+    @round_trip_budget(2)
+    def check_certificate_keys(self) -> Dict[str, Any]:
+        """Verificar que cada clave privada corresponda a su certificado antes de recargar nginx"""
+        print("\n🔑 Verificando pares certificado/clave privada...")
+        result = self.ssl.verify_key_pairs()
+        
+        for mismatch in result['mismatches']:
+            print(f"   ❌ {mismatch['domain']}: privkey.pem no corresponde a fullchain.pem")
+        for domain in result['unreadable_keys']:
+            print(f"   ⚠️  {domain}: privkey.pem no se pudo leer")
+        
+        if not result['mismatches'] and not result['unreadable_keys']:
+            print(f"   ✅ {result['matched']} pares verificados")
+        
+        return result
     
-    def disable_interceptors(self, target_domain: str) -> Dict[str, Any]:
-        """Deshabilitar todas las configuraciones que interceptan requests para un dominio"""
+    @round_trip_budget(2)
+    def disable_interceptors(self, target_domain: str, commit: bool = True) -> Dict[str, Any]:
+        """
+        Deshabilitar todas las configuraciones que interceptan requests para un dominio
+        
+        Con commit=False los cambios quedan en el change set (commit_changes).
+        """
         step_id = f"disable_interceptors_{target_domain.replace('.', '_')}"
         
         if not self.ui.should_continue(step_id, f"Deshabilitar interceptores para {target_domain}"):
@@ -291,31 +340,28 @@ class NginxFixer:
             'errors': []
         }
         
-        for interceptor in interceptors:
-            config_file = interceptor['config_file']
-            config_name = os.path.basename(config_file)
-            disabled_file = f"{config_file}.disabled"
-            
-            try:
-                stdout, stderr, exit_code = self.ssh.execute_command(f"mv {config_file} {disabled_file}")
-                success = exit_code == 0
-                if success:
-                    results['interceptors_disabled'] += 1
-                    print(f"✅ {config_name} deshabilitado")
-                else:
-                    results['errors'].append(f"Error deshabilitando {config_name}: {stderr}")
-                    print(f"❌ Error deshabilitando {config_name}")
-            except Exception as e:
-                results['errors'].append(f"Excepción deshabilitando {config_name}: {e}")
-                print(f"❌ Excepción deshabilitando {config_name}")
-        
-        if results['interceptors_disabled'] > 0:
-            # Verificar configuración nginx después de los cambios
-            if self._test_nginx_config():
-                print(f"\n✅ {results['interceptors_disabled']} interceptores deshabilitados exitosamente")
-                self.ui.mark_step_completed(step_id)
-            else:
-                print(f"\n⚠️  Interceptores deshabilitados pero hay errores de configuración")
-                results['success'] = False
+        # Un archivo ya preparado por fix_domain_issues no se vuelve a agregar
+        staged = {op['path'] for op in self.changes.operations}
+        disabled = [interceptor['config_file'] for interceptor in interceptors
+                    if interceptor['config_file'] in staged or self.changes.disable(interceptor['config_file'])]
+        self.pending_steps.append(step_id)
+        
+        if not commit:
+            results['interceptors_disabled'] = len(disabled)
+            return results
         
-        return results
\ No newline at end of file
+        commit_result = self.commit_changes()
+        results['commit'] = commit_result
+        applied = set(commit_result['applied'])
+        results['interceptors_disabled'] = sum(1 for config_file in disabled if config_file in applied)
+        results['errors'] = [f"{os.path.basename(item['path'])} omitido: {item['reason']}"
+                             for item in commit_result['skipped']]
+        
+        if commit_result['success']:
+            print(f"\n✅ {results['interceptors_disabled']} interceptores deshabilitados exitosamente")
+        else:
+            print(f"\n⚠️  Interceptores no deshabilitados: la configuración resultante no es válida")
+            results['interceptors_disabled'] = 0
+            results['success'] = False
+        
+        return results
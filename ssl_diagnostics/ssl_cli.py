@@ -5,28 +5,107 @@ SSL Diagnostics CLI - Herramientas de línea de comandos para diagnóstico SSL
 
 import sys
 import os
+import json
+import time
 import argparse
 from datetime import datetime
+from typing import Optional
 
 # Agregar el directorio padre al path para imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from ssl_diagnostics.ssl_diagnostics_main import SSLDiagnosticsMain
+from ssl_diagnostics.ssl_diagnostics_main import MultiDomainDiagnostics, SSLDiagnosticsMain
 from ssl_diagnostics.core.state_manager import StateManager, cleanup_old_states
+from ssl_diagnostics.core.state_store import open_state_index
 from ssl_diagnostics.core.ssh_manager import SSHManager
+from ssl_diagnostics.core.ssl_manager import SSLManager
+from ssl_diagnostics.analyzers.coverage_analyzer import CoverageAnalyzer
+from ssl_diagnostics.analyzers.tls_probe_analyzer import TLSProbeAnalyzer
+from ssl_diagnostics.analyzers.access_log_analyzer import AccessLogAnalyzer
+from ssl_diagnostics.analyzers.error_log_analyzer import ErrorLogAnalyzer
+from ssl_diagnostics.analyzers.resolution_analyzer import RESOLVE_CONCURRENCY, ResolutionAnalyzer
+from ssl_diagnostics.core.expiry_index import DAY, ExpiryIndex, ExpiryScheduler
+from ssl_diagnostics.core.nginx_manager import NginxManager
+from ssl_diagnostics.core.vhost_generator import DEFAULT_TEMPLATE, VhostGenerator, VhostTemplate
 from ssl_diagnostics.analyzers.panel_analyzer import AAPanelAnalyzer
 
+def _report_timings(ssh: SSHManager, args):
+    """Mostrar y/o exportar los tiempos por comando si se pidieron"""
+    if not ssh.timings:
+        return
+    if args.timings:
+        print(ssh.timings.format_summary(args.timings_top))
+    if args.timings_json:
+        print(f"\n💾 Tiempos guardados en {ssh.timings.save(args.timings_json, args.timings_top)}")
+
+def _add_timing_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--timings', action='store_true',
+                        help='Mostrar tiempos por comando, round trips por paso e histograma de latencia')
+    parser.add_argument('--timings-json', metavar='FILE',
+                        help='Exportar los tiempos por comando a un archivo JSON')
+    parser.add_argument('--timings-top', type=int, default=10, metavar='N',
+                        help='Cantidad de comandos más lentos a listar (default: 10)')
+
+def _state_host(ssh: Optional[SSHManager] = None) -> str:
+    """Host (hostname:puerto de la configuración SSH) con el que se guarda el estado de cada dominio"""
+    config = (ssh or SSHManager()).config
+    return f"{config['hostname']}:{config['port']}"
+
 def cmd_diagnose(args):
-    """Comando principal de diagnóstico"""
-    print(f"🔍 Iniciando diagnóstico SSL para {args.domain}")
+    """Comando principal de diagnóstico (uno, varios dominios o todos los vhosts)"""
+    if not args.domains and not args.all:
+        print("❌ Indicar uno o más dominios, o --all")
+        return 1
+    
+    # Más de un dominio: una sesión, un snapshot del host y un change set para todos
+    multi = args.all or len(args.domains) > 1
+    target = 'todos los vhosts' if args.all else ', '.join(args.domains)
+    print(f"🔍 Iniciando diagnóstico SSL para {target}")
+    
+    ssh = SSHManager()
     
     if args.reset:
-        state_manager = StateManager(args.domain)
-        state_manager.reset_state()
-        print("🔄 Estado reseteado")
+        host = _state_host(ssh)
+        domains = args.domains
+        if args.all:
+            # Con --all se resetean los estados guardados de este host (un vhost sin estado no tiene nada que borrar)
+            db = open_state_index()
+            try:
+                domains = [state['domain'] for state in db.list_states(host=host)]
+            finally:
+                db.close()
+        deleted = 0
+        for domain in domains:
+            state_manager = StateManager(domain, host=host)
+            deleted += state_manager.reset_state()
+            state_manager.close()
+        if deleted:
+            print(f"🔄 Estado reseteado ({deleted} dominio(s))")
+        else:
+            print("ℹ️  No había estado guardado para resetear")
     
-    diagnostics = SSLDiagnosticsMain(args.domain)
+    if args.replay:
+        ssh.use_replay(args.replay, rtt=args.replay_rtt / 1000.0)
+    elif args.record:
+        ssh.enable_recording(args.record)
+    if args.timings or args.timings_json:
+        ssh.enable_timings()
+    
+    started = time.perf_counter()
+    if multi:
+        diagnostics = MultiDomainDiagnostics(args.domains, ssh_manager=ssh, all_domains=args.all)
+    else:
+        diagnostics = SSLDiagnosticsMain(args.domains[0], ssh_manager=ssh)
     results = diagnostics.run_complete_diagnosis()
+    elapsed = time.perf_counter() - started
+    
+    if ssh.replay:
+        stats = ssh.replay.stats()
+        print(f"\n⏱️  Replay: {stats['round_trips']} round trips, "
+              f"{stats['misses']} comandos no grabados, "
+              f"{stats['simulated_latency']:.3f}s latencia simulada, {elapsed:.3f}s totales")
+    
+    _report_timings(ssh, args)
     
     if results['success']:
         print(f"\n🎉 Diagnóstico completado exitosamente")
@@ -41,7 +120,7 @@ def cmd_state(args):
         print("❌ Dominio requerido para comandos de estado")
         return 1
     
-    state_manager = StateManager(args.domain)
+    state_manager = StateManager(args.domain, host=args.host or _state_host())
     
     if args.show:
         state_manager.print_state_summary()
@@ -63,29 +142,28 @@ def cmd_cleanup(args):
     return 0
 
 def cmd_list_states(args):
-    """Listar todos los archivos de estado"""
-    state_dir = os.path.join(os.path.dirname(__file__), '..', 'state')
-    
-    if not os.path.exists(state_dir):
-        print("📋 No hay archivos de estado")
-        return 0
-    
-    state_files = [f for f in os.listdir(state_dir) if f.endswith('_state.json')]
+    """Listar los estados guardados (todos, de un host, o los trabados en un paso)"""
+    db = open_state_index()
+    try:
+        if args.stuck_at:
+            states = db.stuck_at(args.stuck_at, idle_hours=args.idle_hours, host=args.host)
+            title = f"Dominios trabados en {args.stuck_at}"
+        else:
+            states = db.list_states(host=args.host)
+            title = "Estados encontrados"
+    finally:
+        db.close()
     
-    if not state_files:
-        print("📋 No hay archivos de estado")
+    if not states:
+        print("📋 No hay estados")
         return 0
     
-    print(f"📋 Estados encontrados ({len(state_files)}):")
-    for state_file in sorted(state_files):
-        domain = state_file.replace('_state.json', '').replace('_', '.')
-        filepath = os.path.join(state_dir, state_file)
-        
-        try:
-            mod_time = datetime.fromtimestamp(os.path.getmtime(filepath))
-            print(f"   {domain} - {mod_time.strftime('%Y-%m-%d %H:%M:%S')}")
-        except OSError:
-            print(f"   {domain} - Error leyendo fecha")
+    print(f"📋 {title} ({len(states)}):")
+    for state in states:
+        updated = datetime.fromisoformat(state['updated_at']).strftime('%Y-%m-%d %H:%M:%S')
+        host = f" @ {state['host']}" if state['host'] else ''
+        last_step = f" - último paso: {state['last_step']}" if state.get('last_step') else ''
+        print(f"   {state['domain']}{host} - {updated} - {state['steps_completed']} pasos{last_step}")
     
     return 0
 
@@ -94,6 +172,8 @@ def cmd_panel_diagnose(args):
     print("Iniciando diagnostico aaPanel")
 
     ssh = SSHManager()
+    if args.timings or args.timings_json:
+        ssh.enable_timings()
     if not ssh.connect():
         print("Error: No se pudo establecer conexion SSH")
         return 1
@@ -132,6 +212,401 @@ def cmd_panel_diagnose(args):
         return 1 if analysis.get('issues') else 0
     finally:
         ssh.close()
+        _report_timings(ssh, args)
+
+def cmd_certs(args):
+    """Inventario de todos los certificados del host, ordenado por vencimiento"""
+    ssh = SSHManager()
+    if args.timings or args.timings_json:
+        ssh.enable_timings()
+    if not ssh.connect():
+        print("❌ No se pudo establecer conexión SSH")
+        return 1
+    
+    try:
+        ssl_manager = SSLManager(ssh, use_cache=not args.no_cache)
+        rows = ssl_manager.get_certificate_inventory(sort_by=args.sort, workers=args.workers)
+        if ssl_manager.cache:
+            print(f"🗃️  {ssl_manager.cache.hits} certificados sin cambios tomados del cache")
+        
+        print(f"\n📋 Certificados en {ssl_manager.cert_dir} ({len(rows)}):")
+        print(ssl_manager.format_inventory_table(rows))
+        
+        exit_code = 0
+        if args.verify_keys:
+            key_check = ssl_manager.verify_key_pairs(inventory=rows)
+            print(f"\n🔑 Pares certificado/clave: {key_check['matched']}/{key_check['checked']} coinciden")
+            for mismatch in key_check['mismatches']:
+                print(f"   ❌ {mismatch['domain']}: privkey.pem no corresponde a fullchain.pem")
+            for domain in key_check['unreadable_keys']:
+                print(f"   ⚠️  {domain}: privkey.pem no se pudo leer")
+            if key_check['mismatches']:
+                exit_code = 1
+        
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(rows, f, indent=2, ensure_ascii=False)
+            print(f"\n💾 Inventario guardado en {args.json}")
+        
+        return exit_code
+    finally:
+        ssh.close()
+        _report_timings(ssh, args)
+
+def cmd_coverage(args):
+    """Hostnames servidos por HTTPS que ningún SAN de su certificado cubre"""
+    ssh = SSHManager()
+    if args.timings or args.timings_json:
+        ssh.enable_timings()
+    if not ssh.connect():
+        print("❌ No se pudo establecer conexión SSH")
+        return 1
+    
+    try:
+        analysis = CoverageAnalyzer(ssh).analyze_coverage()
+        
+        print(f"\n🔒 Cobertura SAN: {analysis['tls_blocks']} bloques HTTPS de {analysis['server_blocks']}, "
+              f"{analysis['certificates']} certificados")
+        print(f"   Hostnames verificados: {analysis['hostnames_checked']}, cubiertos: {analysis['covered']}")
+        
+        if analysis['uncovered']:
+            print(f"\n❌ Sin cobertura ({len(analysis['uncovered'])}):")
+            for item in analysis['uncovered']:
+                print(f"   {item['description']}  [{os.path.basename(item['config'])}:{item['line']}]")
+                if item['covered_by']:
+                    print(f"      ↳ cubierto por: {', '.join(item['covered_by'])}")
+        else:
+            print("\n✅ Todos los hostnames HTTPS están cubiertos por su certificado")
+        
+        if analysis['unchecked']:
+            print(f"\nℹ️  No verificables ({len(analysis['unchecked'])}): "
+                  f"{', '.join(item['hostname'] for item in analysis['unchecked'][:10])}")
+        
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(analysis, f, indent=2, ensure_ascii=False)
+            print(f"\n💾 Resultado guardado en {args.json}")
+        
+        return 1 if analysis['uncovered'] else 0
+    finally:
+        ssh.close()
+        _report_timings(ssh, args)
+
+def cmd_resolve(args):
+    """Resolución de cada server_name (/etc/hosts + DNS) contra las direcciones del propio host"""
+    ssh = SSHManager()
+    if args.timings or args.timings_json:
+        ssh.enable_timings()
+    if not ssh.connect():
+        print("❌ No se pudo establecer conexión SSH")
+        return 1
+    
+    try:
+        analysis = ResolutionAnalyzer(ssh).analyze_resolution(expected_addresses=args.public_ip,
+                                                              concurrency=args.concurrency)
+        if not analysis['success']:
+            print(f"❌ Error resolviendo nombres: {analysis['error']}")
+            return 1
+        
+        print(f"\n🌐 Resolución: {analysis['names_checked']} server_name, {analysis['ok']} apuntan a este servidor")
+        print(f"   Direcciones del host: {', '.join(analysis['local_addresses']) or 'desconocidas'}")
+        
+        for category, title in (('loopback', '🔁 Resuelven a loopback'), ('stale', '❌ Apuntan a otra IP'),
+                                ('mixed', '⚠️  Resolución parcial'), ('unresolved', '❓ No resuelven')):
+            if analysis[category]:
+                print(f"\n{title} ({len(analysis[category])}):")
+                for item in analysis[category]:
+                    print(f"   {item['description']}  [{os.path.basename(item['config'])}:{item['line']}]")
+        
+        if not analysis['issues']:
+            print("\n✅ Todos los server_name resuelven a este servidor")
+        
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(analysis, f, indent=2, ensure_ascii=False)
+            print(f"\n💾 Resultado guardado en {args.json}")
+        
+        return 1 if analysis['loopback'] or analysis['stale'] else 0
+    finally:
+        ssh.close()
+        _report_timings(ssh, args)
+
+def cmd_chains(args):
+    """Verificación local de las cadenas de todos los certificados del host"""
+    ssh = SSHManager()
+    if args.timings or args.timings_json:
+        ssh.enable_timings()
+    if not ssh.connect():
+        print("❌ No se pudo establecer conexión SSH")
+        return 1
+    
+    try:
+        report = SSLManager(ssh).check_certificate_chains(args.domains or None, trust_store=args.trust_store)
+        
+        print(f"\n🔗 Cadenas verificadas: {report['checked']} (completas: {report['complete']})")
+        print(f"   Almacén de confianza: {report['trust_store'] or '-'} ({report['trust_anchors']} CAs), "
+              f"intermediarios en cache: {report['cached_intermediates']}")
+        
+        problems = [result for result in report['results'] if result['status'] != 'complete']
+        for result in problems:
+            icon = '⚠️ ' if result['status'] == 'incomplete' else '❌'
+            print(f"   {icon} {result['description']}")
+        if report['includes_root']:
+            print(f"\nℹ️  Incluyen la raíz innecesariamente ({len(report['includes_root'])}): "
+                  f"{', '.join(report['includes_root'][:10])}")
+        if report['expired_intermediates']:
+            print(f"\n⚠️  Con intermediarios vencidos ({len(report['expired_intermediates'])}): "
+                  f"{', '.join(report['expired_intermediates'][:10])}")
+        
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            print(f"\n💾 Resultado guardado en {args.json}")
+        
+        return 1 if problems else 0
+    finally:
+        ssh.close()
+        _report_timings(ssh, args)
+
+def cmd_tls_probe(args):
+    """Latencia de handshake TLS, reanudación de sesión y ALPN de cada vhost HTTPS"""
+    ssh = SSHManager()
+    if args.timings or args.timings_json:
+        ssh.enable_timings()
+    if not ssh.connect():
+        print("❌ No se pudo establecer conexión SSH")
+        return 1
+    
+    try:
+        analysis = TLSProbeAnalyzer(ssh).probe_vhosts(
+            hostnames=args.hostnames or None, port=args.port,
+            iterations=args.iterations, concurrency=args.concurrency
+        )
+        
+        latency = analysis['latency_ms']
+        print(f"\n⏱️  Handshakes TLS en localhost:{analysis['port']}: {analysis['hostnames']} hostnames "
+              f"x {analysis['iterations']} conexiones")
+        print(f"   Mediana por vhost (ms): p50 {latency['p50']}  p90 {latency['p90']}  "
+              f"p99 {latency['p99']}  max {latency['max']}")
+        print(f"   Protocolos: {', '.join(f'{k} ({v})' for k, v in analysis['protocols'].items()) or '-'}")
+        print(f"   Cifrados: {', '.join(f'{k} ({v})' for k, v in analysis['ciphers'].items()) or '-'}")
+        
+        if analysis['slowest']:
+            print("\n🐢 Más lentos (p90):")
+            for item in analysis['slowest']:
+                stats = item['latency_ms']
+                print(f"   {stats['p50']:8.2f}ms p50  {stats['p90']:8.2f}ms p90  {item['hostname']}")
+        
+        if analysis['without_resumption']:
+            print(f"\n⚠️  Sin reanudación de sesión ({len(analysis['without_resumption'])}): "
+                  f"{', '.join(analysis['without_resumption'][:10])}")
+        if analysis['without_h2']:
+            print(f"\nℹ️  Sin HTTP/2 por ALPN ({len(analysis['without_h2'])}): "
+                  f"{', '.join(analysis['without_h2'][:10])}")
+        for item in analysis['failed']:
+            print(f"   ❌ {item['hostname']}: {item['error']}")
+        
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(analysis, f, indent=2, ensure_ascii=False)
+            print(f"\n💾 Resultado guardado en {args.json}")
+        
+        return 1 if analysis['failed'] else 0
+    finally:
+        ssh.close()
+        _report_timings(ssh, args)
+
+def _print_due(index, days):
+    due = index.due_within(days * DAY)
+    print(f"\n📅 Certificados que vencen en {days} días o menos: {len(due)}")
+    for item in due:
+        flag = "🔴" if item['days_left'] < 0 else "🟡" if item['days_left'] < 7 else "🟢"
+        print(f"   {flag} {item['days_left']:>5}d  {item['host']:<24} {item['domain']}")
+    
+    failed = [host for host, info in sorted(index.hosts.items()) if info.get('error')]
+    for host in failed:
+        print(f"   ⚠️  {host}: último escaneo fallido ({index.hosts[host]['error']})")
+
+def cmd_access_logs(args):
+    """Requests, estados y latencia por vhost leyendo solo los bytes nuevos de los access logs"""
+    ssh = SSHManager()
+    if args.timings or args.timings_json:
+        ssh.enable_timings()
+    if not ssh.connect():
+        print("❌ No se pudo establecer conexión SSH")
+        return 1
+    
+    try:
+        analysis = AccessLogAnalyzer(ssh).analyze(reset=args.reset, max_bytes=args.max_mb * 1024 * 1024,
+                                                  top=args.top)
+        if not analysis['success']:
+            print(f"❌ Error leyendo access logs: {analysis['error']}")
+            return 1
+        
+        print(f"\n📈 Access logs: {analysis['files']} archivos, {analysis['requests']} requests nuevos"
+              f"{' (primera corrida: incluye rotados .gz)' if analysis['first_run'] else ''}")
+        if analysis['truncated']:
+            print(f"   ⚠️  Lectura cortada por --max-mb en {len(analysis['truncated'])} archivos "
+                  f"(la próxima corrida continúa)")
+        
+        print(f"\n🔥 Vhosts con más requests/s:")
+        for item in analysis['busiest']:
+            print(f"   {item['vhost']}: {item['rps']} req/s ({item['requests']} requests), "
+                  f"4xx {item['rate_4xx']:.1%}, 5xx {item['rate_5xx']:.1%}")
+        if analysis['most_5xx'] and analysis['most_5xx'][0]['rate_5xx'] > 0:
+            print(f"\n❌ Mayor tasa de 5xx:")
+            for item in analysis['most_5xx']:
+                if item['rate_5xx'] > 0:
+                    print(f"   {item['vhost']}: {item['rate_5xx']:.1%} de {item['requests']} requests")
+        if analysis['latency_available']:
+            print(f"\n⏱️  Mayor latencia (p90):")
+            for item in analysis['slowest']:
+                latency = item['latency_ms']
+                print(f"   {item['vhost']}: p50 {latency['p50']} ms  p90 {latency['p90']} ms  p99 {latency['p99']} ms")
+        else:
+            print(f"\nℹ️  Sin latencias: agregar $request_time al final del log_format de nginx")
+        
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(analysis, f, indent=2, ensure_ascii=False)
+            print(f"\n💾 Resultado guardado en {args.json}")
+        
+        return 0
+    finally:
+        ssh.close()
+        _report_timings(ssh, args)
+
+def cmd_error_logs(args):
+    """Errores SSL/handshake y de upstream por vhost leyendo solo las líneas nuevas de los error logs"""
+    ssh = SSHManager()
+    if args.timings or args.timings_json:
+        ssh.enable_timings()
+    if not ssh.connect():
+        print("❌ No se pudo establecer conexión SSH")
+        return 1
+    
+    try:
+        analysis = ErrorLogAnalyzer(ssh).analyze(reset=args.reset, max_bytes=args.max_mb * 1024 * 1024,
+                                                 top=args.top, domain=args.domain)
+        if not analysis['success']:
+            print(f"❌ Error leyendo error logs: {analysis['error']}")
+            return 1
+        
+        print(f"\n🧾 Error logs: {analysis['files']} archivos, {analysis['events']} eventos nuevos "
+              f"({analysis['ssl_events']} SSL){' (primera corrida: incluye rotados .gz)' if analysis['first_run'] else ''}")
+        if analysis['truncated']:
+            print(f"   ⚠️  Lectura cortada por --max-mb en {len(analysis['truncated'])} archivos "
+                  f"(la próxima corrida continúa)")
+        for name, count in analysis['classes'].items():
+            print(f"   {name}: {count}")
+        
+        print(f"\n🔥 Vhosts con más errores:")
+        for item in analysis['top_offenders']:
+            classes = ', '.join(f"{name} {count}" for name, count in list(item['classes'].items())[:3])
+            print(f"   {item['vhost']}: {item['events']} ({classes})")
+        if analysis['top_ssl']:
+            print(f"\n🔒 Vhosts con más errores SSL:")
+            for item in analysis['top_ssl']:
+                reasons = ', '.join(f"{reason} {count}" for reason, count in item['top_reasons'][:2])
+                print(f"   {item['vhost']}: {item['ssl_events']}{f' ({reasons})' if reasons else ''}")
+        
+        domain = analysis.get('domain')
+        if domain:
+            print(f"\n🎯 {args.domain}: {domain['events']} eventos acumulados, {domain['ssl_events']} SSL")
+            for reason, count in domain['top_reasons']:
+                print(f"   {reason}: {count}")
+        
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(analysis, f, indent=2, ensure_ascii=False)
+            print(f"\n💾 Resultado guardado en {args.json}")
+        
+        return 0
+    finally:
+        ssh.close()
+        _report_timings(ssh, args)
+
+def cmd_expiry(args):
+    """Índice de vencimientos de la flota: scan, due-within y watch"""
+    index = ExpiryIndex(args.index)
+    scheduler = ExpiryScheduler(index)
+    
+    if args.expiry_command == 'scan':
+        for result in scheduler.scan_hosts(args.hosts):
+            status = f"✅ {result['certificates']} certificados" if result['success'] else f"❌ {result['error']}"
+            print(f"   {result['host']}: {status}")
+        return 0
+    
+    if args.expiry_command == 'due-within':
+        _print_due(index, args.days)
+        return 0
+    
+    # watch: re-escanear solo lo que puede haber cambiado dentro del horizonte
+    max_age = args.max_age_hours * 3600 if args.max_age_hours else None
+    try:
+        while True:
+            scanned = scheduler.watch_cycle(args.hosts, args.horizon * DAY, max_age)
+            print(f"\n🔄 {datetime.now().strftime('%H:%M:%S')} - {len(scanned)} hosts escaneados, "
+                  f"{len(index.hosts) - len(scanned)} desde el índice")
+            _print_due(index, args.horizon)
+            if args.once:
+                return 0
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print("\n⏹️  Watch detenido")
+        return 0
+
+def cmd_vhosts(args):
+    """Crear vhosts nginx en bloque desde una plantilla (una transferencia, un nginx -t)"""
+    domains = list(args.domains)
+    if args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            domains.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    if not domains:
+        print("❌ No se indicaron dominios")
+        return 1
+    
+    template = VhostTemplate.from_file(args.template) if args.template else DEFAULT_TEMPLATE
+    values = dict(item.split('=', 1) for item in args.set)
+    
+    ssh = SSHManager()
+    if args.timings or args.timings_json:
+        ssh.enable_timings()
+    if not ssh.connect():
+        print("❌ No se pudo establecer conexión SSH")
+        return 1
+    
+    try:
+        result = VhostGenerator(NginxManager(ssh)).generate(
+            domains, template, values, skip_failed=args.skip_failed, reload=args.reload
+        )
+        
+        print(f"\n🧩 Vhosts generados: {result['requested']} ({result['upload_bytes']} bytes transferidos, "
+              f"{result['validations']} nginx -t en árbol sombra)")
+        if result['existing']:
+            print(f"   ⏭️  Ya existían ({len(result['existing'])}): {', '.join(result['existing'][:10])}")
+        for failure in result['failed']:
+            location = f"línea {failure['line']} `{failure['template_line']}` - " if failure['line'] else ''
+            print(f"   ❌ {failure['domain']}: {location}{failure['message']}")
+        if result['aborted']:
+            print(f"   ❌ No se aplicó nada: {result['aborted']}")
+        elif result['failed'] and not args.skip_failed:
+            print(f"   ⚠️  No se aplicó nada (usar --skip-failed para crear los que validan)")
+        if result['rolled_back']:
+            print(f"   ❌ nginx -t falló en vivo: vhosts creados revertidos")
+        elif result['applied']:
+            print(f"   ✅ {len(result['applied'])} vhosts creados"
+                  f"{' y nginx recargado' if result['reloaded'] else ''}")
+        
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(result, f, indent=2, ensure_ascii=False)
+            print(f"\n💾 Resultado guardado en {args.json}")
+        
+        return 0 if result['success'] else 1
+    finally:
+        ssh.close()
+        _report_timings(ssh, args)
 
 def main():
     """Función principal de CLI"""
@@ -142,10 +617,26 @@ def main():
 Ejemplos:
   %(prog)s diagnose 70ideas.com.ar              # Diagnóstico completo
   %(prog)s diagnose 70ideas.com.ar --reset      # Diagnóstico desde cero
+  %(prog)s diagnose 70ideas.com.ar --record fx.json           # Grabar comandos
+  %(prog)s diagnose 70ideas.com.ar --replay fx.json --replay-rtt 40  # Replay offline
+  %(prog)s diagnose 70ideas.com.ar --timings    # Tiempos por comando remoto
+  %(prog)s diagnose a.com b.com c.com           # Varios dominios, un snapshot y un change set
+  %(prog)s diagnose --all                       # Todos los vhosts del servidor
   %(prog)s state 70ideas.com.ar --show          # Mostrar estado
   %(prog)s state 70ideas.com.ar --reset         # Resetear estado
   %(prog)s cleanup --days 7                     # Limpiar estados > 7 días
   %(prog)s list-states                          # Listar todos los estados
+  %(prog)s list-states --stuck-at nginx_fixes   # Dominios trabados en un paso
+  %(prog)s certs --sort expiry                  # Inventario de certificados
+  %(prog)s coverage                             # server_name sin SAN que los cubra
+  %(prog)s chains                               # Cadenas incompletas (verificación local)
+  %(prog)s resolve --public-ip 203.0.113.10     # server_name que no resuelven a este host
+  %(prog)s tls-probe --iterations 20            # Latencia de handshake por vhost
+  %(prog)s expiry scan hostA.env hostB.env      # Indexar vencimientos de la flota
+  %(prog)s expiry due-within 14                 # Consultar el índice (sin red)
+  %(prog)s vhosts --file dominios.txt --reload  # Crear vhosts en bloque
+  %(prog)s access-logs --top 20                 # Sitios que más cargan el servidor
+  %(prog)s error-logs --domain ejemplo.com      # Errores SSL/upstream por vhost
         """
     )
     
@@ -153,9 +644,19 @@ Ejemplos:
     
     # Comando diagnose
     diagnose_parser = subparsers.add_parser('diagnose', help='Ejecutar diagnóstico SSL completo')
-    diagnose_parser.add_argument('domain', help='Dominio a diagnosticar')
+    diagnose_parser.add_argument('domains', nargs='*', metavar='domain',
+                                help='Dominio(s) a diagnosticar; con más de uno se comparte un snapshot del host')
+    diagnose_parser.add_argument('--all', action='store_true',
+                                help='Diagnosticar todos los dominios del inventario de vhosts')
     diagnose_parser.add_argument('--reset', action='store_true', 
                                 help='Resetear estado antes de empezar')
+    diagnose_parser.add_argument('--record', metavar='FILE',
+                                help='Grabar todos los comandos remotos en un fixture JSON')
+    diagnose_parser.add_argument('--replay', metavar='FILE',
+                                help='Servir los comandos desde un fixture JSON sin conectar al servidor')
+    diagnose_parser.add_argument('--replay-rtt', type=float, default=0.0, metavar='MS',
+                                help='RTT simulado por comando en modo replay, en ms (default: 0)')
+    _add_timing_arguments(diagnose_parser)
     diagnose_parser.set_defaults(func=cmd_diagnose)
     
     # Comando state
@@ -165,6 +666,7 @@ Ejemplos:
     state_parser.add_argument('--reset', action='store_true', help='Resetear estado completamente')
     state_parser.add_argument('--clear-step', help='Limpiar un paso específico')
     state_parser.add_argument('--clear-all', action='store_true', help='Limpiar todos los pasos')
+    state_parser.add_argument('--host', help='Host del estado (default: hostname:puerto de la configuración SSH)')
     state_parser.set_defaults(func=cmd_state)
     
     # Comando cleanup
@@ -174,9 +676,122 @@ Ejemplos:
     cleanup_parser.set_defaults(func=cmd_cleanup)
     
     # Comando list-states
-    list_parser = subparsers.add_parser('list-states', help='Listar todos los archivos de estado')
+    list_parser = subparsers.add_parser('list-states', help='Listar los estados guardados')
+    list_parser.add_argument('--host', help='Solo los estados de este host (hostname:puerto)')
+    list_parser.add_argument('--stuck-at', metavar='STEP', help='Solo los dominios cuyo último paso completado es STEP')
+    list_parser.add_argument('--idle-hours', type=float, default=0,
+                             help='Con --stuck-at: sin cambios hace al menos N horas (default: 0)')
     list_parser.set_defaults(func=cmd_list_states)
 
+    # Comando certs
+    certs_parser = subparsers.add_parser('certs', help='Inventario de certificados del host (un round trip)')
+    certs_parser.add_argument('--sort', choices=['expiry', 'domain', 'issuer'], default='expiry',
+                              help='Orden de la tabla (default: expiry)')
+    certs_parser.add_argument('--workers', type=int,
+                              help='Procesos para parsear certificados (default: CPUs locales)')
+    certs_parser.add_argument('--json', metavar='FILE', help='Guardar el inventario en JSON')
+    certs_parser.add_argument('--verify-keys', action='store_true',
+                              help='Verificar que cada privkey.pem corresponda a su certificado')
+    certs_parser.add_argument('--no-cache', action='store_true',
+                              help='Transferir y parsear todos los certificados, ignorando el cache local')
+    _add_timing_arguments(certs_parser)
+    certs_parser.set_defaults(func=cmd_certs)
+
+    # Comando coverage
+    coverage_parser = subparsers.add_parser('coverage', help='server_name HTTPS sin SAN que los cubra (todo el host)')
+    coverage_parser.add_argument('--json', metavar='FILE', help='Guardar el resultado en JSON')
+    _add_timing_arguments(coverage_parser)
+    coverage_parser.set_defaults(func=cmd_coverage)
+
+    # Comando chains
+    chains_parser = subparsers.add_parser('chains', help='Verificar localmente las cadenas de los certificados')
+    chains_parser.add_argument('domains', nargs='*', help='Dominios a verificar (default: todos)')
+    chains_parser.add_argument('--trust-store', metavar='FILE',
+                               help='Bundle PEM de CAs de confianza (default: certifi o el del sistema)')
+    chains_parser.add_argument('--json', metavar='FILE', help='Guardar el resultado en JSON')
+    _add_timing_arguments(chains_parser)
+    chains_parser.set_defaults(func=cmd_chains)
+
+    # Comando resolve
+    resolve_parser = subparsers.add_parser('resolve', help='Resolver cada server_name (/etc/hosts + DNS) contra las IPs del host')
+    resolve_parser.add_argument('--public-ip', action='append', metavar='IP',
+                                help='IP pública del host que no figura en sus interfaces (NAT); repetible')
+    resolve_parser.add_argument('--concurrency', type=int, default=RESOLVE_CONCURRENCY,
+                                help=f'Resoluciones en paralelo en el servidor (default: {RESOLVE_CONCURRENCY})')
+    resolve_parser.add_argument('--json', metavar='FILE', help='Guardar el resultado en JSON')
+    _add_timing_arguments(resolve_parser)
+    resolve_parser.set_defaults(func=cmd_resolve)
+
+    # Comando tls-probe
+    probe_parser = subparsers.add_parser('tls-probe', help='Benchmark de handshakes TLS de cada vhost (en el servidor)')
+    probe_parser.add_argument('hostnames', nargs='*', help='Hostnames a probar (default: todos los vhosts HTTPS)')
+    probe_parser.add_argument('--port', type=int, default=443, help='Puerto local de nginx (default: 443)')
+    probe_parser.add_argument('--iterations', type=int, default=10,
+                              help='Handshakes completos por hostname (default: 10)')
+    probe_parser.add_argument('--concurrency', type=int, default=16,
+                              help='Hostnames probados en paralelo (default: 16)')
+    probe_parser.add_argument('--json', metavar='FILE', help='Guardar el resultado en JSON')
+    _add_timing_arguments(probe_parser)
+    probe_parser.set_defaults(func=cmd_tls_probe)
+
+    # Comando access-logs
+    logs_parser = subparsers.add_parser('access-logs', help='Requests, estados y latencia por vhost (incremental)')
+    logs_parser.add_argument('--top', type=int, default=10, help='Vhosts por ranking (default: 10)')
+    logs_parser.add_argument('--max-mb', type=int, default=0,
+                             help='Máximo de MB a leer por archivo en esta corrida; 0 = sin límite')
+    logs_parser.add_argument('--reset', action='store_true',
+                             help='Descartar offsets y totales guardados y leer todo de nuevo')
+    logs_parser.add_argument('--json', metavar='FILE', help='Guardar el resultado en JSON')
+    _add_timing_arguments(logs_parser)
+    logs_parser.set_defaults(func=cmd_access_logs)
+
+    # Comando error-logs
+    errors_parser = subparsers.add_parser('error-logs', help='Errores SSL/handshake y de upstream por vhost (incremental)')
+    errors_parser.add_argument('--domain', help='Detalle de un dominio (y su www.)')
+    errors_parser.add_argument('--top', type=int, default=10, help='Vhosts por ranking (default: 10)')
+    errors_parser.add_argument('--max-mb', type=int, default=0,
+                               help='Máximo de MB a leer por archivo en esta corrida; 0 = sin límite')
+    errors_parser.add_argument('--reset', action='store_true',
+                               help='Descartar offsets y totales guardados y leer todo de nuevo')
+    errors_parser.add_argument('--json', metavar='FILE', help='Guardar el resultado en JSON')
+    _add_timing_arguments(errors_parser)
+    errors_parser.set_defaults(func=cmd_error_logs)
+
+    # Comando expiry
+    expiry_parser = subparsers.add_parser('expiry', help='Índice de vencimientos de certificados de varios hosts')
+    expiry_parser.add_argument('--index', metavar='FILE', help='Archivo del índice (default: cache/expiry_index.json)')
+    expiry_sub = expiry_parser.add_subparsers(dest='expiry_command', required=True)
+    
+    expiry_scan = expiry_sub.add_parser('scan', help='Escanear hosts y actualizar el índice')
+    expiry_scan.add_argument('hosts', nargs='+', metavar='ENV', help='Archivo .env de conexión de cada host')
+    
+    expiry_due = expiry_sub.add_parser('due-within', help='Certificados que vencen dentro de N días (sin red)')
+    expiry_due.add_argument('days', type=int, help='Horizonte en días')
+    
+    expiry_watch = expiry_sub.add_parser('watch', help='Re-escanear solo hosts con vencimientos dentro del horizonte')
+    expiry_watch.add_argument('hosts', nargs='*', metavar='ENV', help='Hosts nuevos a incorporar al índice')
+    expiry_watch.add_argument('--horizon', type=int, default=21, help='Horizonte en días (default: 21)')
+    expiry_watch.add_argument('--interval', type=int, default=3600, help='Segundos entre vueltas (default: 3600)')
+    expiry_watch.add_argument('--max-age-hours', type=int, default=24,
+                              help='Re-escanear igual los hosts no vistos en N horas; 0 = nunca (default: 24)')
+    expiry_watch.add_argument('--once', action='store_true', help='Una sola vuelta')
+    expiry_parser.set_defaults(func=cmd_expiry)
+
+    # Comando vhosts
+    vhosts_parser = subparsers.add_parser('vhosts', help='Crear vhosts nginx en bloque desde una plantilla')
+    vhosts_parser.add_argument('domains', nargs='*', help='Dominios a crear')
+    vhosts_parser.add_argument('--file', metavar='FILE', help='Archivo con un dominio por línea')
+    vhosts_parser.add_argument('--template', metavar='FILE',
+                               help='Plantilla con campos {domain} (default: la de NginxFixer)')
+    vhosts_parser.add_argument('--set', action='append', default=[], metavar='CAMPO=VALOR',
+                               help='Valor para otro campo de la plantilla (repetible)')
+    vhosts_parser.add_argument('--skip-failed', action='store_true',
+                               help='Crear los que validan aunque otros fallen')
+    vhosts_parser.add_argument('--reload', action='store_true', help='Reload graceful de nginx al terminar')
+    vhosts_parser.add_argument('--json', metavar='FILE', help='Guardar el resultado en JSON')
+    _add_timing_arguments(vhosts_parser)
+    vhosts_parser.set_defaults(func=cmd_vhosts)
+
     # Comando panel-diagnose
     panel_parser = subparsers.add_parser(
         'panel-diagnose',
@@ -189,6 +804,7 @@ Ejemplos:
                               help='Ruta esperada de aaPanel sin barras (default: puerta8)')
     panel_parser.add_argument('--no-auto-start', action='store_false', dest='auto_start',
                               help='No intentar levantar aaPanel automaticamente')
+    _add_timing_arguments(panel_parser)
     panel_parser.set_defaults(auto_start=True)
     panel_parser.set_defaults(func=cmd_panel_diagnose)
     
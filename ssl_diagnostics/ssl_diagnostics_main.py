@@ -5,7 +5,7 @@ SSL Diagnostics Main - Orquestador principal para diagnóstico y corrección SSL
 
 import sys
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 # Agregar el directorio padre al path para imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -16,20 +16,24 @@ from ssl_diagnostics.core.nginx_manager import NginxManager
 from ssl_diagnostics.core.ssl_manager import SSLManager
 from ssl_diagnostics.analyzers.hosts_analyzer import HostsAnalyzer
 from ssl_diagnostics.analyzers.nginx_analyzer import NginxAnalyzer
+from ssl_diagnostics.analyzers.error_log_analyzer import ErrorLogAnalyzer
 from ssl_diagnostics.fixes.hosts_fixer import HostsFixer
 from ssl_diagnostics.fixes.nginx_fixer import NginxFixer
 
 class SSLDiagnosticsMain:
-    def __init__(self, target_domain: str):
+    def __init__(self, target_domain: str, ssh_manager: Optional[SSHManager] = None):
         self.target_domain = target_domain
-        self.ui = UserInteraction(target_domain)  # Pasar dominio para state management
-        self.ssh: Optional[SSHManager] = None
+        # Pasar dominio (y host, si ya se conoce la conexión) para state management
+        host = f"{ssh_manager.config['hostname']}:{ssh_manager.config['port']}" if ssh_manager else ''
+        self.ui = UserInteraction(target_domain, host=host)
+        self.ssh: Optional[SSHManager] = ssh_manager  # Permite inyectar grabación/replay
         
         # Managers y analyzers se inicializan después de la conexión SSH
         self.nginx_manager: Optional[NginxManager] = None
         self.ssl_manager: Optional[SSLManager] = None
         self.hosts_analyzer: Optional[HostsAnalyzer] = None
         self.nginx_analyzer: Optional[NginxAnalyzer] = None
+        self.error_log_analyzer: Optional[ErrorLogAnalyzer] = None
         self.hosts_fixer: Optional[HostsFixer] = None
         self.nginx_fixer: Optional[NginxFixer] = None
     
@@ -62,17 +66,20 @@ class SSLDiagnosticsMain:
             print(f"\n🔍 FASE 1: ANÁLISIS INICIAL")
             print("-" * 40)
             
-            analysis_results = self._run_initial_analysis()
+            with self.ssh.step('initial_analysis'):
+                analysis_results = self._run_initial_analysis()
             if analysis_results.get('skipped'):
                 results['steps_skipped'].append('initial_analysis')
             else:
                 results['steps_completed'].append('initial_analysis')
+                results['error_logs'] = analysis_results.get('error_logs')
             
             # Paso 3: Corrección de /etc/hosts
             print(f"\n🔧 FASE 2: CORRECCIÓN DE /etc/hosts")
             print("-" * 40)
             
-            hosts_results = self._fix_hosts_issues()
+            with self.ssh.step('hosts_fixes'):
+                hosts_results = self._fix_hosts_issues()
             if hosts_results.get('skipped'):
                 results['steps_skipped'].append('hosts_fixes')
             else:
@@ -82,7 +89,8 @@ class SSLDiagnosticsMain:
             print(f"\n🔧 FASE 3: CORRECCIÓN DE NGINX")
             print("-" * 40)
             
-            nginx_results = self._fix_nginx_issues()
+            with self.ssh.step('nginx_fixes'):
+                nginx_results = self._fix_nginx_issues()
             if nginx_results.get('skipped'):
                 results['steps_skipped'].append('nginx_fixes')
             else:
@@ -92,17 +100,19 @@ class SSLDiagnosticsMain:
             print(f"\n🔒 FASE 4: VERIFICACIÓN SSL")
             print("-" * 40)
             
-            ssl_results = self._verify_ssl_final()
+            with self.ssh.step('ssl_verification'):
+                ssl_results = self._verify_ssl_final()
             if ssl_results.get('skipped'):
                 results['steps_skipped'].append('ssl_verification')
             else:
                 results['steps_completed'].append('ssl_verification')
             
-            # Paso 6: Reiniciar servicios
-            print(f"\n🔄 FASE 5: REINICIO DE SERVICIOS")
+            # Paso 6: Recargar servicios
+            print(f"\n🔄 FASE 5: RECARGA DE SERVICIOS")
             print("-" * 40)
             
-            restart_results = self._restart_services()
+            with self.ssh.step('service_restart'):
+                restart_results = self._restart_services()
             if restart_results.get('skipped'):
                 results['steps_skipped'].append('service_restart')
             else:
@@ -133,7 +143,8 @@ class SSLDiagnosticsMain:
             return False
         
         try:
-            self.ssh = SSHManager()
+            if not self.ssh:
+                self.ssh = SSHManager()
             success = self.ssh.connect()
             
             if success:
@@ -155,6 +166,7 @@ class SSLDiagnosticsMain:
         self.ssl_manager = SSLManager(self.ssh)
         self.hosts_analyzer = HostsAnalyzer(self.ssh)
         self.nginx_analyzer = NginxAnalyzer(self.ssh)
+        self.error_log_analyzer = ErrorLogAnalyzer(self.ssh)
         self.hosts_fixer = HostsFixer(self.ssh)
         self.nginx_fixer = NginxFixer(self.ssh)
     
@@ -177,11 +189,21 @@ class SSLDiagnosticsMain:
         print("🔍 Verificando certificados SSL...")
         ssl_analysis = self.ssl_manager.analyze_ssl_status(self.target_domain)
         
+        print("🔍 Clasificando error logs de nginx (solo líneas nuevas)...")
+        error_logs = self.error_log_analyzer.analyze(top=5, domain=self.target_domain)
+        
         # Mostrar resumen del análisis
         print(f"\n📊 RESUMEN DEL ANÁLISIS:")
         print(f"   /etc/hosts: {len(hosts_analysis['issues'])} problemas detectados")
         print(f"   Nginx: {len(nginx_analysis['issues'])} problemas detectados")
         print(f"   SSL: {'✅ OK' if ssl_analysis.get('certificate_valid') else '❌ Problemas'}")
+        if error_logs['success']:
+            print(f"   Error logs: {error_logs['events']} eventos nuevos ({error_logs['ssl_events']} SSL)")
+        else:
+            print(f"   Error logs: ⚠️  no disponibles ({error_logs['error']})")
+        if self.nginx_manager and self.nginx_manager.cache.hits:
+            print(f"   Cache del host: {self.nginx_manager.cache.hits} análisis reusados "
+                  f"(nginx -t, vhosts y /etc/hosts sin cambios)")
         
         if hosts_analysis['issues'] or nginx_analysis['issues']:
             print(f"\n⚠️  Se requieren correcciones para resolver los problemas SSL")
@@ -190,7 +212,8 @@ class SSLDiagnosticsMain:
         return {
             'hosts_analysis': hosts_analysis,
             'nginx_analysis': nginx_analysis,
-            'ssl_analysis': ssl_analysis
+            'ssl_analysis': ssl_analysis,
+            'error_logs': error_logs
         }
     
     def _fix_hosts_issues(self) -> Dict[str, Any]:
@@ -206,14 +229,18 @@ class SSLDiagnosticsMain:
             
         results = {}
         
-        # Corregir problemas específicos del dominio
-        domain_fixes = self.nginx_fixer.fix_domain_issues(self.target_domain)
+        # Corregir problemas específicos del dominio (solo se preparan)
+        domain_fixes = self.nginx_fixer.fix_domain_issues(self.target_domain, commit=False)
         results['domain_fixes'] = domain_fixes
         
-        # Deshabilitar interceptores específicamente
-        interceptor_fixes = self.nginx_fixer.disable_interceptors(self.target_domain)
+        # Deshabilitar interceptores específicamente (mismo change set)
+        interceptor_fixes = self.nginx_fixer.disable_interceptors(self.target_domain, commit=False)
         results['interceptor_fixes'] = interceptor_fixes
         
+        # Todo se aplica junto: un nginx -t y rollback completo si falla
+        if len(self.nginx_fixer.changes):
+            results['commit'] = self.nginx_fixer.commit_changes()
+        
         return results
     
     def _verify_ssl_final(self) -> Dict[str, Any]:
@@ -251,36 +278,39 @@ class SSLDiagnosticsMain:
         }
     
     def _restart_services(self) -> Dict[str, Any]:
-        """Reiniciar servicios nginx"""
+        """Recargar nginx (graceful) después de validar la configuración"""
         step_id = "restart_services"
         
-        if not self.ui.should_continue(step_id, "Reiniciar servicios nginx"):
+        if not self.ui.should_continue(step_id, "Recargar servicios nginx"):
             return {'skipped': True}
         
-        if not self.nginx_manager or not self.ssh:
+        if not self.nginx_manager or not self.nginx_fixer or not self.ssh:
             raise RuntimeError("Components not initialized")
         
-        print("🔄 Reiniciando nginx...")
+        # Un privkey.pem que no corresponde a su certificado hace fallar la recarga
+        key_check = self.nginx_fixer.check_certificate_keys()
+        if key_check['mismatches'] and not self.ui.confirm("¿Recargar nginx de todas formas?"):
+            return {'success': False, 'error': 'Claves privadas que no corresponden a su certificado',
+                    'key_mismatches': key_check['mismatches']}
         
-        # Verificar configuración antes de reiniciar
-        test_passed, test_output = self.nginx_manager.test_config()
+        print("🔄 Recargando nginx...")
         
-        if not test_passed:
-            print(f"❌ No se puede reiniciar nginx: errores de configuración")
-            print(f"   {test_output}")
-            return {'success': False, 'error': 'Errores de configuración nginx'}
+        # nginx -t y reload graceful en un comando: los workers terminan las
+        # conexiones en curso en lugar de cortarlas como systemctl restart
+        reload_result = self.nginx_fixer.commit_changes(reload=True)
         
-        # Reiniciar nginx
-        stdout, stderr, exit_code = self.ssh.execute_command("systemctl restart nginx")
-        restart_success = exit_code == 0
+        if not reload_result['test_passed']:
+            print(f"❌ No se puede recargar nginx: errores de configuración")
+            print(f"   {reload_result['test_output']}")
+            return {'success': False, 'error': 'Errores de configuración nginx'}
         
-        if restart_success:
-            print("✅ Nginx reiniciado exitosamente")
+        if reload_result['reloaded']:
+            print("✅ Nginx recargado exitosamente")
             self.ui.mark_step_completed(step_id)
             return {'success': True}
         else:
-            print(f"❌ Error reiniciando nginx: {stderr}")
-            return {'success': False, 'error': stderr}
+            print(f"❌ Error recargando nginx: {reload_result['test_output']}")
+            return {'success': False, 'error': reload_result['test_output']}
     
     def _print_final_summary(self, results: Dict[str, Any]):
         """Imprimir resumen final del proceso"""
@@ -297,6 +327,8 @@ class SSLDiagnosticsMain:
             for step in results['steps_skipped']:
                 print(f"   - {step}")
         
+        self._print_error_log_summary(results.get('error_logs'))
+        
         if results['errors']:
             print(f"\n❌ Errores: {len(results['errors'])}")
             for error in results['errors']:
@@ -309,6 +341,253 @@ class SSLDiagnosticsMain:
             print(f"\n⚠️  Proceso completado con errores")
             print(f"   Revisar logs y corregir problemas manualmente")
 
+    def _print_error_log_summary(self, error_logs: Optional[Dict[str, Any]]):
+        """Sitios con más errores nginx y eventos SSL del dominio objetivo"""
+        if not error_logs or not error_logs.get('success'):
+            return
+        
+        window = "histórico" if error_logs['first_run'] else "desde la corrida anterior"
+        print(f"\n🧾 Error logs nginx ({window}): {error_logs['events']} eventos, {error_logs['ssl_events']} SSL")
+        for item in error_logs['top_offenders']:
+            classes = ', '.join(f"{name} {count}" for name, count in list(item['classes'].items())[:3])
+            print(f"   - {item['vhost']}: {item['events']} ({classes})")
+        
+        domain = error_logs.get('domain')
+        if domain and domain['ssl_events']:
+            print(f"   ⚠️  {self.target_domain}: {domain['ssl_events']} errores SSL acumulados")
+            for reason, count in domain['top_reasons']:
+                print(f"      {reason}: {count}")
+
+
+class MultiDomainDiagnostics(SSLDiagnosticsMain):
+    """
+    Diagnóstico de varios dominios (o de todos los vhosts) en una sesión
+    
+    Una conexión y un snapshot del host: /etc/hosts, nginx -t, el inventario
+    de vhosts, los certificados de todos los dominios y los error logs se
+    traen una vez, cada dominio se evalúa en memoria y las correcciones nginx
+    de todos van en un solo change set (un nginx -t, un reload).
+    """
+    
+    def __init__(self, domains: List[str], ssh_manager: Optional[SSHManager] = None, all_domains: bool = False):
+        # Sin dominio único: las confirmaciones son de la sesión y no se persisten pasos por dominio
+        super().__init__('', ssh_manager)
+        self.domains = list(dict.fromkeys(domains))
+        self.all_domains = all_domains
+    
+    def run_complete_diagnosis(self) -> Dict[str, Any]:
+        """Diagnóstico de todos los dominios con un snapshot compartido y un change set"""
+        print(f"🔍 SSL Diagnostics - Análisis de {'todos los vhosts' if self.all_domains else f'{len(self.domains)} dominios'}")
+        print("=" * 60)
+        
+        results = {
+            'success': False,
+            'domains': {},
+            'steps_completed': [],
+            'steps_skipped': [],
+            'errors': []
+        }
+        
+        try:
+            if not self._connect_ssh():
+                results['errors'].append('Error conectando SSH')
+                return results
+            
+            print("✅ Conexión SSH establecida")
+            results['steps_completed'].append('ssh_connection')
+            self._initialize_components()
+            
+            if self.all_domains:
+                self.domains = list(dict.fromkeys(self.domains + self.nginx_manager.get_vhost_domains()))
+                print(f"📋 {len(self.domains)} dominios en el inventario de vhosts")
+            if not self.domains:
+                results['errors'].append('No hay dominios para diagnosticar')
+                return results
+            
+            print(f"\n🔍 FASE 1: ANÁLISIS DEL HOST ({len(self.domains)} dominios)")
+            print("-" * 40)
+            
+            with self.ssh.step('initial_analysis'):
+                analysis = self._run_host_analysis()
+            if analysis.get('skipped'):
+                results['steps_skipped'].append('initial_analysis')
+                return results
+            results['steps_completed'].append('initial_analysis')
+            results['domains'] = analysis['domains']
+            results['error_logs'] = analysis['error_logs']
+            
+            print(f"\n🔧 FASE 2: CORRECCIÓN DE /etc/hosts")
+            print("-" * 40)
+            
+            with self.ssh.step('hosts_fixes'):
+                hosts_results = self._fix_hosts_issues()
+            results['steps_skipped' if hosts_results.get('skipped') else 'steps_completed'].append('hosts_fixes')
+            
+            print(f"\n🔧 FASE 3: CORRECCIÓN DE NGINX (un solo change set)")
+            print("-" * 40)
+            
+            with self.ssh.step('nginx_fixes'):
+                results['nginx_fixes'] = self.nginx_fixer.fix_domains(analysis['nginx'])
+            results['steps_completed'].append('nginx_fixes')
+            
+            print(f"\n🔒 FASE 4: VERIFICACIÓN SSL")
+            print("-" * 40)
+            
+            with self.ssh.step('ssl_verification'):
+                ssl_results = self._verify_domains()
+            if ssl_results.get('skipped'):
+                results['steps_skipped'].append('ssl_verification')
+            else:
+                results['steps_completed'].append('ssl_verification')
+            
+            print(f"\n🔄 FASE 5: RECARGA DE SERVICIOS")
+            print("-" * 40)
+            
+            with self.ssh.step('service_restart'):
+                restart_results = self._restart_services()
+            if restart_results.get('skipped'):
+                results['steps_skipped'].append('service_restart')
+            else:
+                results['steps_completed'].append('service_restart')
+            
+            results['success'] = True
+            self._print_final_summary(results)
+            
+        except KeyboardInterrupt:
+            print(f"\n❌ Proceso interrumpido por el usuario")
+            results['errors'].append('Proceso interrumpido por el usuario')
+        except Exception as e:
+            print(f"\n❌ Error inesperado: {e}")
+            results['errors'].append(f'Error inesperado: {e}')
+        finally:
+            if self.ssh:
+                self.ssh.close()
+                print(f"\n🔌 Conexión SSH cerrada")
+        
+        return results
+    
+    def _run_host_analysis(self) -> Dict[str, Any]:
+        """Snapshot del host una vez y evaluación de cada dominio en memoria"""
+        if not self.ui.should_continue('initial_analysis', f"Analizar {len(self.domains)} dominios"):
+            return {'skipped': True}
+        
+        if not self.hosts_analyzer or not self.nginx_analyzer or not self.ssl_manager or not self.error_log_analyzer:
+            raise RuntimeError("Components not initialized")
+        
+        print("🔍 Analizando archivo /etc/hosts...")
+        hosts_analysis = self.hosts_analyzer.analyze_hosts_file()
+        
+        print("🔍 Analizando configuraciones nginx (un snapshot para todos los dominios)...")
+        nginx_analyses = self.nginx_analyzer.analyze_domains(self.domains)
+        
+        print("🔍 Verificando certificados SSL...")
+        ssl_analyses = self.ssl_manager.analyze_ssl_statuses(self.domains)
+        
+        print("🔍 Clasificando error logs de nginx (solo líneas nuevas)...")
+        error_logs = self.error_log_analyzer.analyze(top=5, domains=self.domains)
+        
+        # /etc/hosts es del host: sus problemas se asignan a los dominios que nombran
+        hosts_by_domain: Dict[str, int] = {}
+        for issue in hosts_analysis['issues']:
+            if issue.get('domain'):
+                hosts_by_domain[issue['domain']] = hosts_by_domain.get(issue['domain'], 0) + 1
+        
+        domains = {}
+        for domain in self.domains:
+            nginx_analysis = nginx_analyses[domain]
+            domain_errors = error_logs.get('by_domain', {}).get(domain, {})
+            domains[domain] = {
+                'nginx_issues': len(nginx_analysis['issues']),
+                'interceptors': len(nginx_analysis['interceptors']),
+                'has_active_config': nginx_analysis['has_active_config'],
+                'certificate_valid': ssl_analyses[domain]['certificate_valid'],
+                'hosts_issues': hosts_by_domain.get(domain, 0),
+                'ssl_events': domain_errors.get('ssl_events', 0),
+            }
+        
+        with_problems = [domain for domain, item in domains.items()
+                         if item['nginx_issues'] or item['hosts_issues'] or not item['certificate_valid']]
+        print(f"\n📊 RESUMEN DEL ANÁLISIS:")
+        print(f"   /etc/hosts: {len(hosts_analysis['issues'])} problemas detectados")
+        print(f"   Nginx: {'✅ nginx -t OK' if self._nginx_test_passed(nginx_analyses) else '❌ nginx -t falla'}")
+        print(f"   Dominios con problemas: {len(with_problems)} de {len(domains)}")
+        for domain in with_problems[:20]:
+            item = domains[domain]
+            print(f"   - {domain}: nginx {item['nginx_issues']} ({item['interceptors']} interceptores), "
+                  f"/etc/hosts {item['hosts_issues']}, SSL {'✅' if item['certificate_valid'] else '❌'}")
+        if len(with_problems) > 20:
+            print(f"   ... y {len(with_problems) - 20} más")
+        if self.nginx_manager and self.nginx_manager.cache.hits:
+            print(f"   Cache del host: {self.nginx_manager.cache.hits} análisis reusados "
+                  f"(nginx -t, vhosts y /etc/hosts sin cambios)")
+        
+        self.ui.mark_step_completed('initial_analysis')
+        return {
+            'hosts_analysis': hosts_analysis,
+            'nginx': nginx_analyses,
+            'ssl': ssl_analyses,
+            'error_logs': error_logs,
+            'domains': domains
+        }
+    
+    def _nginx_test_passed(self, nginx_analyses: Dict[str, Dict[str, Any]]) -> bool:
+        return all(analysis['nginx_test_passed'] for analysis in nginx_analyses.values())
+    
+    def _verify_domains(self) -> Dict[str, Any]:
+        """Verificación final: certificados de todos los dominios y un nginx -t"""
+        if not self.ui.should_continue('ssl_final_verification', f"Verificar SSL de {len(self.domains)} dominios"):
+            return {'skipped': True}
+        
+        if not self.ssl_manager or not self.nginx_manager:
+            raise RuntimeError("Components not initialized")
+        
+        ssl_analyses = self.ssl_manager.analyze_ssl_statuses(self.domains)
+        nginx_test_passed, nginx_output = self.nginx_manager.test_config()
+        invalid = [domain for domain, analysis in ssl_analyses.items() if not analysis['certificate_valid']]
+        
+        print(f"📋 Resultados de verificación SSL:")
+        print(f"   Certificados válidos: {len(self.domains) - len(invalid)} de {len(self.domains)}")
+        for domain in invalid[:20]:
+            print(f"   ❌ {domain}: {ssl_analyses[domain]['issues'][0]['description']}")
+        print(f"   Nginx configuración: {'✅' if nginx_test_passed else '❌'}")
+        
+        self.ui.mark_step_completed('ssl_final_verification')
+        return {
+            'invalid_certificates': invalid,
+            'nginx_test_passed': nginx_test_passed,
+            'nginx_output': nginx_output
+        }
+    
+    def _print_final_summary(self, results: Dict[str, Any]):
+        """Resumen final de la sesión"""
+        print(f"\n" + "=" * 60)
+        print(f"📋 RESUMEN FINAL - {len(results['domains'])} dominios")
+        print(f"=" * 60)
+        
+        print(f"✅ Pasos completados: {len(results['steps_completed'])}")
+        for step in results['steps_completed']:
+            print(f"   - {step}")
+        
+        fixes = results.get('nginx_fixes') or {}
+        if fixes.get('fixes_applied'):
+            print(f"\n🔧 {fixes['fixes_applied']} correcciones nginx aplicadas juntas "
+                  f"({fixes['domains_with_issues']} dominio(s) con problemas)")
+        if fixes.get('protected'):
+            print(f"⚠️  {len(fixes['protected'])} correcciones omitidas: tocaban la configuración de otro dominio")
+        
+        self._print_error_log_summary(results.get('error_logs'))
+        
+        if results['errors']:
+            print(f"\n❌ Errores: {len(results['errors'])}")
+            for error in results['errors']:
+                print(f"   - {error}")
+        
+        if results['success']:
+            print(f"\n🎉 Proceso completado exitosamente")
+        else:
+            print(f"\n⚠️  Proceso completado con errores")
+            print(f"   Revisar logs y corregir problemas manualmente")
+    
 def main():
     """Función principal"""
     if len(sys.argv) != 2: